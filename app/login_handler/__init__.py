@@ -3,6 +3,10 @@ from .src.utils import login
 from .src.utils import logout
 from .src.utils import config_settings
 from .src.utils import reset_settings
+from .src.utils import invalidate_user
+from .src.utils import invalidate_all
+from .src.utils import resolve_sessions
+from .src.utils import resolve_sessions_async
 from .src.utils import data
 
 from .src import helpers
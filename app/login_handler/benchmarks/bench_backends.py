@@ -0,0 +1,71 @@
+"""Compares requests/sec through :meth:`LoginHandler.pre_request`
+for each crypto backend and session format
+
+Each request gets its own request context, so parsing of ``Cookie``
+header (cached per request) is part of the measured time.
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_backends
+"""
+import time
+
+from flask import Flask
+from werkzeug.http import dump_cookie
+from werkzeug.test import EnvironBuilder
+
+from login_handler import LoginHandler
+from login_handler.src import tokens
+from login_handler.src.state import get_state
+
+SECRET_KEY = "kfjwelkfjwoepfjwoeifjlwekj"
+USER_ID = "sehwag"
+NUMBER = 20000
+
+
+class User:
+
+    def get_id(self):
+        return USER_ID
+
+    def is_authenticated(self):
+        return True
+
+
+def measure(session_format, crypto_backend):
+    app = Flask(__name__)
+    app.secret_key = SECRET_KEY
+    login_handler = LoginHandler(app)
+
+    with app.test_request_context():
+        login_handler.config_settings(session_format=session_format, crypto_backend=crypto_backend)
+        login_handler.init_login(User())
+        token = get_state().login_cookie
+
+    #: Cookie header as browser would send it
+    cookie = dump_cookie("_login-session", token).split(";")[0]
+
+    environ = EnvironBuilder(headers={"Cookie": cookie}).get_environ()
+
+    with app.request_context(environ.copy()):
+        login_handler.pre_request()
+        assert login_handler.user_id == USER_ID
+
+    start = time.perf_counter()
+    for _ in range(NUMBER):
+        with app.request_context(environ.copy()):
+            login_handler.pre_request()
+    elapsed = time.perf_counter() - start
+
+    print(f"{session_format:<8} {crypto_backend:<7} {NUMBER / elapsed:>10.0f} req/s  "
+          f"{elapsed / NUMBER * 1e6:>7.2f} us/req")
+
+
+def run():
+    for session_format in tokens.SESSION_FORMATS:
+        for crypto_backend in ("cipher", "hmac"):
+            measure(session_format, crypto_backend)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,41 @@
+"""Compares cost of expiry check in :meth:`LoginHandler.pre_request`
+
+Before: expiry stored as date string, parsed with ``strptime`` and
+compared with ``datetime.now()``. After: expiry stored as integer
+epoch seconds and compared with ``time.time()``.
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_expiry
+"""
+import datetime
+import time
+import timeit
+
+from login_handler.src.helpers import get_epoch_from_seconds
+from login_handler.src.helpers import get_time_from_seconds
+
+TIME_FORMAT = "%d %b %Y"
+TIMEOUT = (60 * 60 * 24) * 365
+NUMBER = 100000
+
+
+def run():
+    date_string = get_time_from_seconds(TIMEOUT)
+    epoch = get_epoch_from_seconds(TIMEOUT)
+
+    def before():
+        return datetime.datetime.strptime(date_string, TIME_FORMAT) < datetime.datetime.now()
+
+    def after():
+        return epoch < time.time()
+
+    before_time = min(timeit.repeat(before, number=NUMBER, repeat=3)) / NUMBER
+    after_time = min(timeit.repeat(after, number=NUMBER, repeat=3)) / NUMBER
+
+    print(f"strptime  {before_time * 1e6:>7.3f} us/check")
+    print(f"epoch     {after_time * 1e6:>7.3f} us/check  ({before_time / after_time:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    run()
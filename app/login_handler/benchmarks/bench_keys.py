@@ -0,0 +1,49 @@
+"""Measures per-request saving of precomputed key material
+
+Compares sealing and unsealing a token with key material derived
+on every call (old behaviour) and derived once
+(:class:`backends.DerivedKeys`).
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_keys
+"""
+import time
+import timeit
+
+from login_handler.src import backends
+from login_handler.src import tokens
+
+SECRET_KEY = "kfjwelkfjwoepfjwoeifjlwekj"
+USER_ID = "sehwag"
+NUMBER = 50000
+
+
+def measure(backend):
+    now = int(time.time())
+    keys = backends.DerivedKeys(SECRET_KEY)
+
+    #: Token without key id
+    token = tokens.dumps_compact(USER_ID, True, now, now + 60, keys, backend).split(".", 1)[1]
+
+    def per_request():
+        key = backend.derive_key(SECRET_KEY)
+        backend.unseal(token, key)
+
+    def precomputed():
+        backend.unseal(token, keys.get(backend))
+
+    derived = min(timeit.repeat(per_request, number=NUMBER, repeat=3)) / NUMBER
+    cached = min(timeit.repeat(precomputed, number=NUMBER, repeat=3)) / NUMBER
+
+    print(f"{backend.name:<7} derive per request={derived * 1e6:>6.2f} us  "
+          f"precomputed={cached * 1e6:>6.2f} us  saving={(derived - cached) * 1e6:>6.2f} us/req")
+
+
+def run():
+    for backend in (backends.CIPHER, backends.HMAC):
+        measure(backend)
+
+
+if __name__ == "__main__":
+    run()
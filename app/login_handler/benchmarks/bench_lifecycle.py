@@ -0,0 +1,227 @@
+"""Benchmark suite for the full :class:`LoginHandler` request lifecycle
+
+It drives the Flask app of ``tests/conftest.py`` through the test client
+and measures these scenarios
+
+- anonymous: guest requests a page rendering ``user``
+- authenticated: logged in user requests a page rendering ``user``
+- login: user logs in with credentials
+- logout: logged in user logs out
+- remember: logged in user with ``remember=True`` requests a page
+
+For each scenario it reports p50/p99 latency of whole request, per-phase
+timings of ``pre_request``, user loader and ``post_request`` and
+allocations per request. Results can be written as json and compared
+with results of another commit.
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_lifecycle --output after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from login_handler import LoginHandler
+from login_handler.tests.conftest import create_app
+from login_handler.tests.conftest import create_database
+from login_handler.tests.utils import LOGIN_PAGE_PATH
+from login_handler.tests.utils import LOGOUT_PAGE_PATH
+
+PHASES = ("pre_request", "user_loader", "post_request")
+
+CREDENTIALS = {"username": "sehwag", "password": "seh"}
+
+
+class TimedLoginHandler(LoginHandler):
+    """Records time spent in each phase of current request"""
+
+    timings = None
+
+    def pre_request(self):
+        start = time.perf_counter_ns()
+        try:
+            return super().pre_request()
+        finally:
+            self._record("pre_request", start)
+
+    def post_request(self, response):
+        start = time.perf_counter_ns()
+        try:
+            return super().post_request(response)
+        finally:
+            self._record("post_request", start)
+
+    def _load_user_from_cache_or_callback(self, user_id):
+        start = time.perf_counter_ns()
+        try:
+            return super()._load_user_from_cache_or_callback(user_id)
+        finally:
+            self._record("user_loader", start)
+
+    def _record(self, phase, start):
+        if self.timings is not None:
+            self.timings[phase] += time.perf_counter_ns() - start
+
+
+def login(client):
+    client.post(LOGIN_PAGE_PATH, data=CREDENTIALS)
+
+
+def logout(client):
+    client.get(LOGOUT_PAGE_PATH)
+
+
+#: name -> (settings, setup once, setup per request, request)
+SCENARIOS = {
+    "anonymous": ({}, logout, None, lambda client: client.get("/")),
+    "authenticated": ({}, login, None, lambda client: client.get("/dashboard/check")),
+    "login": ({}, None, logout, lambda client: client.post(LOGIN_PAGE_PATH, data=CREDENTIALS)),
+    "logout": ({}, None, login, lambda client: client.get(LOGOUT_PAGE_PATH)),
+    "remember": ({"remember": True}, login, None, lambda client: client.get("/dashboard/check")),
+}
+
+
+def summary(values_ns):
+    """Returns mean, p50 and p99 of values in microseconds"""
+    values = sorted(values_ns)
+    return {
+        "mean": statistics.fmean(values) / 1e3,
+        "p50": values[len(values) // 2] / 1e3,
+        "p99": values[min(len(values) - 1, int(len(values) * 0.99))] / 1e3,
+    }
+
+
+def run_scenario(app, name, number, alloc_number):
+    settings, setup, setup_each, do_request = SCENARIOS[name]
+    handler = app.login_handler
+
+    handler.reset_settings()
+    handler.config_settings(**settings)
+
+    client = app.test_client(use_cookies=True)
+    if setup:
+        setup(client)
+
+    latencies = []
+    phases = {phase: [] for phase in PHASES}
+
+    #: Warm up
+    for _ in range(min(100, number)):
+        if setup_each:
+            setup_each(client)
+        do_request(client)
+
+    for _ in range(number):
+        if setup_each:
+            setup_each(client)
+
+        handler.timings = dict.fromkeys(PHASES, 0)
+        start = time.perf_counter_ns()
+        do_request(client)
+        latencies.append(time.perf_counter_ns() - start)
+
+        for phase in PHASES:
+            phases[phase].append(handler.timings[phase])
+        handler.timings = None
+
+    #: Allocations are measured in separate pass, tracemalloc slows down requests
+    peaks = []
+    blocks = []
+    tracemalloc.start()
+    for _ in range(alloc_number):
+        if setup_each:
+            setup_each(client)
+
+        tracemalloc.reset_peak()
+        before_size = tracemalloc.get_traced_memory()[0]
+        before_blocks = sys.getallocatedblocks()
+        do_request(client)
+        blocks.append(sys.getallocatedblocks() - before_blocks)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before_size)
+    tracemalloc.stop()
+
+    return {
+        "requests": number,
+        "latency_us": summary(latencies),
+        "phases_us": {phase: summary(values) for phase, values in phases.items()},
+        "alloc": {
+            "peak_kib": statistics.fmean(peaks) / 1024,
+            "net_blocks": statistics.fmean(blocks),
+        },
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(number=2000, alloc_number=200, scenarios=tuple(SCENARIOS)):
+    app = create_app(create_database(), handler_class=TimedLoginHandler)
+
+    with app.app_context():
+        results = {name: run_scenario(app, name, number, alloc_number) for name in scenarios}
+
+    return {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "scenarios": results,
+    }
+
+
+def report(results, baseline=None):
+    print(f"commit {results['commit']}  python {results['python']}")
+    print(f"{'scenario':<14}{'p50':>9}{'p99':>9}{'pre':>9}{'loader':>9}{'post':>9}{'peak KiB':>10}")
+
+    for name, result in results["scenarios"].items():
+        latency = result["latency_us"]
+        phases = result["phases_us"]
+        line = (f"{name:<14}{latency['p50']:>9.1f}{latency['p99']:>9.1f}"
+                f"{phases['pre_request']['p50']:>9.1f}{phases['user_loader']['p50']:>9.1f}"
+                f"{phases['post_request']['p50']:>9.1f}{result['alloc']['peak_kib']:>10.1f}")
+
+        previous = (baseline or {}).get("scenarios", {}).get(name)
+        if previous:
+            change = latency["p50"] / previous["latency_us"]["p50"] - 1
+            line += f"  p50 {change:+.1%} vs {baseline.get('commit')}"
+
+        print(line)
+
+    print("(times in microseconds, phases are p50)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="timed requests per scenario")
+    parser.add_argument("--alloc-number", type=int, default=200, help="requests measured for allocations")
+    parser.add_argument("--scenario", action="append", choices=tuple(SCENARIOS), help="run only these scenarios")
+    parser.add_argument("--output", help="write results as json to this file")
+    parser.add_argument("--compare", help="json results of previous run to compare with")
+    args = parser.parse_args(argv)
+
+    results = run(args.number, args.alloc_number, tuple(args.scenario or SCENARIOS))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
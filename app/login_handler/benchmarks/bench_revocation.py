@@ -0,0 +1,61 @@
+"""Measures :meth:`RevocationList.is_revoked` next to the two dict
+lookups it is made of
+
+The list holds 1,000 revoked sessions and 100 revoked users. Sessions
+which are not revoked are the common case of every request.
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_revocation
+"""
+import os
+import tempfile
+import time
+import timeit
+
+from login_handler.src.revocation import RevocationList
+
+NUMBER = 200000
+SESSIONS = 1000
+USERS = 100
+
+
+def fill(revocation_list):
+    now = time.time()
+
+    for index in range(SESSIONS):
+        revocation_list.sessions[f"session-{index}"] = int(now) + 3600
+
+    for index in range(USERS):
+        revocation_list.users[f"user-{index}"] = now
+
+    return revocation_list
+
+
+def measure(name, statement):
+    seconds = min(timeit.repeat(statement, number=NUMBER, repeat=5)) / NUMBER
+    print(f"  {name:<28} {seconds * 1e9:>7.0f} ns")
+
+
+def run():
+    now = time.time()
+    revocation_list = fill(RevocationList())
+    sessions, users = revocation_list.sessions, revocation_list.users
+
+    print(f"{SESSIONS} revoked sessions, {USERS} revoked users")
+
+    measure("dict lookups", lambda: "session-x" in sessions or users.get("user-x") is not None)
+    measure("not revoked", lambda: revocation_list.is_revoked("session-x", "user-x", now))
+    measure("revoked session", lambda: revocation_list.is_revoked("session-1", "user-x", now))
+    measure("revoked user", lambda: revocation_list.is_revoked("session-x", "user-1", now - 1))
+
+    #: Shared file adds a clock read per check, file is stat'ed once per interval
+    with tempfile.TemporaryDirectory() as directory:
+        shared = RevocationList(os.path.join(directory, "revocations.json"))
+        fill(shared).save()
+
+        measure("not revoked, shared file", lambda: shared.is_revoked("session-x", "user-x", now))
+
+
+if __name__ == "__main__":
+    run()
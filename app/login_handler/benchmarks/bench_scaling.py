@@ -0,0 +1,361 @@
+"""Load harness showing how :class:`LoginHandler` throughput scales
+with worker processes and threads
+
+It serves the Flask app of ``tests/conftest.py`` on localhost under
+each combination of N pre-forked processes x M threads sharing one
+listening socket (like gunicorn's ``--workers``/``--threads``), and
+replays a mix of login, authenticated and anonymous requests from
+separate client processes.
+
+For each configuration it reports requests/sec, tail latency and where
+server time goes
+
+- ``speedup``: req/s relative to first configuration
+- ``decrypts``: cookies unsealed per authenticated request, 1.0 means
+  every request pays for decryption
+- ``decode``/``loader``: share of app time spent unsealing cookies and
+  in user loader, as reported by :mod:`metrics`
+
+Each configuration runs once per variant, ``decrypt`` (defaults, cookie
+decoded on every request) and ``cached`` (session cache on), so the cost
+of per-request decryption is visible next to everything else. Threads
+not adding throughput point at GIL bound work, processes not adding it
+at client or CPU limits, check ``cpus`` in the header.
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_scaling --processes 1,2,4 --threads 1,4 --duration 3
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import threading
+import time
+import urllib.parse
+
+from werkzeug.serving import WSGIRequestHandler
+from werkzeug.serving import make_server
+
+from login_handler.src.metrics import Instrumentation
+from login_handler.src.metrics import Metrics
+from login_handler.tests.conftest import create_app
+from login_handler.tests.conftest import create_database
+from login_handler.tests.utils import LOGIN_PAGE_PATH
+
+CREDENTIALS = {"username": "sehwag", "password": "seh"}
+
+#: name -> settings of login handler
+VARIANTS = {
+    "decrypt": {},
+    "cached": {"session_cache_size": 1024},
+}
+
+#: Default weights of login, authenticated and anonymous requests
+MIX = (10, 70, 20)
+
+SCENARIOS = ("login", "authenticated", "anonymous")
+
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Doesn't log requests, closes connection after each response"""
+
+    protocol_version = "HTTP/1.0"
+
+    def log(self, type, message, *args):
+        pass
+
+
+class TimedApp:
+    """WSGI wrapper summing time spent in app"""
+
+    def __init__(self, app):
+        self.app = app
+        self.seconds = 0.0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        try:
+            return self.app(environ, start_response)
+        finally:
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self.seconds += elapsed
+                self.requests += 1
+
+
+def serve(listener, threads, settings, ready, stop, results):
+    """Worker process, serves app with ``threads`` threads until ``stop`` is set"""
+    app = create_app(create_database())
+    app.login_handler.config_settings(**settings)
+
+    metrics = Metrics()
+    app.login_handler.init_instrumentation(metrics.attach(Instrumentation()))
+
+    timed_app = TimedApp(app.wsgi_app)
+    app.wsgi_app = timed_app
+
+    #: Each thread runs its own server accepting connections from the
+    #: same listening socket, one server isn't safe to serve from many threads
+    servers = [make_server("127.0.0.1", 0, app, request_handler=QuietRequestHandler, fd=listener.fileno())
+               for _ in range(threads)]
+
+    #: Every server wakes up on a new connection, the ones losing the race
+    #: return to their loop instead of blocking in accept, so they can shut down
+    for server in servers:
+        server.socket.setblocking(False)
+
+    serving = [threading.Thread(target=server.serve_forever) for server in servers]
+    for thread in serving:
+        thread.start()
+
+    ready.release()
+    stop.wait()
+
+    for server in servers:
+        server.shutdown()
+    for thread in serving:
+        thread.join()
+
+    snapshot = metrics.snapshot()
+
+    results.put({
+        "requests": timed_app.requests,
+        "app_seconds": timed_app.seconds,
+        "decode_seconds": snapshot["decode_seconds"]["sum"],
+        "decodes": snapshot["decode_seconds"]["count"],
+        "user_load_seconds": snapshot["user_load_seconds"]["sum"],
+    })
+
+
+def request(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+
+        return response
+    finally:
+        connection.close()
+
+
+def login(port):
+    """Logs in and returns ``Cookie`` header of session"""
+    response = request(port, "POST", LOGIN_PAGE_PATH, urllib.parse.urlencode(CREDENTIALS),
+                       {"Content-Type": "application/x-www-form-urlencoded"})
+
+    return response.getheader("Set-Cookie").split(";", 1)[0]
+
+
+def load(port, mix, start_at, end_at, seed, results):
+    """Client process, replays mix of requests until ``end_at``,
+    latencies are recorded from ``start_at``
+    """
+    rng = random.Random(seed)
+    cookie = login(port)
+    form = urllib.parse.urlencode(CREDENTIALS)
+
+    latencies = {scenario: [] for scenario in SCENARIOS}
+    errors = 0
+
+    #: Warm up requests included, server decrypts are counted from the start
+    authenticated = 0
+
+    while True:
+        now = time.time()
+        if now >= end_at:
+            break
+
+        scenario = rng.choices(SCENARIOS, mix)[0]
+
+        start = time.perf_counter_ns()
+        try:
+            if scenario == "login":
+                response = request(port, "POST", LOGIN_PAGE_PATH, form,
+                                   {"Content-Type": "application/x-www-form-urlencoded"})
+            elif scenario == "authenticated":
+                authenticated += 1
+                response = request(port, "GET", "/dashboard/check", headers={"Cookie": cookie})
+            else:
+                response = request(port, "GET", "/public")
+        except OSError:
+            errors += 1
+            continue
+
+        elapsed = time.perf_counter_ns() - start
+
+        if now < start_at:
+            continue
+
+        if response.status >= 400:
+            errors += 1
+        else:
+            latencies[scenario].append(elapsed)
+
+    results.put({"latencies": latencies, "errors": errors, "authenticated": authenticated})
+
+
+def percentiles(values_ns):
+    """Returns :data:`PERCENTILES` of values in milliseconds"""
+    if not values_ns:
+        return {str(percentile): None for percentile in PERCENTILES}
+
+    values = sorted(values_ns)
+    return {
+        str(percentile): values[min(len(values) - 1, int(len(values) * percentile / 100))] / 1e6
+        for percentile in PERCENTILES
+    }
+
+
+def run_configuration(processes, threads, settings, clients, duration, warmup, mix):
+    context = multiprocessing.get_context()
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1024)
+    port = listener.getsockname()[1]
+
+    ready = context.Semaphore(0)
+    stop = context.Event()
+    server_results = context.Queue()
+    client_results = context.Queue()
+
+    workers = [context.Process(target=serve, args=(listener, threads, settings, ready, stop, server_results))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        ready.acquire()
+
+    start_at = time.time() + warmup
+    end_at = start_at + duration
+
+    loaders = [context.Process(target=load, args=(port, mix, start_at, end_at, seed, client_results))
+               for seed in range(clients)]
+    for loader in loaders:
+        loader.start()
+
+    client_stats = [client_results.get() for _ in loaders]
+    for loader in loaders:
+        loader.join()
+
+    stop.set()
+    server_stats = [server_results.get() for _ in workers]
+    for worker in workers:
+        worker.join(timeout=5)
+        if worker.is_alive():
+            worker.terminate()
+
+    listener.close()
+
+    latencies = {scenario: [] for scenario in SCENARIOS}
+    for stats in client_stats:
+        for scenario, values in stats["latencies"].items():
+            latencies[scenario].extend(values)
+
+    every_latency = [value for values in latencies.values() for value in values]
+
+    app_seconds = sum(stats["app_seconds"] for stats in server_stats) or 1.0
+    authenticated = sum(stats["authenticated"] for stats in client_stats)
+    decodes = sum(stats["decodes"] for stats in server_stats)
+
+    return {
+        "processes": processes,
+        "threads": threads,
+        "requests": len(every_latency),
+        "errors": sum(stats["errors"] for stats in client_stats),
+        "rps": len(every_latency) / duration,
+        "latency_ms": percentiles(every_latency),
+        "scenarios_ms": {scenario: percentiles(values) for scenario, values in latencies.items()},
+        "decrypts_per_request": decodes / authenticated if authenticated else 0.0,
+        "decode_share": sum(stats["decode_seconds"] for stats in server_stats) / app_seconds,
+        "user_load_share": sum(stats["user_load_seconds"] for stats in server_stats) / app_seconds,
+    }
+
+
+def run(processes=(1, 2, 4), threads=(1, 4), variants=tuple(VARIANTS), clients=8, duration=3.0, warmup=0.5,
+        mix=MIX):
+    results = {}
+
+    for variant in variants:
+        results[variant] = [
+            run_configuration(number_of_processes, number_of_threads, VARIANTS[variant], clients, duration,
+                              warmup, mix)
+            for number_of_processes in processes
+            for number_of_threads in threads
+        ]
+
+    return {
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "clients": clients,
+        "mix": dict(zip(SCENARIOS, mix)),
+        "variants": results,
+    }
+
+
+def report(results):
+    print(f"python {results['python']}  cpus {results['cpus']}  clients {results['clients']}  "
+          f"mix {results['mix']}")
+
+    for variant, configurations in results["variants"].items():
+        print(f"\n{variant}")
+        print(f"{'procs x threads':<17}{'req/s':>9}{'speedup':>9}{'p50':>8}{'p95':>8}{'p99':>8}{'p99.9':>8}"
+              f"{'decrypts':>10}{'decode':>8}{'loader':>8}{'errors':>8}")
+
+        base = configurations[0]["rps"] or 1.0
+
+        for result in configurations:
+            latency = result["latency_ms"]
+            name = f"{result['processes']} x {result['threads']}"
+
+            print(f"{name:<17}{result['rps']:>9.0f}{result['rps'] / base:>8.2f}x"
+                  + "".join(f"{latency[str(percentile)] or 0:>8.2f}" for percentile in PERCENTILES)
+                  + f"{result['decrypts_per_request']:>10.2f}{result['decode_share']:>8.1%}"
+                  f"{result['user_load_share']:>8.1%}{result['errors']:>8}")
+
+    print("\n(latency in milliseconds, decode and loader are shares of server time in app)")
+
+
+def integers(value):
+    return tuple(int(item) for item in value.split(","))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=integers, default=(1, 2, 4), help="comma separated process counts")
+    parser.add_argument("--threads", type=integers, default=(1, 4), help="comma separated thread counts")
+    parser.add_argument("--variant", action="append", choices=tuple(VARIANTS), help="run only these variants")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client processes")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds each configuration is measured")
+    parser.add_argument("--warmup", type=float, default=0.5, help="seconds of load before measuring")
+    parser.add_argument("--mix", type=integers, default=MIX, help="weights of login,authenticated,anonymous")
+    parser.add_argument("--output", help="write results as json to this file")
+    args = parser.parse_args(argv)
+
+    if len(args.mix) != len(SCENARIOS):
+        parser.error(f"--mix needs {len(SCENARIOS)} weights")
+
+    results = run(args.processes, args.threads, tuple(args.variant or VARIANTS), args.clients, args.duration,
+                  args.warmup, args.mix)
+
+    report(results)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compares small per-session values kept in Flask ``session`` cookie
+next to ``_login-session`` with values kept as session attributes
+inside ``_login-session`` token
+
+Reports request time and bytes of ``Cookie`` header of requests which
+only read the values, and of requests which change one of them.
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_session_attributes
+"""
+import timeit
+
+from flask import Flask
+from flask import request
+from flask import session
+
+from login_handler import LoginHandler
+from login_handler import login
+from login_handler import data
+from login_handler.tests.conftest import User
+from login_handler.tests.conftest import create_database
+from login_handler.tests.conftest import user_callback_function
+
+SECRET_KEY = "kfjwelkfjwoepfjwoeifjlwekj"
+NUMBER = 500
+
+#: Values of a typical session
+VALUES = {"locale": "en-GB", "tenant": 42, "flags": ["beta-dashboard", "new-editor", "dark-mode"]}
+
+
+def create_bench_app(settings):
+    application = Flask(__name__)
+    application.secret_key = SECRET_KEY
+
+    login_handler = LoginHandler(application)
+    login_handler.init_user_callback(user_callback_function)
+    login_handler.config_settings(**settings)
+
+    @application.get("/login")
+    def login_route():
+        login(User("sehwag", "", 0, ""))
+
+        if request.args.get("store") == "flask":
+            session.update(VALUES)
+        else:
+            data.attributes.update(VALUES)
+
+        return ""
+
+    @application.get("/flask/read")
+    def flask_read():
+        return session["locale"]
+
+    @application.get("/flask/write")
+    def flask_write():
+        session["tenant"] = session["tenant"] + 1
+        return ""
+
+    @application.get("/attributes/read")
+    def attributes_read():
+        return data.session.attributes["locale"]
+
+    @application.get("/attributes/write")
+    def attributes_write():
+        data.attributes["tenant"] = data.attributes["tenant"] + 1
+        return ""
+
+    return application
+
+
+def measure(settings, store):
+    client = create_bench_app(settings).test_client()
+    client.get(f"/login?store={store}")
+
+    cookie_bytes = sum(len(f"{cookie.key}={cookie.value}") for cookie in client._cookies.values())
+
+    times = {}
+    for action in ("read", "write"):
+        path = f"/{store}/{action}"
+        times[action] = min(timeit.repeat(lambda: client.get(path), number=NUMBER, repeat=3)) / NUMBER
+
+    print(f"  {store:<10} cookies={cookie_bytes:>5} B  read={times['read'] * 1e6:>7.1f} us  "
+          f"write={times['write'] * 1e6:>7.1f} us")
+
+
+def run():
+    create_database()
+
+    for settings in ({"session_format": "compact", "crypto_backend": "hmac"},
+                     {"session_format": "compact", "crypto_backend": "cipher"}):
+        print(", ".join(f"{key}={value}" for key, value in settings.items()))
+
+        for store in ("flask", "attributes"):
+            measure(settings, store)
+
+
+if __name__ == "__main__":
+    run()
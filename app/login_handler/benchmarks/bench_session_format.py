@@ -0,0 +1,62 @@
+"""Compares ``json`` and ``compact`` session formats
+
+Reports size of ``Set-Cookie`` header and encode/decode time of
+each format.
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_session_format
+"""
+import time
+import timeit
+
+from werkzeug.http import dump_cookie
+
+from login_handler.src import backends
+from login_handler.src import tokens
+from login_handler.src.helpers import get_time_from_seconds
+
+SECRET_KEY = "kfjwelkfjwoepfjwoeifjlwekj"
+TIME_FORMAT = "%d %b %Y"
+KEYRING = backends.Keyring(SECRET_KEY)
+KEYS = KEYRING.current
+USER_ID = "sehwag"
+TIMEOUT = (60 * 60 * 24) * 365
+NUMBER = 20000
+
+
+def encode_json(backend):
+    return tokens.dumps_json({
+        "_user-id": USER_ID,
+        "_accessed-timeout": get_time_from_seconds(TIMEOUT),
+        "_valid-session": True
+    }, KEYS, backend)
+
+
+def encode_compact(backend):
+    now = int(time.time())
+    return tokens.dumps_compact(USER_ID, True, now, now + TIMEOUT, KEYS, backend)
+
+
+def measure(name, encode, backend):
+    token = encode(backend)
+
+    encode_time = min(timeit.repeat(lambda: encode(backend), number=NUMBER, repeat=3)) / NUMBER
+    decode_time = min(timeit.repeat(
+        lambda: tokens.loads(token, KEYRING, TIME_FORMAT), number=NUMBER, repeat=3
+    )) / NUMBER
+
+    header = dump_cookie("_login-session", token)
+
+    print(f"{name:<8} {backend.name:<7} token={len(token.encode()):>4} B  header={len(header):>4} B  "
+          f"encode={encode_time * 1e6:>7.2f} us  decode={decode_time * 1e6:>7.2f} us")
+
+
+def run():
+    for backend in (backends.CIPHER, backends.HMAC):
+        measure("json", encode_json, backend)
+        measure("compact", encode_compact, backend)
+
+
+if __name__ == "__main__":
+    run()
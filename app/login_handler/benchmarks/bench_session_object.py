@@ -0,0 +1,84 @@
+"""Compares session dicts (used before :class:`session.Session`)
+with slotted :class:`session.Session`
+
+Reports size of one session, memory held by a cache full of sessions,
+allocations of building a session from decoded fields and the time
+of building it and reading its user id.
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_session_object
+"""
+import sys
+import time
+import timeit
+import tracemalloc
+
+from login_handler.src.session import Session
+
+NUMBER = 100000
+
+#: Sessions kept alive, like a full session cache
+CACHED = 10000
+
+
+def build_dict(user_id, expires_at, issued_at, refreshed_at, session_id):
+    #: Same dict ``tokens.load_compact`` returned before
+    session = {"_user-id": user_id, "_accessed-timeout": expires_at, "_valid-session": True, "_issued-at": issued_at,
+               "_refreshed-at": refreshed_at}
+
+    if session_id is not None:
+        session["_session-id"] = session_id
+
+    return session
+
+
+def build_session(user_id, expires_at, issued_at, refreshed_at, session_id):
+    return Session(user_id, expires_at, issued_at, refreshed_at, session_id, False, False)
+
+
+def read_dict(session):
+    return session["_user-id"]
+
+
+def read_session(session):
+    return session.user_id
+
+
+def held_memory(build, fields):
+    """Returns bytes held by :data:`CACHED` sessions, user ids excluded"""
+    user_ids = [f"user-{index}" for index in range(CACHED)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [build(user_id, *fields[1:]) for user_id in user_ids]
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    #: List of sessions isn't part of their footprint
+    return (held - sys.getsizeof(sessions)) / len(sessions)
+
+
+def measure(name, build, read, fields):
+    session = build(*fields)
+
+    build_time = min(timeit.repeat(lambda: build(*fields), number=NUMBER, repeat=3)) / NUMBER
+    read_time = min(timeit.repeat(lambda: read(session), number=NUMBER, repeat=3)) / NUMBER
+
+    print(f"{name:<8} size={sys.getsizeof(session):>4} B  held={held_memory(build, fields):>6.1f} B/session  "
+          f"build={build_time * 1e9:>6.0f} ns  read user id={read_time * 1e9:>4.0f} ns")
+
+
+def run():
+    now = int(time.time())
+
+    for session_id in (None, "3TqYbLm0fM2Xo5hW8uVZ1g"):
+        fields = ("sehwag", now + 3600, now, now, session_id)
+
+        print(f"session id: {session_id is not None}")
+        measure("dict", build_dict, read_dict, fields)
+        measure("Session", build_session, read_session, fields)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,80 @@
+"""Compares cost of issuing ``_login-session`` cookie with
+``response.set_cookie`` (attributes serialized on every call) and with
+precompiled :class:`cookie_header.CookieHeader`
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_set_cookie
+"""
+import time
+import timeit
+
+from flask import Flask
+
+from login_handler import LoginHandler
+from login_handler.src.core import COOKIE_NAME
+
+SECRET_KEY = "kfjwelkfjwoepfjwoeifjlwekj"
+NUMBER = 10000
+
+#: name -> settings of login handler
+CASES = {
+    "session": {},
+    "remember": {"remember": True},
+    "logout": {},
+}
+
+
+def measure(name, settings, token):
+    app = Flask(__name__)
+    app.secret_key = SECRET_KEY
+    handler = LoginHandler(app)
+    handler.config_settings(**settings)
+
+    if name == "logout":
+        header = handler.logout_cookie_header
+        kwargs = dict(max_age=0, httponly=handler.HTTPONLY, samesite=handler.SAMESITE, domain=handler.DOMAIN,
+                      path=handler.PATH)
+    else:
+        header = handler.login_cookie_header
+        kwargs = dict(httponly=handler.HTTPONLY, samesite=handler.SAMESITE, domain=handler.DOMAIN,
+                      path=handler.PATH, max_age=handler.UNACCESSED_TIMEOUT if handler.REMEMBER else None,
+                      secure=handler.SECURE)
+
+    def before():
+        app.response_class().set_cookie(key=COOKIE_NAME, value=token, **kwargs)
+
+    def after():
+        handler._set_cookie(app.response_class(), header, token)
+
+    def response_only():
+        app.response_class()
+
+    base = min(timeit.repeat(response_only, number=NUMBER, repeat=3)) / NUMBER
+    before_time = min(timeit.repeat(before, number=NUMBER, repeat=3)) / NUMBER - base
+    after_time = min(timeit.repeat(after, number=NUMBER, repeat=3)) / NUMBER - base
+
+    print(f"{name:<9} set_cookie={before_time * 1e6:>6.2f} us  precompiled={after_time * 1e6:>6.2f} us  "
+          f"({before_time / after_time:.1f}x faster)")
+
+
+def run():
+    app = Flask(__name__)
+    app.secret_key = SECRET_KEY
+    handler = LoginHandler(app)
+
+    now = int(time.time())
+
+    #: Compact hmac token needs no quoting, json cipher token does
+    for session_format, crypto_backend in (("compact", "hmac"), ("json", "cipher")):
+        handler.config_settings(session_format=session_format, crypto_backend=crypto_backend)
+        token = handler.dumps_session({"_user-id": "sehwag", "_accessed-timeout": now + 3600,
+                                       "_valid-session": True, "_issued-at": now})
+
+        print(f"{session_format} {crypto_backend} token, {len(token)} chars")
+        for name, settings in CASES.items():
+            measure(name, dict(settings, session_format=session_format, crypto_backend=crypto_backend), token)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,99 @@
+"""Measures lookup throughput of session stores holding many sessions
+
+Run from ``app`` directory::
+
+    python -m login_handler.benchmarks.bench_stores --sessions 1000000
+"""
+import argparse
+import random
+import threading
+import time
+
+from login_handler.src import tokens
+from login_handler.src.stores import MemoryStore
+from login_handler.src.stores import SQLiteStore
+
+USERS = 100000
+
+
+def rows(number):
+    now = int(time.time())
+
+    for index in range(number):
+        user_id = f"user-{index % USERS}"
+        session_id = tokens.new_session_id()
+        session = {"_user-id": user_id, "_accessed-timeout": now + 3600, "_valid-session": True,
+                   "_session-id": session_id}
+        yield session_id, user_id, session, now, now + 3600
+
+
+def fill(store, number):
+    start = time.perf_counter()
+    session_ids = []
+
+    if isinstance(store, SQLiteStore):
+        batch = []
+        for row in rows(number):
+            batch.append(row)
+            session_ids.append(row[0])
+
+            if len(batch) == 10000:
+                store.add_many(batch)
+                batch = []
+        store.add_many(batch)
+    else:
+        for row in rows(number):
+            store.add(*row)
+            session_ids.append(row[0])
+
+    print(f"  filled {number} sessions in {time.perf_counter() - start:.1f} s")
+    return session_ids
+
+
+def lookups(store, session_ids, number, threads):
+    samples = [random.choice(session_ids) for _ in range(number)]
+
+    def worker(part):
+        for session_id in part:
+            store.get(session_id)
+
+    size = len(samples) // threads
+    workers = [threading.Thread(target=worker, args=(samples[index * size:(index + 1) * size],))
+               for index in range(threads)]
+
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"  {threads:>2} threads: {size * threads / elapsed:>10.0f} lookups/s")
+
+
+def run(sessions=1000000, number=200000, threads=(1, 4)):
+    for name, store in (("memory", MemoryStore()), ("sqlite", SQLiteStore())):
+        print(name)
+        session_ids = fill(store, sessions)
+
+        for count in threads:
+            lookups(store, session_ids, number, count)
+
+        user_id = "user-1"
+        start = time.perf_counter()
+        for _ in range(1000):
+            store.sessions_of(user_id)
+        print(f"  sessions_of: {(time.perf_counter() - start) / 1000 * 1e6:.1f} us/lookup")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000000, help="stored sessions")
+    parser.add_argument("--number", type=int, default=200000, help="lookups per configuration")
+    args = parser.parse_args(argv)
+
+    run(args.sessions, args.number)
+
+
+if __name__ == "__main__":
+    main()
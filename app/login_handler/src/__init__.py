@@ -1,25 +1,48 @@
-from .configurations import ACCESSED_TIMEOUT
-from .configurations import DOMAIN
-from .configurations import HTTPONLY
-from .configurations import PATH
-from .configurations import REMEMBER
-from .configurations import SAMESITE
-from .configurations import SECURE
-from .configurations import UNACCESSED_TIMEOUT
+from .configurations import EXEMPT_ENDPOINTS
+from .configurations import EXEMPT_BLUEPRINTS
+from .configurations import EXEMPT_PATHS
+
+from .core import SessionCore
+from .core import INVALID
+from .core import MALFORMED
+from .core import REVOKED
+from .core import EXPIRED
+from .core import REFRESH
+from .core import cookie_value
+
+from .metrics import Instrumentation
+from .metrics import Metrics
+from .metrics import CONTENT_TYPE
+
+from .profiling import SamplingProfiler
+
+from .session import Session
+from .session import SessionAttributes
+from .session import check_attribute
+
+from .state import get_state
+from .state import new_state
 
 from .helpers import verify_user
-from .helpers import get_time_from_seconds
+from .helpers import get_epoch_from_seconds
+from .helpers import get_issued_at
 
 from .user_types import Guest
 
-import json
-import datetime
+from . import backends
+from . import tokens
 
-from cipher_kit import Cipher
+import inspect
+import time
+import warnings
+
+from flask import g
+from flask import has_app_context
 from flask import request
+from werkzeug.local import LocalProxy
 
 
-class LoginHandler:
+class LoginHandler(SessionCore):
     """LoginHandler object handles authentication for your webapp.
     It is session based and uses cookies to authenticate sessions/users.
 
@@ -41,46 +64,46 @@ class LoginHandler:
     #: This will be used to load user from user id
     user_callback = None
 
-    user_id = None
+    #: True when :attr:`user_callback` is a coroutine function
+    user_callback_is_async = False
 
-    #: This variable holds latest information/details
-    info = None
+    #: This will be used to load many users at once, see :meth:`resolve_sessions`
+    user_batch_callback = None
+    user_batch_callback_is_async = False
 
-    #: This is used as flag
-    #: It indicated server have requested for logout when True
-    #: :meth:'post_request' performs logout on next response
-    logout_user = False
+    #: Built-in metrics, see :meth:`init_metrics`
+    metrics = None
 
-    time_format = "%d %b %Y"
+    #: Sampling profiler of auth phases, see :meth:`init_profiler`
+    profiler = None
 
-    #: Template for cookies
-    cookies = {
-        "_login-session": None,
-        "_logout-session": {
-            "_valid-session": False,
-            "_user-id": None
-        },
-        "extra": []
-    }
+    #: Addresses allowed to read metrics endpoint
+    local_addresses = ("127.0.0.1", "::1")
 
-    #: It will store data about session
-    #: and current user
-    session_data = dict()
+    #: Globals of the web framework, see :mod:`quart_handler`
+    _request = request
+    _g = g
+    _has_app_context = staticmethod(has_app_context)
 
     def __init__(self, app=None):
+        super().__init__()
+
+        #: Requests skipping login handler, see :meth:`exempt`
+        self._exempt_endpoints = set(EXEMPT_ENDPOINTS)
+        self._exempt_blueprints = set(EXEMPT_BLUEPRINTS)
+        self._exempt_paths = tuple(EXEMPT_PATHS)
+
+        #: Lazy proxy returned by :attr:`user`
+        #: It resolves the user only when it is actually used
+        self._user_proxy = LocalProxy(self.load_user)
+
+        #: Counts user lookups on the per-request memo
+        #: ``hits`` are served from the memo, ``misses`` called :attr:`user_callback`
+        self.user_stats = {"hits": 0, "misses": 0}
 
-        #: These settings are for session cookies
-        #: This would be used on next cookies
-        #: Check :file:`configurations.py` for more info on
-        #: individual settings
-        self.HTTPONLY = HTTPONLY
-        self.SAMESITE = SAMESITE
-        self.REMEMBER = REMEMBER
-        self.UNACCESSED_TIMEOUT = UNACCESSED_TIMEOUT
-        self.ACCESSED_TIMEOUT = ACCESSED_TIMEOUT
-        self.DOMAIN = DOMAIN
-        self.PATH = PATH
-        self.SECURE = SECURE
+        #: Counts requests with ``_login-session`` cookie in lazy mode
+        #: ``decoded`` needed the session, ``skipped`` never decoded it
+        self.lazy_stats = {"decoded": 0, "skipped": 0}
 
         if app:
             self.init_app(app)
@@ -100,79 +123,492 @@ class LoginHandler:
         self.app.after_request(self.post_request)
         app.template_context_processors[None].append(lambda: dict(user=self.user))
 
-        if not self.app.secret_key:
-            raise Exception("Secret Key is not defined")
+        #: Derives key material once, out of request's hot path
+        self.init_keys(self.app.secret_key, self._previous_secret_keys())
+
+        for endpoint in app.config.get("LOGIN_EXEMPT_ENDPOINTS", ()):
+            self.exempt(endpoint)
+
+        for blueprint in app.config.get("LOGIN_EXEMPT_BLUEPRINTS", ()):
+            self.exempt_blueprint(blueprint)
+
+        for path in app.config.get("LOGIN_EXEMPT_PATHS", ()):
+            self.exempt_path(path)
+
+    def exempt(self, view):
+        """Exempts endpoint from login handler, its requests skip
+        :meth:`pre_request` and :meth:`post_request`
+
+        It can be used as decorator of view function::
+
+            @app.route("/healthz")
+            @login_handler.exempt
+            def healthz():
+                ...
+
+        :param view: View function or name of endpoint
+        :return: View
+        """
+        if isinstance(view, str):
+            self._exempt_endpoints.add(view)
+        else:
+            view.login_exempt = True
+
+        return view
+
+    def exempt_blueprint(self, blueprint):
+        """Exempts every endpoint of blueprint from login handler
+
+        :param blueprint: Blueprint or its name
+        """
+        self._exempt_blueprints.add(getattr(blueprint, "name", blueprint))
+
+    def exempt_path(self, prefix):
+        """Exempts url paths starting with prefix from login handler
+        Prefix matches whole path segments, "/health" matches
+        "/health/live" but not "/healthy"
+
+        :param prefix: Url path prefix
+        """
+        self._exempt_paths += (prefix.rstrip("/") + "/",)
+
+    def _is_exempt(self):
+        endpoint = self._request.endpoint
+
+        if endpoint is not None:
+            if endpoint in self._exempt_endpoints:
+                return True
+
+            if self._exempt_blueprints and self._request.blueprint in self._exempt_blueprints:
+                return True
+
+            view = self.app.view_functions.get(endpoint)
+            if getattr(view, "login_exempt", False):
+                return True
+
+        if self._exempt_paths:
+            return (self._request.path.rstrip("/") + "/").startswith(self._exempt_paths)
+
+        return False
+
+    def init_metrics(self, metrics=None, rule=None, local_only=True):
+        """Enables built-in counters and histograms of auth phases,
+        serve them in Prometheus text format with :meth:`metrics.Metrics.wsgi_app`
+        on a listener of its own or with an endpoint of app
+
+        :param metrics: Instance of :class:`metrics.Metrics`, new one by default
+        :param rule: Url rule of metrics endpoint, ``None`` (default) adds no endpoint
+        :param local_only: If sets to True, only requests from :attr:`local_addresses` can read
+         endpoint. Behind a reverse proxy on the same host every request comes from a local
+         address, so it doesn't keep the endpoint private there
+        :return: metrics
+        """
+        if metrics is None:
+            metrics = Metrics()
+
+        instrumentation = self.instrumentation or self.init_instrumentation(Instrumentation())
+        metrics.attach(instrumentation)
+        self.metrics = metrics
+
+        if rule is not None:
+            def login_handler_metrics():
+                if local_only and self._request.remote_addr not in self.local_addresses:
+                    return "Not Found", 404
+
+                return metrics.render(), 200, {"Content-Type": CONTENT_TYPE}
+
+            self.app.add_url_rule(rule, view_func=login_handler_metrics)
+            self.exempt(login_handler_metrics.__name__)
+
+        return metrics
+
+    def init_profiler(self, profiler=None):
+        """Enables sampling profiler of ``pre_request``, user loading
+        and ``post_request``, see :mod:`profiling`
+
+        :param profiler: Instance of :class:`profiling.SamplingProfiler`, new one by default
+        :return: profiler
+        """
+        if profiler is None:
+            profiler = SamplingProfiler()
+
+        self.profiler = profiler
+
+        return profiler
+
+    def _previous_secret_keys(self):
+        return tuple(self.app.config.get("SECRET_KEY_FALLBACKS") or ())
+
+    @property
+    def keyring(self):
+        """Key material derived from ``app.secret_key`` and previous
+        secret keys in ``app.config["SECRET_KEY_FALLBACKS"]``
+        It is derived again only when any of these keys changes
+
+        :return: :class:`backends.Keyring`
+        """
+        secrets = (self.app.secret_key, self._previous_secret_keys())
+
+        if self._keyring is None or self._keyring.secrets != secrets:
+            self.init_keys(*secrets)
+
+        return self._keyring
+
+    def _get_state(self):
+        return get_state(self._g, self._has_app_context)
+
+    def _new_state(self):
+        return new_state(self._g)
+
+    def _run_sync(self, func):
+        """Wraps coroutine function to be called from sync code
+        of hooks, e.g. async :attr:`user_callback` from :attr:`user`
+        """
+        return self.app.ensure_sync(func)
 
     def init_user_callback(self, user_callback_func):
         """Initialize :attr:`user_callback`
         which is necessary to load user
 
+        It can be a coroutine function (``async def``) too,
+        await :meth:`get_user` to load user without blocking
+
         :param user_callback_func:
         :return:
         """
         self.user_callback = user_callback_func
+        self.user_callback_is_async = inspect.iscoroutinefunction(user_callback_func)
+
+    def init_user_batch_callback(self, user_batch_callback_func):
+        """Initialize :attr:`user_batch_callback`
+        which loads many users in one call, see :meth:`resolve_sessions`
+
+        It is called with a list of at most :attr:`USER_BATCH_SIZE` user ids
+        and returns dict of user id and user, missing users are left out.
+        It can be a coroutine function (``async def``) too
+
+        :param user_batch_callback_func:
+        :return:
+        """
+        self.user_batch_callback = user_batch_callback_func
+        self.user_batch_callback_is_async = inspect.iscoroutinefunction(user_batch_callback_func)
+
+    def resolve_sessions(self, login_sessions):
+        """Resolves users of many session cookies at once,
+        e.g. for websocket fan-out or "who's online" views
+
+        Cookies are decoded once each, user ids are de-duplicated and
+        loaded with :meth:`load_users`. State of the current request
+        (user, session, cookies) is not touched
+
+        :param login_sessions: Iterable of raw ``_login-session`` cookies
+        :return: List of users in order of cookies, ``None`` for guests and missing users
+        """
+        login_sessions = list(login_sessions)
+        identities = self.identify_sessions(login_sessions)
+
+        users = self.load_users({user_id for user_id in identities.values() if user_id is not None})
 
-    def config_settings(
-            self,
-            httponly=HTTPONLY,
-            samesite=SAMESITE,
-            remember=REMEMBER,
-            unaccessed_timeout=UNACCESSED_TIMEOUT,
-            accessed_timeout=ACCESSED_TIMEOUT,
-            domain=DOMAIN,
-            path=PATH,
-            secure=SECURE
-    ):
-        """
-
-        :param httponly: If sets to True cookies will only be available in requests and responses
-        :param samesite: The ``samesite`` attribute of cookies is used to control how cookies are sent by the
-         browser in cross-site requests.
-        :param remember: On True, will remember session for :attr:`unaccessed_timeout` time period
-        :param unaccessed_timeout: It expires session after :attr:`unaccessed_timeout` until user
-         login again with credentials instead of sessions
-        :param accessed_timeout: Time of cookie to expire if client doesn't visit at least one time
-        :param domain: Domain of cookies
-        :param path: Path of cookies
-        :param secure: If set's to True cookie will only be sent over secure HTTPS connections
-
-        """
-        self.HTTPONLY = httponly
-        self.REMEMBER = remember
-        self.UNACCESSED_TIMEOUT = unaccessed_timeout
-        self.ACCESSED_TIMEOUT = accessed_timeout
-        self.DOMAIN = domain
-        self.PATH = path
-        self.SECURE = secure
-
-        #: Combination of (samesite=None, secure=False) is invalid.
-        #: In order to samesite be None secure have to be True
-        if samesite is None and self.SECURE is False:
-            raise Exception(f"Invalid combination of values (samesite={samesite}, secure={secure})")
-
-        self.SAMESITE = samesite
-
-    def reset_settings(self):
-        self.HTTPONLY = HTTPONLY
-        self.SAMESITE = SAMESITE
-        self.REMEMBER = REMEMBER
-        self.UNACCESSED_TIMEOUT = UNACCESSED_TIMEOUT
-        self.ACCESSED_TIMEOUT = ACCESSED_TIMEOUT
-        self.DOMAIN = DOMAIN
-        self.PATH = PATH
-        self.SECURE = SECURE
+        return [users.get(identities[login_session]) for login_session in login_sessions]
+
+    async def resolve_sessions_async(self, login_sessions):
+        """Awaitable version of :meth:`resolve_sessions`
+
+        Async batch loader, user loader and session store are
+        awaited on the running event loop
+
+        :param login_sessions: Iterable of raw ``_login-session`` cookies
+        :return: List of users in order of cookies, ``None`` for guests and missing users
+        """
+        login_sessions = list(login_sessions)
+        identities = await self.identify_sessions_async(login_sessions)
+
+        users = await self.load_users_async({user_id for user_id in identities.values() if user_id is not None})
+
+        return [users.get(identities[login_session]) for login_session in login_sessions]
+
+    def load_users(self, user_ids):
+        """Loads many users, from :attr:`user_cache` first and then with
+        :attr:`user_batch_callback` in chunks of :attr:`USER_BATCH_SIZE` ids
+
+        Without batch callback :attr:`user_callback` is called for each id
+
+        :param user_ids: Iterable of user ids
+        :return: Dict of user id and user, missing users are left out
+        """
+        users, missing = self._cached_users(user_ids)
+
+        if self.user_batch_callback is None:
+            loaded = {user_id: self._load_user_from_cache_or_callback(user_id) for user_id in missing}
+            users.update((user_id, user) for user_id, user in loaded.items() if user is not None)
+
+            return users
+
+        user_batch_callback = self.user_batch_callback
+        if self.user_batch_callback_is_async:
+            user_batch_callback = self._run_sync(user_batch_callback)
+
+        size = self.USER_BATCH_SIZE
+        for start in range(0, len(missing), size):
+            self._add_loaded_users(users, user_batch_callback(missing[start:start + size]))
+
+        return users
+
+    async def load_users_async(self, user_ids):
+        """Awaitable version of :meth:`load_users`
+
+        Async :attr:`user_batch_callback` and :attr:`user_callback`
+        are awaited on the running event loop
+
+        :param user_ids: Iterable of user ids
+        :return: Dict of user id and user, missing users are left out
+        """
+        users, missing = self._cached_users(user_ids)
+
+        if self.user_batch_callback is None:
+            for user_id in missing:
+                self._add_loaded_users(users, {user_id: await self._call_user_callback_async(user_id)})
+
+            return users
+
+        size = self.USER_BATCH_SIZE
+        for start in range(0, len(missing), size):
+            loaded = self.user_batch_callback(missing[start:start + size])
+
+            if inspect.isawaitable(loaded):
+                loaded = await loaded
+
+            self._add_loaded_users(users, loaded)
+
+        return users
+
+    def _cached_users(self, user_ids):
+        """Splits de-duplicated user ids into users found in :attr:`user_cache` and missing ids"""
+        users = {}
+        missing = []
+
+        for user_id in dict.fromkeys(user_ids):
+            user = self.user_cache.get(user_id) if self.user_cache is not None else None
+
+            if user is None:
+                missing.append(user_id)
+            else:
+                users[user_id] = user
+
+        return users, missing
+
+    def _add_loaded_users(self, users, loaded):
+        for user_id, user in loaded.items():
+            if user is None:
+                continue
+
+            users[user_id] = user
+
+            if self.user_cache is not None:
+                self.user_cache.set(user_id, user)
 
     @property
     def user(self):
-        if not self.user_id:
-            return Guest()
-
-        return self.user_callback(self.user_id)
+        """Lazy proxy to the current user.
+        User is loaded on first use, see :meth:`load_user`
+        """
+        return self._user_proxy
 
     @user.setter
     def user(self, data):
         raise TypeError("Cannot set attribute.")
 
+    def load_user(self):
+        """Loads user of the current request.
+
+        :attr:`user_callback` is called at most once per request,
+        loaded user is memoized on the request context (:data:`flask.g`)
+
+        :return: User object or :class:`Guest`
+        """
+        if self._get_state().profiled:
+            return self.profiler.profile("load_user", self._load_user)
+
+        return self._load_user()
+
+    def _load_user(self):
+        if not self.user_id:
+            return Guest()
+
+        #: Memo is keyed on user id so login in the middle of
+        #: a request doesn't return previous user
+        state = self._get_state()
+        memo = state.user
+        if memo is not None and memo[0] == state.user_id:
+            self._count_user_stat("hits")
+            return memo[1]
+
+        self._count_user_stat("misses")
+        user = self._load_user_from_cache_or_callback(state.user_id)
+        state.user = (state.user_id, user)
+
+        return user
+
+    def _load_user_from_cache_or_callback(self, user_id):
+        user_callback = self._run_sync(self.user_callback) if self.user_callback_is_async else self.user_callback
+
+        if self.instrumentation is not None:
+            user_callback = self._instrumented_user_callback(user_callback)
+
+        if self.user_cache is None:
+            return user_callback(user_id)
+
+        user = self.user_cache.get(user_id)
+        if user is None:
+            user = user_callback(user_id)
+
+            if user is not None:
+                self.user_cache.set(user_id, user)
+
+        return user
+
+    async def get_user(self):
+        """Awaitable version of :attr:`user`
+
+        Async :attr:`user_callback` is awaited on the running event loop,
+        loaded user is memoized so :attr:`user` returns it afterwards
+
+        :return: User object or :class:`Guest`
+        """
+        user_id = self.user_id
+        if not user_id:
+            return Guest()
+
+        state = self._get_state()
+        memo = state.user
+        if memo is not None and memo[0] == user_id:
+            self._count_user_stat("hits")
+            return memo[1]
+
+        self._count_user_stat("misses")
+
+        user = self.user_cache.get(user_id) if self.user_cache is not None else None
+        if user is None:
+            if self.instrumentation is None:
+                user = await self._call_user_callback_async(user_id)
+            else:
+                started = time.perf_counter()
+
+                try:
+                    user = await self._call_user_callback_async(user_id)
+                except Exception:
+                    self._emit_user_loaded(started, "error")
+                    raise
+
+                self._emit_user_loaded(started, "missing" if user is None else "found")
+
+            if user is not None and self.user_cache is not None:
+                self.user_cache.set(user_id, user)
+
+        state.user = (user_id, user)
+
+        return user
+
+    async def _call_user_callback_async(self, user_id):
+        user = self.user_callback(user_id)
+
+        if inspect.isawaitable(user):
+            user = await user
+
+        return user
+
+    def _instrumented_user_callback(self, user_callback):
+        def load(user_id):
+            started = time.perf_counter()
+
+            try:
+                user = user_callback(user_id)
+            except Exception:
+                self._emit_user_loaded(started, "error")
+                raise
+
+            self._emit_user_loaded(started, "missing" if user is None else "found")
+
+            return user
+
+        return load
+
+    def _emit_user_loaded(self, started, outcome):
+        self.instrumentation.emit("user_loaded", seconds=time.perf_counter() - started, outcome=outcome)
+
+    def _count_user_stat(self, name):
+        with self._stats_lock:
+            self.user_stats[name] += 1
+
+    def _count_lazy_stat(self, name):
+        with self._stats_lock:
+            self.lazy_stats[name] += 1
+
+    def reset_lazy_stats(self):
+        """Resets :attr:`lazy_stats` counters to zero"""
+        with self._stats_lock:
+            self.lazy_stats = {"decoded": 0, "skipped": 0}
+
+    def _decoded_state(self):
+        """Returns state of the current request, decoding
+        pending session cookie first (lazy mode)
+        """
+        state = self._get_state()
+
+        if state.pending_session is not None:
+            login_session = state.pending_session
+            state.pending_session = None
+
+            self._count_lazy_stat("decoded")
+            self.load_session(login_session)
+
+        return state
+
+    def reset_user_stats(self):
+        """Resets :attr:`user_stats` counters to zero"""
+        with self._stats_lock:
+            self.user_stats = {"hits": 0, "misses": 0}
+
+    @property
+    def user_id(self):
+        """Id of user of the current request"""
+        return self._decoded_state().user_id
+
+    @user_id.setter
+    def user_id(self, value):
+        state = self._get_state()
+        state.pending_session = None
+        state.user_id = value
+
+    @property
+    def session_data(self):
+        """It stores data about session of the current request"""
+        return self._decoded_state().session_data
+
+    @session_data.setter
+    def session_data(self, value):
+        state = self._get_state()
+        state.pending_session = None
+        state.session_data = value
+
+    @property
+    def info(self):
+        """Latest information/details of the current request"""
+        return self._get_state().info
+
+    @info.setter
+    def info(self, value):
+        self._get_state().info = value
+
+    @property
+    def logout_user(self):
+        """Flag, when True :meth:`post_request` performs logout on response"""
+        return self._get_state().logout_user
+
+    @logout_user.setter
+    def logout_user(self, value):
+        self._get_state().logout_user = value
+
     @property
     def logout(self):
         return self.logout_user
@@ -189,11 +625,11 @@ class LoginHandler:
         self.logout_user = data
 
     def bound_login_cookie_with_next_response(self, value):
-        """Sets cookie to :attr:`cookies["_login-session"]`
+        """Sets cookie to be sent with response of the current request
 
         :param value: Encrypted cookie as string
         """
-        self.cookies["_login-session"] = value
+        self._get_state().login_cookie = value
 
     def init_login(self, user):
         """Sets necessary settings, cookies to login user
@@ -208,27 +644,157 @@ class LoginHandler:
             raise Exception("Invalid type of user")
 
         #: Preparing Cookie to sent over next response
-        cookie = {
-            "_user-id": user.get_id(),
-            "_accessed-timeout": get_time_from_seconds(self.ACCESSED_TIMEOUT),
-            "_valid-session": True
-        }
-
-        #: Converting Object to json
-        json_cookie = json.dumps(cookie)
+        #: Expiry is stored as epoch seconds
+        session = Session(
+            user.get_id(),
+            expires_at=get_epoch_from_seconds(self.ACCESSED_TIMEOUT),
+            issued_at=get_issued_at(),
+            session_id=tokens.new_token_session_id(),
+            remember=self.REMEMBER,
+            fresh=True
+        )
 
-        #: encrypting cookie for security purposes
-        encrypted_cookie = Cipher.encrypt(json_cookie, self.app.secret_key)
+        #: Converting Object to token
+        #: protected with :attr:`backend` for security purposes
+        if self.session_store is not None:
+            session = session.replace(session_id=tokens.new_session_id())
+            encrypted_cookie = self._store_session(session)
+        else:
+            encrypted_cookie = self.dumps_session(session)
 
         #: bounded encrypted cookies to next response
         self.bound_login_cookie_with_next_response(encrypted_cookie)
 
-        self.user_id = user.get_id()
-        self.session_data = cookie
+        self.user_id = session.user_id
+        self.session_data = session
 
         #: updating :attr:`info`
         self.info = "User logged in"
 
+    @property
+    def session_attributes(self):
+        """Attributes of session of the current request,
+        see :class:`session.SessionAttributes`
+        """
+        return SessionAttributes(self)
+
+    def set_session_attribute(self, name, value):
+        """Sets attribute of session of the current request, session is
+        saved on response only if value actually changed
+
+        :param name: Name of attribute as string
+        :param value: str, int, float, bool, None or list of them
+        """
+        check_attribute(name, value)
+
+        session = self.session_data
+        if session is None:
+            raise Exception("Session attributes need logged in user")
+
+        attributes = session.attributes
+        if name in attributes and type(attributes[name]) is type(value) and attributes[name] == value:
+            return
+
+        self._replace_attributes(session, {**attributes, name: value})
+
+    def delete_session_attribute(self, name):
+        """Removes attribute of session of the current request
+
+        :raise KeyError: If session has no such attribute
+        """
+        session = self.session_data
+        if session is None or name not in session.attributes:
+            raise KeyError(name)
+
+        attributes = dict(session.attributes)
+        del attributes[name]
+
+        self._replace_attributes(session, attributes)
+
+    def _replace_attributes(self, session, attributes):
+        #: Over budget attributes fail in view, not on response
+        if attributes:
+            self.encode_attributes(attributes)
+
+            if self.backend is backends.CIPHER and not tokens.is_session_id(session.session_id or ""):
+                warnings.warn("Session attributes make cipher tokens many times larger and slower "
+                              "than a separate cookie, use \"hmac\" crypto backend or a session store",
+                              stacklevel=3)
+
+        state = self._get_state()
+        state.session_data = session.replace(extra=attributes)
+        state.attributes_changed = True
+
+    def _save_attributes(self, state):
+        """Saves session with changed attributes
+
+        :return: Token for ``_login-session`` cookie
+        """
+        session = state.session_data
+        state.attributes_changed = False
+
+        #: Server-side session keeps its id and cookie, only the store is updated
+        if tokens.is_session_id(session.session_id or ""):
+            self._store_write("add", session.session_id, session.user_id, dict(session), session.issued_at,
+                              session.expires_at)
+            return state.login_cookie
+
+        return self.dumps_session(session)
+
+    def _store_session(self, session):
+        """Adds session to :attr:`session_store`
+
+        :param session: :class:`Session` with id from :func:`tokens.new_session_id`
+        :return: Token carrying only session id
+        """
+        session_id = session.session_id
+
+        #: Stores keep plain dicts, e.g. to dump them to json
+        args = (session_id, session.user_id, dict(session), session.issued_at, session.expires_at)
+
+        if self.session_store_is_async:
+            self._get_state().store_writes.append((self._add_session_async, args))
+        else:
+            self._add_session(*args)
+
+        return session_id
+
+    def _add_session(self, session_id, user_id, session, issued_at, expires_at):
+        self.session_store.add(session_id, user_id, session, issued_at, expires_at)
+
+        #: Revokes oldest sessions beyond the limit
+        if self.MAX_SESSIONS_PER_USER:
+            session_ids = self.session_store.sessions_of(user_id)
+
+            for old_session_id in session_ids[:-self.MAX_SESSIONS_PER_USER]:
+                self.session_store.delete(old_session_id)
+
+    async def _add_session_async(self, session_id, user_id, session, issued_at, expires_at):
+        await self.session_store.add(session_id, user_id, session, issued_at, expires_at)
+
+        if self.MAX_SESSIONS_PER_USER:
+            session_ids = await self.session_store.sessions_of(user_id)
+
+            for old_session_id in session_ids[:-self.MAX_SESSIONS_PER_USER]:
+                await self.session_store.delete(old_session_id)
+
+    def _store_write(self, name, *args):
+        """Calls write method of :attr:`session_store`, writes to async
+        store are deferred to the end of request, see :meth:`_flush_store_writes`
+        """
+        method = getattr(self.session_store, name)
+
+        if self.session_store_is_async:
+            self._get_state().store_writes.append((method, args))
+        else:
+            method(*args)
+
+    async def _flush_store_writes(self, state):
+        writes, state.store_writes = state.store_writes, []
+
+        for method, args in writes:
+            await method(*args)
+
     def init_logout(self, response):
         """Sets necessary settings, cookies to logout user
         cookies will be sent with next response
@@ -237,61 +803,157 @@ class LoginHandler:
         :return: Flask response
         """
 
-        #: converts object to json
-        json_logout_session = json.dumps(self.cookies["_logout-session"])
+        #: converts object to token, secured with ``secret_key``
+        encrypted_logout_session = self.logout_token()
 
-        #: encrypts it with ``secret_key``
-        encrypted_logout_session = Cipher.encrypt(json_logout_session, self.app.secret_key)
+        self._set_cookie(response, self.logout_cookie_header, encrypted_logout_session)
+
+        if self.instrumentation is not None:
+            self.instrumentation.emit("logout")
+
+        #: Server-side session is removed, so copies of cookie stop working too
+        if self.session_store is not None and self.session_data:
+            session_id = self.session_data.session_id
+
+            if session_id:
+                self._store_write("delete", session_id)
+
+        #: Logged out cookie should not be served from cache anymore
+        state = self._get_state()
+        if self.session_cache is not None and state.session_key is not None:
+            self.session_cache.delete(state.session_key)
+            state.session_key = None
 
-        response.set_cookie(
-            key="_login-session",
-            value=encrypted_logout_session,
-            max_age=0,
-            httponly=self.HTTPONLY,
-            samesite=self.SAMESITE,
-            domain=self.DOMAIN,
-            path=self.PATH
-        )
         self.user_id = None
         self.session_data = None
 
         return response
 
+    @staticmethod
+    def _set_cookie(response, header, value=""):
+        """Adds precompiled ``Set-Cookie`` header with ``value`` to response
+
+        :param header: :class:`cookie_header.CookieHeader` of settings
+        """
+        rendered = header.render(value)
+
+        #: Oversized cookies go through werkzeug, it warns about them
+        if response.max_cookie_size and len(rendered) > response.max_cookie_size:
+            response.set_cookie(header.name, value, **header.attributes)
+        else:
+            response.headers.add("Set-Cookie", rendered)
+
     def pre_request(self):
         """It runs each time any request comes before view function
 
         It checks received cookies and load user
         according to cookies data
         """
+        if self.profiler is None or not self.profiler.sample():
+            return self._pre_request()
+
+        self.profiler.profile("pre_request", self._pre_request)
+        self._get_state().profiled = True
+
+    def _pre_request(self):
+        #: Every request starts with its own fresh state
+        state = self._new_state()
+
+        #: Exempted requests never touch the cookie
+        if self._is_exempt():
+            state.exempt = True
+            return
+
+        login_session = self._login_cookie()
+
+        #: In lazy mode cookie is decoded on first use
+        #: of user or session, see :meth:`_decoded_state`
+        if login_session and self.LAZY_SESSION:
+            state.pending_session = login_session
+            return
+
+        self.load_session(login_session)
+
+    def _login_cookie(self):
+        """Returns ``_login-session`` cookie of the current request
+        Only this cookie is parsed from ``Cookie`` header
+        """
+        header = self._request.headers.get("Cookie")
+
+        return cookie_value(header.encode("latin-1")) if header else None
 
-        login_session = request.cookies.get("_login-session")
+    def load_session(self, login_session, decoded=None):
+        """Decodes session cookie and sets user and session
+        of the current request according to its data
+
+        :param login_session: Raw cookie as string or ``None``
+        :param decoded: Already decoded tuple of session and expiration,
+         e.g. awaited from async session store
+        """
 
         #: Loads user if
         #: cookies is present, valid and logout is not True
         if login_session and not self.logout:
-            decrypted_session = Cipher.decrypt(login_session, self.app.secret_key)
-            obj_session = json.loads(decrypted_session)
+            status, obj_session = self.authenticate(login_session, decoded)
 
-            #: Checks if session is valid
-            if not obj_session.get("_valid-session"):
+            #: Invalid cookie is treated as guest and deleted
+            if status == INVALID or status == MALFORMED:
                 self.user_id = None
+                self._get_state().clear_cookie = True
+
+                if status == MALFORMED:
+                    self.bad_tokens.add(self._request.remote_addr)
+
                 return
 
-            _expiration = obj_session.get("_accessed-timeout")
-            _expiration_date = datetime.datetime.strptime(_expiration, self.time_format)
+            #: Revoked session is treated as guest and its cookie is cleared
+            if status == REVOKED:
+                self.user_id = None
+                self.logout = True
+                return
 
-            #: checks unaccessed expiry date
-            if _expiration_date < datetime.datetime.now():
+            if status == EXPIRED:
                 self.logout = True
 
-            _user_id = obj_session.get("_user-id")
-            self.user_id = _user_id
+            elif status == REFRESH:
+                self._get_state().refresh_session = login_session
+
+            self.user_id = obj_session.user_id
             self.session_data = obj_session
 
+            #: Session of rotated key is moved to current key
+            if tokens.is_stale(login_session, self.keyring):
+                self._get_state().stale_session = login_session
+
             return
         self.user_id = None
         self.session_data = None
 
+    def _refresh_session(self, login_session):
+        """Re-issues current session with a new lifetime
+
+        :return: Token for ``_login-session`` cookie
+        """
+        #: Cookie kept by remember me is no longer from login with credentials
+        session = self.session_data.replace(refreshed_at=int(time.time()), fresh=False)
+
+        self._count_refresh_stat("refreshed")
+
+        #: Server-side session keeps its id, only the store is updated
+        if tokens.is_session_id(login_session):
+            self._store_write("add", login_session, session.user_id, dict(session), session.issued_at,
+                              session.expires_at)
+            return login_session
+
+        return self.dumps_session(session)
+
+    def _cache_key(self, login_session):
+        #: Remembered to remove logged out cookie from cache
+        key = super()._cache_key(login_session)
+        self._get_state().session_key = key
+
+        return key
+
     def post_request(self, response):
         """It runs each time any request comes after view function
 
@@ -302,24 +964,71 @@ class LoginHandler:
         :return:
         """
 
-        login_session = request.cookies.get("_login-session")
+        state = self._get_state()
+
+        if state.exempt:
+            return response
+
+        if state.profiled:
+            self.profiler.profile("post_request", self._post_request, response, state)
+        else:
+            self._post_request(response, state)
+
+        return response
+
+    def _post_request(self, response, state):
+        self.process_response(response, state)
+
+        #: Async session store is called once per request
+        if state.store_writes:
+            self._run_sync(self._flush_store_writes)(state)
+
+    def process_response(self, response, state):
+        """Sets or clears ``_login-session`` cookie on response
+        It is shared by sync and async :meth:`post_request`
+
+        :param response: Response object
+        :param state: :class:`state.RequestState` of the request
+        """
+
+        reason = "login"
+
+        #: Re-issuing session also moves it to current key
+        if state.refresh_session and not state.login_cookie and not self.logout:
+            state.login_cookie = self._refresh_session(state.refresh_session)
+            state.stale_session = None
+            state.attributes_changed = False
+            reason = "refresh"
+
+        #: Cookie of login in this request is replaced too,
+        #: it was encoded before attributes were set
+        if state.attributes_changed and not self.logout:
+            if not state.login_cookie:
+                reason = "attributes"
+
+            state.login_cookie = self._save_attributes(state)
+            state.stale_session = None
 
-        if self.cookies["_login-session"]:
-            response.set_cookie(
-                key="_login-session",
-                value=self.cookies["_login-session"],
-                httponly=self.HTTPONLY,
-                samesite=self.SAMESITE,
-                domain=self.DOMAIN,
-                path=self.PATH,
-                max_age=self.UNACCESSED_TIMEOUT if self.REMEMBER else None,
-                secure=self.SECURE
-            )
+        if state.stale_session and not state.login_cookie and not self.logout:
+            state.login_cookie = tokens.reseal(state.stale_session, self.keyring)
+            state.stale_session = None
+            reason = "rekey"
 
-            self.cookies["_login-session"] = None
+        if state.login_cookie:
+            if self.instrumentation is not None:
+                self.instrumentation.emit("cookie_issued", reason=reason)
+
+            self._set_cookie(response, self.login_cookie_header, state.login_cookie)
+
+            state.login_cookie = None
+            state.clear_cookie = False
 
         if self.logout:
             self.init_logout(response)
             self.logout = False
 
-        return response
+        elif state.clear_cookie:
+            self._set_cookie(response, self.clear_cookie_header)
+
+        if state.pending_session is not None:
+            self._count_lazy_stat("skipped")
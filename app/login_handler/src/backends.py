@@ -0,0 +1,254 @@
+"""Cryptography backends protecting ``_login-session`` tokens.
+
+A backend turns serialized session (bytes) into cookie safe
+token and back. Tokens of every registered backend are readable,
+:meth:`CryptoBackend.matches` tells which backend created a token.
+
+Backends never work on raw secret key, key material is derived once
+with :meth:`CryptoBackend.derive_key` and kept in :class:`DerivedKeys`.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import re
+
+from cipher_kit import Cipher
+
+
+#: Matches unpadded base64url strings
+BASE64URL_RE = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class CryptoBackend:
+    """Interface of cryptography backends
+
+    Subclasses should set :attr:`name` and implement all methods
+    """
+
+    #: Name used to select backend with ``config_settings(crypto_backend=...)``
+    name = None
+
+    #: True if :meth:`unseal` rejects tampered tokens, compact tokens
+    #: of other backends carry their own MAC, see :mod:`tokens`
+    authenticates = False
+
+    def derive_key(self, secret_key):
+        """Derives key material used by :meth:`seal` and :meth:`unseal`
+        It runs once per secret key, not on every request
+
+        :param secret_key: Secret key of app
+        """
+        return secret_key
+
+    def seal(self, payload, key):
+        """Protects payload
+
+        :param payload: Serialized session as bytes
+        :param key: Key material from :meth:`derive_key`
+        :return: Token as string
+        """
+        raise NotImplementedError
+
+    def unseal(self, token, key):
+        """Reverses :meth:`seal`
+
+        :return: Payload as bytes or ``None`` if token is invalid
+        """
+        raise NotImplementedError
+
+    def matches(self, token):
+        """Checks if token looks like it was created by this backend"""
+        raise NotImplementedError
+
+    def is_well_formed(self, token):
+        """Cheap structural check (length, charset) of token matched by
+        this backend, it runs before :meth:`unseal` so garbage never
+        reaches cryptography
+        """
+        return True
+
+
+class CipherBackend(CryptoBackend):
+    """Encrypts tokens with :class:`cipher_kit.Cipher`
+
+    It is the legacy backend, it gives secrecy but doesn't
+    detect tampering, compact tokens add their own MAC.
+    :mod:`cipher_kit` takes the secret key as string, so key
+    material is the secret key itself
+    """
+
+    name = "cipher"
+
+    def seal(self, payload, key):
+        return Cipher.encrypt(payload.decode("latin-1"), key)
+
+    def unseal(self, token, key):
+        try:
+            return Cipher.decrypt(token, key).encode("latin-1")
+        except (UnicodeEncodeError, ValueError):
+            return None
+
+    def matches(self, token):
+        #: Every second character of Cipher output is
+        #: a remainder, that is "\x00" or "\x01"
+        return len(token) > 1 and token[1] in "\x00\x01"
+
+    def is_well_formed(self, token):
+        return len(token) % 2 == 0 and not token[1::2].strip("\x00\x01")
+
+
+class HMACBackend(CryptoBackend):
+    """Signs tokens with truncated HMAC-SHA256
+
+    Payload is only signed, not encrypted. Use it when session
+    needs integrity but not secrecy, it's much faster and
+    produces cookie safe tokens
+    """
+
+    name = "hmac"
+    authenticates = True
+
+    #: Bytes of HMAC-SHA256 appended to payload
+    mac_size = 16
+
+    #: Separates signing key from other uses of secret key
+    salt = b"login_handler.hmac"
+
+    def derive_key(self, secret_key):
+        """Returns HMAC object keyed with key derived from secret key
+        Inner and outer pads are computed here once, each MAC
+        only copies this object
+        """
+        signing_key = hmac.new(secret_key.encode(), self.salt, hashlib.sha256).digest()
+        return hmac.new(signing_key, digestmod=hashlib.sha256)
+
+    def mac(self, payload, key):
+        mac = key.copy()
+        mac.update(payload)
+        return mac.digest()[:self.mac_size]
+
+    def seal(self, payload, key):
+        data = payload + self.mac(payload, key)
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+    def unseal(self, token, key):
+        try:
+            data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (binascii.Error, ValueError):
+            return None
+
+        if len(data) <= self.mac_size:
+            return None
+
+        payload = data[:-self.mac_size]
+
+        #: Constant time comparison
+        if not hmac.compare_digest(self.mac(payload, key), data[-self.mac_size:]):
+            return None
+
+        return payload
+
+    def matches(self, token):
+        return not CIPHER.matches(token)
+
+    def is_well_formed(self, token):
+        #: At least one byte of payload besides MAC
+        return len(token) > (self.mac_size * 4 + 2) // 3 and BASE64URL_RE.fullmatch(token) is not None
+
+
+class DerivedKeys:
+    """Key material of every backend derived from one secret key
+
+    Material of registered backends is derived right away,
+    backends registered later get it on first use
+
+    @param secret_key: Secret key of app
+    """
+
+    #: Length of :attr:`key_id`
+    key_id_size = 4
+
+    def __init__(self, secret_key):
+        self.secret_key = secret_key
+        self._keys = {name: backend.derive_key(secret_key) for name, backend in BACKENDS.items()}
+
+        #: Short id of secret key carried by tokens, it doesn't reveal the key
+        digest = hashlib.sha256(b"login_handler.key-id" + secret_key.encode()).digest()
+        self.key_id = base64.urlsafe_b64encode(digest[:3]).decode()
+
+    def get(self, backend):
+        """Returns key material of backend"""
+        key = self._keys.get(backend.name)
+
+        if key is None:
+            key = backend.derive_key(self.secret_key)
+            self._keys[backend.name] = key
+
+        return key
+
+
+class Keyring:
+    """Current secret key and previous (rotated) secret keys
+
+    New tokens always use :attr:`current` keys, tokens of previous
+    keys stay readable. Keys are looked up by key id in O(1).
+
+    @param secret_key: Current secret key of app
+    @param previous_keys: Previous secret keys, newest first
+    """
+
+    def __init__(self, secret_key, previous_keys=()):
+        self.secrets = (secret_key, tuple(previous_keys))
+
+        self.current = DerivedKeys(secret_key)
+        self.previous = [DerivedKeys(key) for key in previous_keys]
+
+        #: On id collision current and newer keys win
+        self._by_id = {keys.key_id: keys for keys in reversed(self.previous)}
+        self._by_id[self.current.key_id] = self.current
+
+    def find(self, key_id):
+        """Returns :class:`DerivedKeys` of key id or ``None``"""
+        return self._by_id.get(key_id)
+
+
+CIPHER = CipherBackend()
+HMAC = HMACBackend()
+
+#: Registered backends by name
+BACKENDS = {
+    CIPHER.name: CIPHER,
+    HMAC.name: HMAC
+}
+
+
+def register_backend(backend):
+    """Registers custom backend, so it can be selected
+    by its name and its tokens can be read
+
+    :param backend: Instance of :class:`CryptoBackend`
+    """
+    if not isinstance(backend, CryptoBackend):
+        raise Exception("Invalid type of backend")
+
+    BACKENDS[backend.name] = backend
+
+
+def get_backend(name):
+    """Returns registered backend by its name"""
+    if name not in BACKENDS:
+        raise Exception(f"Invalid crypto backend {name}, choose from {tuple(BACKENDS)}")
+
+    return BACKENDS[name]
+
+
+def backend_for_token(token):
+    """Returns backend which created token or ``None``"""
+    #: Custom backends are checked first, as default
+    #: backends together match every token
+    for backend in reversed(BACKENDS.values()):
+        if backend.matches(token):
+            return backend
+
+    return None
@@ -0,0 +1,84 @@
+"""Accounting of malformed and tampered session cookies.
+
+Cookies which fail structural checks or can't be unsealed are counted
+per client address within a time window, so abusive sources can be
+found and throttled (e.g. by a proxy or rate limiter in front of app).
+"""
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class BadTokenCounter:
+    """Bounded, thread safe counters of bad tokens per client
+
+    Least recently seen clients are dropped once :attr:`max_clients`
+    is reached, counts restart after :attr:`window` seconds
+
+    @param max_clients: Max number of tracked clients
+    @param window: Seconds a count is kept
+    """
+
+    def __init__(self, max_clients=10000, window=60):
+        self.max_clients = max_clients
+        self.window = window
+
+        #: client -> [window start on :func:`time.monotonic` clock, count]
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+        #: Bad tokens of all clients since creation
+        self.total = 0
+
+    def add(self, client):
+        """Counts bad token of client
+
+        :param client: Address of client, e.g. ``request.remote_addr``
+        :return: Count of client in current window
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            self.total += 1
+            entry = self._clients.get(client)
+
+            if entry is None or now - entry[0] >= self.window:
+                entry = [now, 0]
+                self._clients[client] = entry
+
+                if len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client)
+
+            entry[1] += 1
+
+            return entry[1]
+
+    def count(self, client):
+        """Returns count of client in current window"""
+        with self._lock:
+            entry = self._clients.get(client)
+
+            if entry is None or time.monotonic() - entry[0] >= self.window:
+                return 0
+
+            return entry[1]
+
+    def top(self, number=10):
+        """Returns clients with most bad tokens in current window
+
+        :return: List of ``(client, count)`` tuples, highest count first
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            counts = [(client, entry[1]) for client, entry in self._clients.items() if now - entry[0] < self.window]
+
+        return sorted(counts, key=lambda item: item[1], reverse=True)[:number]
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self.total = 0
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded, thread safe, in-process cache.
+
+    Least recently used entries are evicted once :attr:`max_size`
+    is reached and each entry expires after its ttl.
+
+    @param max_size: Max number of entries
+    @param ttl: Default seconds an entry stays valid, ``None`` means forever
+
+    """
+
+    def __init__(self, max_size, ttl=None):
+        if max_size <= 0:
+            raise ValueError("max_size should be greater than 0")
+
+        self.max_size = max_size
+        self.ttl = ttl
+
+        #: key -> (expiry, value)
+        #: expiry is on :func:`time.monotonic` clock or ``None``
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Returns cached value of key or ``default``
+        on missing or expired entry
+        """
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expiry, value = entry
+            if expiry is not None and expiry <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Stores value for key
+
+        :param ttl: Seconds entry stays valid, defaults to :attr:`ttl`
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expiry = None if ttl is None else time.monotonic() + ttl
+
+        with self._lock:
+            self._data[key] = (expiry, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Removes key from cache, if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Removes all entries from cache"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Returns hits, misses, evictions, size and hit rate of cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
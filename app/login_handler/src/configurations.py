@@ -33,6 +33,75 @@ PATH = "/"
 #: If set's to True cookie only is sent over secure HTTPS connections
 SECURE = False
 
+#: Format of ``_login-session`` token
+#: Choose from these values - "json" (legacy), "compact"
+#: Tokens of both formats are always readable
+SESSION_FORMAT = "json"
+
+#: Backend protecting ``_login-session`` token
+#: Choose from these values - "cipher" (encrypted, legacy), "hmac" (signed only)
+CRYPTO_BACKEND = "cipher"
+
+#: Backends of tokens accepted besides ``CRYPTO_BACKEND``, e.g. "cipher"
+#: while switching to "hmac". Tokens of other backends are invalid, so
+#: signed mode can't be bypassed with a token of a weaker backend
+ACCEPTED_BACKENDS = ()
+
+#: Max number of server-side sessions of one user
+#: Oldest sessions are revoked on login beyond this limit
+#: Only works with session store, set to 0 for no limit (default)
+MAX_SESSIONS_PER_USER = 0
+
+#: If sets to True ``_login-session`` cookie is only decoded when
+#: user or session is actually used by the request
+LAZY_SESSION = False
+
+#: Max number of users kept in cross-request user cache
+#: Set to 0 to disable the cache (default)
+USER_CACHE_SIZE = 0
+
+#: Seconds a cached user stays valid in user cache
+#: Default "300" seconds = 5 minutes
+USER_CACHE_TTL = 60 * 5
+
+#: Max number of decoded ``_login-session`` cookies kept in memory
+#: so repeated cookies skip decryption and parsing
+#: Set to 0 to disable the cache (default)
+SESSION_CACHE_SIZE = 0
+
+#: Seconds a decoded session stays cached, it never outlives
+#: the session's own expiry
+#: Default "300" seconds = 5 minutes
+SESSION_CACHE_TTL = 60 * 5
+
+#: Fraction of ``UNACCESSED_TIMEOUT`` below which remaining lifetime
+#: of a remembered cookie has to drop before it is re-issued
+#: 1 re-issues cookie on every response, 0 never re-issues it
+#: Default "0.5", cookie is refreshed once half of its lifetime is gone
+REFRESH_THRESHOLD = 0.5
+
+#: Max number of user ids passed to batch user loader in one call
+#: See ``init_user_batch_callback`` and ``resolve_sessions``
+USER_BATCH_SIZE = 500
+
+#: Max bytes of session attributes kept in ``_login-session`` token
+#: (after compression), see ``data.attributes``
+#: Default "256" bytes
+ATTRIBUTES_BUDGET = 256
+
+#: Attributes encoded to more bytes than this are compressed with zlib
+#: Set to None to never compress them
+#: Default "96" bytes
+ATTRIBUTES_COMPRESSION_THRESHOLD = 96
+
+#: Endpoints, blueprints and url path prefixes which skip
+#: login handler entirely, views of them always see a guest
+#: They are extended with ``LOGIN_EXEMPT_ENDPOINTS``, ``LOGIN_EXEMPT_BLUEPRINTS``
+#: and ``LOGIN_EXEMPT_PATHS`` of app config
+EXEMPT_ENDPOINTS = ("static",)
+EXEMPT_BLUEPRINTS = ()
+EXEMPT_PATHS = ()
+
 keys = {
 	"_login-session"
 	"_session-id",
@@ -0,0 +1,83 @@
+"""Precompiled ``Set-Cookie`` headers.
+
+Attributes of ``_login-session`` cookie only change with settings, so
+they are serialized once by :func:`werkzeug.http.dump_cookie` and each
+issued cookie only quotes its value. Output is byte-identical to
+``response.set_cookie`` with the same arguments.
+"""
+import re
+import time
+
+from email.utils import formatdate
+
+from werkzeug.http import dump_cookie
+
+#: Placeholder of ``Expires`` attribute while compiling header
+_EXPIRES = "\x00expires\x00"
+
+#: Values matching it are sent unquoted, same rules as werkzeug (RFC 6265)
+_NO_QUOTE_RE = re.compile(r"[\w!#$%&'()*+\-./:<=>?@\[\]^`{|}~]*", re.A)
+
+#: Escapes of UTF-8 bytes (as latin-1 characters) in quoted values,
+#: werkzeug leaves bytes 0x1a-0x1f as they are
+_SLASH_TABLE = {ord('"'): '\\"', ord("\\"): "\\\\"}
+_SLASH_TABLE.update((byte, "\\%03o" % byte) for byte in [*range(0x1A), *b",;", *range(0x7F, 256)])
+
+
+def quote_cookie_value(value):
+    """Quotes cookie value like :func:`werkzeug.http.dump_cookie`,
+    non-ASCII bytes and separators are slash-escaped
+    """
+    if _NO_QUOTE_RE.fullmatch(value):
+        return value
+
+    return '"' + value.encode().decode("latin-1").translate(_SLASH_TABLE) + '"'
+
+
+class CookieHeader:
+    """``Set-Cookie`` header of one cookie with its attributes rendered once
+
+    With ``max_age`` and no ``expires``, ``Expires`` depends on current
+    time, it is rendered at most once per second
+
+    @param name: Name of cookie
+    @param attributes: Keyword arguments of ``response.set_cookie``
+    """
+
+    __slots__ = ("name", "attributes", "prefix", "head", "tail", "_expires")
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+        dynamic = attributes.get("expires") is None and attributes.get("max_age") is not None
+        header = dump_cookie(name, "", **(dict(attributes, expires=_EXPIRES) if dynamic else attributes), max_size=0)
+
+        #: ``name=`` and attributes after value
+        self.prefix, suffix = header.split("=", 1)
+        self.prefix += "="
+
+        if dynamic:
+            self.head, self.tail = suffix.split(_EXPIRES)
+        else:
+            self.head, self.tail = suffix, None
+
+        #: Last rendered ``Expires`` as ``(second, date)``
+        self._expires = (None, None)
+
+    def render(self, value=""):
+        """Returns header value of cookie with ``value``"""
+        if self.tail is None:
+            return self.prefix + quote_cookie_value(value) + self.head
+
+        return self.prefix + quote_cookie_value(value) + self.head + self._expires_date() + self.tail
+
+    def _expires_date(self):
+        second = int(time.time() + self.attributes["max_age"])
+
+        expires = self._expires
+        if expires[0] != second:
+            expires = (second, formatdate(second, usegmt=True))
+            self._expires = expires
+
+        return expires[1]
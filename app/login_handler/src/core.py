@@ -0,0 +1,837 @@
+"""Framework-free core of login handler.
+
+:class:`SessionCore` holds settings, keys, caches and stores, and
+encodes, decodes and checks expiry of ``_login-session`` tokens without
+touching any request object. :class:`LoginHandler` is its Flask adapter,
+:mod:`middleware` exposes it as plain WSGI and ASGI middleware.
+"""
+from .configurations import ACCESSED_TIMEOUT
+from .configurations import DOMAIN
+from .configurations import HTTPONLY
+from .configurations import PATH
+from .configurations import REMEMBER
+from .configurations import SAMESITE
+from .configurations import SECURE
+from .configurations import SESSION_FORMAT
+from .configurations import CRYPTO_BACKEND
+from .configurations import ACCEPTED_BACKENDS
+from .configurations import MAX_SESSIONS_PER_USER
+from .configurations import LAZY_SESSION
+from .configurations import REFRESH_THRESHOLD
+from .configurations import USER_BATCH_SIZE
+from .configurations import ATTRIBUTES_BUDGET
+from .configurations import ATTRIBUTES_COMPRESSION_THRESHOLD
+from .configurations import UNACCESSED_TIMEOUT
+from .configurations import USER_CACHE_SIZE
+from .configurations import USER_CACHE_TTL
+from .configurations import SESSION_CACHE_SIZE
+from .configurations import SESSION_CACHE_TTL
+
+from .cache import LRUCache
+
+from .stores import SessionStore
+from .stores import AsyncSessionStore
+
+from .revocation import RevocationList
+
+from .metrics import Instrumentation
+
+from .bad_tokens import BadTokenCounter
+
+from .cookie_header import CookieHeader
+
+from .session import Session
+
+from .helpers import get_epoch_from_seconds
+
+from . import backends
+from . import tokens
+
+import hashlib
+import re
+import threading
+import time
+
+
+#: Name of session cookie
+COOKIE_NAME = "_login-session"
+
+#: Results of :meth:`SessionCore.authenticate`
+#: ``refresh`` is a valid session whose cookie should be re-issued
+VALID = "valid"
+REFRESH = "refresh"
+EXPIRED = "expired"
+REVOKED = "revoked"
+INVALID = "invalid"
+
+#: Result of :meth:`SessionCore.authenticate` for cookie which is
+#: malformed or can't be unsealed, e.g. garbage sent by bots
+MALFORMED = "malformed"
+
+_cookie_unslash_re = re.compile(rb"\\([0-3][0-7]{2}|.)")
+
+
+def _cookie_unslash(match):
+    value = match.group(1)
+
+    if len(value) == 1:
+        return value
+
+    return int(value, 8).to_bytes(1, "big")
+
+
+def cookie_value(header, name=COOKIE_NAME.encode()):
+    """Finds value of one cookie in raw ``Cookie`` header
+
+    Only the requested cookie is parsed, other cookies are skipped.
+    Values quoted by :func:`werkzeug.http.dump_cookie` are unquoted.
+
+    :param header: ``Cookie`` header as bytes
+    :param name: Name of cookie as bytes
+    :return: Value as string or ``None`` when cookie is missing
+    """
+    if not header:
+        return None
+
+    start = 0
+    while True:
+        index = header.find(name, start)
+        if index == -1:
+            return None
+
+        start = index + len(name)
+
+        #: Name has to start a pair, e.g. not match "x_login-session"
+        if (index == 0 or header[index - 1] in b"; \t") and header[start:start + 1] == b"=":
+            break
+
+    end = header.find(b";", start)
+    value = header[start + 1:end if end != -1 else len(header)].strip()
+
+    if len(value) > 1 and value[:1] == b'"' and value[-1:] == b'"':
+        value = _cookie_unslash_re.sub(_cookie_unslash, value[1:-1])
+
+    return value.decode(errors="replace")
+
+
+class SessionCore:
+    """Settings, keys, caches and stores of sessions
+
+    It knows nothing about web frameworks, tokens are passed
+    in and out as strings.
+
+    @param secret_key: Secret key, it can also be set later with :meth:`init_keys`
+    @param previous_secret_keys: Previous secret keys still accepted
+    """
+
+    #: Format of expiry in sessions created before epoch expiry
+    time_format = "%d %b %Y"
+
+    #: Template for cookies
+    cookies = {
+        "_logout-session": {
+            "_valid-session": False,
+            "_user-id": None
+        }
+    }
+
+    def __init__(self, secret_key=None, previous_secret_keys=()):
+
+        #: These settings are for session cookies
+        #: This would be used on next cookies
+        #: Check :file:`configurations.py` for more info on
+        #: individual settings
+        self.HTTPONLY = HTTPONLY
+        self.SAMESITE = SAMESITE
+        self.REMEMBER = REMEMBER
+        self.UNACCESSED_TIMEOUT = UNACCESSED_TIMEOUT
+        self.ACCESSED_TIMEOUT = ACCESSED_TIMEOUT
+        self.DOMAIN = DOMAIN
+        self.PATH = PATH
+        self.SECURE = SECURE
+        self.SESSION_FORMAT = SESSION_FORMAT
+        self.CRYPTO_BACKEND = CRYPTO_BACKEND
+
+        #: Backend protecting new tokens, see :mod:`backends`
+        self.backend = backends.get_backend(CRYPTO_BACKEND)
+
+        #: Backends of accepted tokens, :attr:`backend` and ``ACCEPTED_BACKENDS``
+        self.ACCEPTED_BACKENDS = ACCEPTED_BACKENDS
+        self.accepted_backends = self._accepted_backends(ACCEPTED_BACKENDS)
+
+        #: Key material derived from secret keys, see :attr:`keyring`
+        self._keyring = None
+
+        #: Server-side session store, see :meth:`init_session_store`
+        #: ``None`` keeps whole session in cookie
+        self.session_store = None
+        self.session_store_is_async = False
+        self.MAX_SESSIONS_PER_USER = MAX_SESSIONS_PER_USER
+
+        #: Revoked sessions checked on each request, see :meth:`init_revocation_list`
+        self.revocation_list = None
+
+        self.USER_CACHE_SIZE = USER_CACHE_SIZE
+        self.USER_CACHE_TTL = USER_CACHE_TTL
+        self.SESSION_CACHE_SIZE = SESSION_CACHE_SIZE
+        self.SESSION_CACHE_TTL = SESSION_CACHE_TTL
+
+        #: Cross-request cache of loaded users keyed on user id
+        #: ``None`` when disabled, see :meth:`_build_caches`
+        self.user_cache = None
+
+        #: Cache of decoded sessions keyed on hash of raw cookie
+        #: ``None`` when disabled, see :meth:`_build_caches`
+        self.session_cache = None
+
+        #: Malformed cookies per client address, counted by adapters
+        self.bad_tokens = BadTokenCounter()
+
+        #: Callbacks of auth phases, see :meth:`init_instrumentation`
+        self.instrumentation = None
+
+        #: Decoding on first use is up to framework adapters
+        self.LAZY_SESSION = LAZY_SESSION
+
+        self._stats_lock = threading.Lock()
+
+        #: Counts remembered sessions seen by requests
+        #: ``refreshed`` re-issued cookie, ``skipped`` had enough lifetime left
+        self.REFRESH_THRESHOLD = REFRESH_THRESHOLD
+        self.refresh_stats = {"refreshed": 0, "skipped": 0}
+
+        self.USER_BATCH_SIZE = USER_BATCH_SIZE
+
+        #: Size of session attributes kept in tokens, see :meth:`encode_attributes`
+        self.ATTRIBUTES_BUDGET = ATTRIBUTES_BUDGET
+        self.ATTRIBUTES_COMPRESSION_THRESHOLD = ATTRIBUTES_COMPRESSION_THRESHOLD
+
+        self._build_cookie_headers()
+
+        if secret_key:
+            self.init_keys(secret_key, previous_secret_keys)
+
+    def init_keys(self, secret_key, previous_secret_keys=()):
+        """Derives key material from secret keys, once, out of request's hot path
+
+        :param secret_key: Current secret key
+        :param previous_secret_keys: Previous secret keys still accepted
+        """
+        if not secret_key:
+            raise Exception("Secret Key is not defined")
+
+        self._keyring = backends.Keyring(secret_key, tuple(previous_secret_keys))
+
+        #: Sessions decoded with removed keys should not be served anymore
+        if self.session_cache is not None:
+            self.session_cache.clear()
+
+    @property
+    def keyring(self):
+        """Key material derived from secret keys, see :meth:`init_keys`
+
+        :return: :class:`backends.Keyring`
+        """
+        if self._keyring is None:
+            raise Exception("Secret Key is not defined")
+
+        return self._keyring
+
+    @property
+    def keys(self):
+        """Key material of current secret key
+
+        :return: :class:`backends.DerivedKeys`
+        """
+        return self.keyring.current
+
+    def _run_sync(self, func):
+        raise Exception("Async session store can't be called synchronously, "
+                        "use ASGI middleware or an async framework adapter")
+
+    def init_session_store(self, store):
+        """Enables server-side sessions
+
+        Cookie of new sessions will only carry an opaque session id,
+        session itself is kept in store
+
+        :param store: Instance of :class:`stores.SessionStore` or :class:`stores.AsyncSessionStore`,
+         ``None`` disables server-side sessions
+        """
+        if store is not None and not isinstance(store, (SessionStore, AsyncSessionStore)):
+            raise Exception("Invalid type of session store")
+
+        self.session_store = store
+        self.session_store_is_async = isinstance(store, AsyncSessionStore)
+
+    def init_instrumentation(self, instrumentation):
+        """Enables instrumentation of auth phases
+
+        :param instrumentation: Instance of :class:`metrics.Instrumentation`, ``None`` disables it
+        :return: instrumentation
+        """
+        if instrumentation is not None and not isinstance(instrumentation, Instrumentation):
+            raise Exception("Invalid type of instrumentation")
+
+        self.instrumentation = instrumentation
+
+        return instrumentation
+
+    def init_revocation_list(self, revocation_list):
+        """Enables revocation of sessions kept in cookies
+
+        :param revocation_list: Instance of :class:`revocation.RevocationList`, ``None`` disables it
+        """
+        if revocation_list is not None and not isinstance(revocation_list, RevocationList):
+            raise Exception("Invalid type of revocation list")
+
+        self.revocation_list = revocation_list
+
+    def list_sessions(self, user_id):
+        """Returns ids of active server-side sessions of user, oldest first
+
+        With :class:`stores.AsyncSessionStore` it returns an awaitable
+        and so do :meth:`revoke_session` and :meth:`revoke_user_sessions`
+        """
+        if self.session_store is None:
+            raise Exception("Session store is not defined")
+
+        return self.session_store.sessions_of(user_id)
+
+    def revoke_session(self, session_id, expires_at=None):
+        """Revokes one session, e.g. one device of user
+
+        Server-side session is removed from :attr:`session_store`,
+        session kept in cookie is added to :attr:`revocation_list`
+
+        :param session_id: ``_session-id`` of session
+        :param expires_at: Epoch seconds when session expires anyway,
+         defaults to longest possible lifetime of session
+        """
+        self._check_revocable()
+
+        if self.revocation_list is not None:
+            if expires_at is None:
+                expires_at = get_epoch_from_seconds(self.ACCESSED_TIMEOUT)
+
+            self.revocation_list.revoke_session(session_id, expires_at)
+
+        if self.session_store is not None:
+            return self.session_store.delete(session_id)
+
+    def revoke_user_sessions(self, user_id, issued_before=None):
+        """Revokes every session of user issued before watermark
+
+        :param user_id: Id of user as string
+        :param issued_before: Epoch seconds, defaults to now
+        :return: Number of revoked server-side sessions
+        """
+        self._check_revocable()
+
+        if self.revocation_list is not None:
+            self.revocation_list.revoke_user(user_id, issued_before)
+
+        if self.session_store is not None:
+            return self.session_store.delete_user(user_id)
+
+        return 0
+
+    def _check_revocable(self):
+        if self.session_store is None and self.revocation_list is None:
+            raise Exception("Neither session store nor revocation list is defined")
+
+    def config_settings(
+            self,
+            httponly=HTTPONLY,
+            samesite=SAMESITE,
+            remember=REMEMBER,
+            unaccessed_timeout=UNACCESSED_TIMEOUT,
+            accessed_timeout=ACCESSED_TIMEOUT,
+            domain=DOMAIN,
+            path=PATH,
+            secure=SECURE,
+            session_format=SESSION_FORMAT,
+            crypto_backend=CRYPTO_BACKEND,
+            accepted_backends=ACCEPTED_BACKENDS,
+            max_sessions_per_user=MAX_SESSIONS_PER_USER,
+            lazy_session=LAZY_SESSION,
+            user_cache_size=USER_CACHE_SIZE,
+            user_cache_ttl=USER_CACHE_TTL,
+            session_cache_size=SESSION_CACHE_SIZE,
+            session_cache_ttl=SESSION_CACHE_TTL,
+            refresh_threshold=REFRESH_THRESHOLD,
+            user_batch_size=USER_BATCH_SIZE,
+            attributes_budget=ATTRIBUTES_BUDGET,
+            attributes_compression_threshold=ATTRIBUTES_COMPRESSION_THRESHOLD
+    ):
+        """
+
+        :param httponly: If sets to True cookies will only be available in requests and responses
+        :param samesite: The ``samesite`` attribute of cookies is used to control how cookies are sent by the
+         browser in cross-site requests.
+        :param remember: On True, will remember session for :attr:`unaccessed_timeout` time period
+        :param unaccessed_timeout: It expires session after :attr:`unaccessed_timeout` until user
+         login again with credentials instead of sessions
+        :param accessed_timeout: Time of cookie to expire if client doesn't visit at least one time
+        :param domain: Domain of cookies
+        :param path: Path of cookies
+        :param secure: If set's to True cookie will only be sent over secure HTTPS connections
+        :param session_format: Format of new session tokens, "json" (legacy) or "compact"
+        :param crypto_backend: Backend protecting new tokens, "cipher" (encrypted), "hmac" (signed only)
+         or an instance of :class:`backends.CryptoBackend`
+        :param accepted_backends: Backends (names or instances) of tokens accepted besides
+         :attr:`crypto_backend`, tokens of other backends are invalid
+        :param max_sessions_per_user: Max number of server-side sessions of one user, 0 for no limit
+        :param lazy_session: If sets to True session cookie is only decoded when user or session is used
+        :param user_cache_size: Max number of users kept in memory across requests, 0 disables the cache
+        :param user_cache_ttl: Seconds a cached user stays valid
+        :param session_cache_size: Max number of decoded session cookies kept in memory, 0 disables the cache
+        :param session_cache_ttl: Seconds a decoded session stays cached, capped at session's expiry
+        :param refresh_threshold: With remember, cookie is re-issued once less than this fraction
+         of :attr:`unaccessed_timeout` is left, 1 re-issues it on every response
+        :param user_batch_size: Max number of user ids passed to batch user loader in one call
+        :param attributes_budget: Max bytes of session attributes kept in token, after compression
+        :param attributes_compression_threshold: Attributes encoded to more bytes are compressed,
+         ``None`` never compresses them
+
+        """
+        self.HTTPONLY = httponly
+        self.REMEMBER = remember
+        self.UNACCESSED_TIMEOUT = unaccessed_timeout
+        self.ACCESSED_TIMEOUT = accessed_timeout
+        self.DOMAIN = domain
+        self.PATH = path
+        self.SECURE = secure
+
+        #: Combination of (samesite=None, secure=False) is invalid.
+        #: In order to samesite be None secure have to be True
+        if samesite is None and self.SECURE is False:
+            raise Exception(f"Invalid combination of values (samesite={samesite}, secure={secure})")
+
+        self.SAMESITE = samesite
+
+        if session_format not in tokens.SESSION_FORMATS:
+            raise Exception(f"Invalid session format {session_format}, choose from {tokens.SESSION_FORMATS}")
+
+        self.SESSION_FORMAT = session_format
+
+        if isinstance(crypto_backend, backends.CryptoBackend):
+            backends.register_backend(crypto_backend)
+            crypto_backend = crypto_backend.name
+
+        self.backend = backends.get_backend(crypto_backend)
+        self.CRYPTO_BACKEND = crypto_backend
+        self._set_accepted_backends(accepted_backends)
+        self.MAX_SESSIONS_PER_USER = max_sessions_per_user
+        self.LAZY_SESSION = lazy_session
+
+        if not 0 <= refresh_threshold <= 1:
+            raise Exception(f"Invalid refresh threshold {refresh_threshold}, choose between 0 and 1")
+
+        self.REFRESH_THRESHOLD = refresh_threshold
+
+        if user_batch_size < 1:
+            raise Exception(f"Invalid user batch size {user_batch_size}, it must be at least 1")
+
+        self.USER_BATCH_SIZE = user_batch_size
+
+        if attributes_budget < 0:
+            raise Exception(f"Invalid attributes budget {attributes_budget}, it can't be negative")
+
+        self.ATTRIBUTES_BUDGET = attributes_budget
+        self.ATTRIBUTES_COMPRESSION_THRESHOLD = attributes_compression_threshold
+
+        self._build_caches(user_cache_size, user_cache_ttl, session_cache_size, session_cache_ttl)
+        self._build_cookie_headers()
+
+    def reset_settings(self):
+        self.HTTPONLY = HTTPONLY
+        self.SAMESITE = SAMESITE
+        self.REMEMBER = REMEMBER
+        self.UNACCESSED_TIMEOUT = UNACCESSED_TIMEOUT
+        self.ACCESSED_TIMEOUT = ACCESSED_TIMEOUT
+        self.DOMAIN = DOMAIN
+        self.PATH = PATH
+        self.SECURE = SECURE
+        self.SESSION_FORMAT = SESSION_FORMAT
+        self.CRYPTO_BACKEND = CRYPTO_BACKEND
+        self.backend = backends.get_backend(CRYPTO_BACKEND)
+        self._set_accepted_backends(ACCEPTED_BACKENDS)
+        self.MAX_SESSIONS_PER_USER = MAX_SESSIONS_PER_USER
+        self.LAZY_SESSION = LAZY_SESSION
+        self.REFRESH_THRESHOLD = REFRESH_THRESHOLD
+        self.USER_BATCH_SIZE = USER_BATCH_SIZE
+        self.ATTRIBUTES_BUDGET = ATTRIBUTES_BUDGET
+        self.ATTRIBUTES_COMPRESSION_THRESHOLD = ATTRIBUTES_COMPRESSION_THRESHOLD
+
+        self._build_caches(USER_CACHE_SIZE, USER_CACHE_TTL, SESSION_CACHE_SIZE, SESSION_CACHE_TTL)
+        self._build_cookie_headers()
+
+    def _build_cookie_headers(self):
+        """(Re)compiles ``Set-Cookie`` headers of ``_login-session``
+        from current settings, see :class:`cookie_header.CookieHeader`
+        """
+        attributes = dict(httponly=self.HTTPONLY, samesite=self.SAMESITE, domain=self.DOMAIN, path=self.PATH)
+
+        #: Session cookie
+        self.login_cookie_header = CookieHeader(
+            COOKIE_NAME, max_age=self.UNACCESSED_TIMEOUT if self.REMEMBER else None, secure=self.SECURE, **attributes
+        )
+
+        #: Cookie replacing session on logout
+        self.logout_cookie_header = CookieHeader(COOKIE_NAME, max_age=0, **attributes)
+
+        #: Cookie deleting invalid session
+        self.clear_cookie_header = CookieHeader(COOKIE_NAME, expires=0, max_age=0, secure=self.SECURE, **attributes)
+
+    def _build_caches(self, user_cache_size, user_cache_ttl, session_cache_size, session_cache_ttl):
+        """(Re)creates :attr:`user_cache` and :attr:`session_cache`
+        A cache is only rebuilt when its size or ttl actually changes
+        """
+        if (self.user_cache is None
+                or (user_cache_size, user_cache_ttl) != (self.USER_CACHE_SIZE, self.USER_CACHE_TTL)):
+            self.USER_CACHE_SIZE = user_cache_size
+            self.USER_CACHE_TTL = user_cache_ttl
+            self.user_cache = LRUCache(user_cache_size, user_cache_ttl) if user_cache_size else None
+
+        if (self.session_cache is None
+                or (session_cache_size, session_cache_ttl) != (self.SESSION_CACHE_SIZE, self.SESSION_CACHE_TTL)):
+            self.SESSION_CACHE_SIZE = session_cache_size
+            self.SESSION_CACHE_TTL = session_cache_ttl
+            self.session_cache = LRUCache(session_cache_size, session_cache_ttl) if session_cache_size else None
+
+    def session_cache_stats(self):
+        """Returns hit rate, size and evictions of :attr:`session_cache`
+        or ``None`` when cache is disabled
+        """
+        if self.session_cache is None:
+            return None
+
+        return self.session_cache.stats()
+
+    def invalidate_user(self, user_id):
+        """Removes user from :attr:`user_cache`
+        Call it whenever user's data changes
+
+        :param user_id: Id of user as string
+        """
+        if self.user_cache is not None:
+            self.user_cache.delete(user_id)
+
+    def invalidate_all(self):
+        """Removes all users from :attr:`user_cache`"""
+        if self.user_cache is not None:
+            self.user_cache.clear()
+
+    def user_cache_stats(self):
+        """Returns hit rate, size and evictions of :attr:`user_cache`
+        or ``None`` when cache is disabled
+        """
+        if self.user_cache is None:
+            return None
+
+        return self.user_cache.stats()
+
+    def _count_refresh_stat(self, name):
+        with self._stats_lock:
+            self.refresh_stats[name] += 1
+
+    def reset_refresh_stats(self):
+        """Resets :attr:`refresh_stats` counters to zero"""
+        with self._stats_lock:
+            self.refresh_stats = {"refreshed": 0, "skipped": 0}
+
+    def authenticate(self, login_session, decoded=None):
+        """Decodes cookie and checks validity, revocation
+        and expiry of its session
+
+        :param login_session: Raw cookie as string
+        :param decoded: Already decoded tuple of session and expiration,
+         e.g. awaited from async session store
+        :return: Tuple of status (:data:`VALID`, :data:`REFRESH`, :data:`EXPIRED`,
+         :data:`REVOKED`, :data:`INVALID` or :data:`MALFORMED`) and :class:`Session`
+        """
+        obj_session, _expiration = decoded or self.decode_session(login_session)
+
+        #: Session dicts of overridden decoders are still accepted
+        if type(obj_session) is not Session:
+            obj_session = Session.from_dict(obj_session)
+
+        #: Checks if session is valid
+        if not obj_session.valid:
+            return (MALFORMED if obj_session.unreadable else INVALID), obj_session
+
+        #: Revoked session is treated as guest and its cookie is cleared
+        if self.revocation_list is not None and self.revocation_list.is_revoked(
+                obj_session.session_id, obj_session.user_id, obj_session.issued_at):
+            return REVOKED, obj_session
+
+        #: checks unaccessed expiry date
+        if _expiration < time.time():
+            status = EXPIRED
+        elif self.REMEMBER:
+            status = self._check_refresh(obj_session)
+        else:
+            return VALID, obj_session
+
+        if status == EXPIRED and self.instrumentation is not None:
+            self.instrumentation.emit("session_expired")
+
+        return status, obj_session
+
+    def identify(self, login_session, decoded=None, client=None):
+        """Returns identity carried by cookie, expired, revoked
+        and invalid sessions are guests
+
+        :param login_session: Raw cookie as string or ``None``
+        :param decoded: Already decoded tuple of session and expiration
+        :param client: Address of client, malformed cookies are counted in :attr:`bad_tokens`
+        :return: Tuple of user id and :class:`Session`, ``(None, None)`` for guest
+        """
+        if not login_session:
+            return None, None
+
+        status, session = self.authenticate(login_session, decoded)
+
+        if status != VALID and status != REFRESH:
+            if status == MALFORMED and client is not None:
+                self.bad_tokens.add(client)
+
+            return None, None
+
+        return session.user_id, session
+
+    def identify_sessions(self, login_sessions):
+        """Returns identities of many cookies at once, e.g. of all
+        connected websockets. Each distinct cookie is decoded once
+
+        Unlike :meth:`identify` it never touches state of the current request
+
+        :param login_sessions: Iterable of raw cookies
+        :return: Dict of cookie and its user id, ``None`` for guest
+        """
+        identities = {}
+
+        for login_session in login_sessions:
+            if login_session in identities:
+                continue
+
+            if not login_session:
+                identities[login_session] = None
+                continue
+
+            #: Adapters record cache key of request's cookie, bulk decoding must not
+            decoded = self._decode_any_session(login_session, self._session_key)
+
+            identities[login_session] = self._identity(login_session, decoded)
+
+        return identities
+
+    async def identify_sessions_async(self, login_sessions):
+        """Awaitable version of :meth:`identify_sessions`
+
+        Sessions of async session store are awaited on the running event loop
+        """
+        identities = {}
+
+        for login_session in login_sessions:
+            if login_session in identities:
+                continue
+
+            if not login_session:
+                identities[login_session] = None
+                continue
+
+            if self.session_store_is_async and tokens.is_session_id(login_session):
+                decoded = await self._load_stored_session_async(login_session)
+            else:
+                decoded = self._decode_any_session(login_session, self._session_key)
+
+            identities[login_session] = self._identity(login_session, decoded)
+
+        return identities
+
+    def _identity(self, login_session, decoded):
+        status, session = self.authenticate(login_session, decoded)
+
+        return session.user_id if status == VALID or status == REFRESH else None
+
+    def _check_refresh(self, session):
+        """Checks if remembered session should be re-issued, once less
+        than :attr:`REFRESH_THRESHOLD` of its lifetime is left
+
+        Lifetime of cookie is :attr:`UNACCESSED_TIMEOUT` from when it was
+        last issued, so most requests skip re-encryption and Set-Cookie
+
+        :return: :data:`VALID`, :data:`REFRESH` or :data:`EXPIRED`
+        """
+        refreshed_at = session.refreshed_at or session.issued_at
+
+        #: Sessions created before refresh times are refreshed once
+        if refreshed_at is None:
+            remaining = 0
+        else:
+            remaining = refreshed_at + self.UNACCESSED_TIMEOUT - time.time()
+
+            #: Cookie wasn't used within its lifetime
+            if remaining <= 0:
+                return EXPIRED
+
+        if remaining < self.UNACCESSED_TIMEOUT * self.REFRESH_THRESHOLD:
+            return REFRESH
+
+        self._count_refresh_stat("skipped")
+
+        return VALID
+
+    def dumps_session(self, session):
+        """Converts session to token of :attr:`SESSION_FORMAT`
+        protected with :attr:`backend`
+
+        :param session: :class:`Session` or dict with keys of json tokens
+        :return: Token as string
+        """
+        attributes = session.get("_extra")
+        extra = self.encode_attributes(attributes) if attributes else None
+
+        if self.SESSION_FORMAT == tokens.COMPACT_FORMAT:
+            session = Session.from_dict(session)
+
+            return tokens.dumps_compact(
+                session.user_id, True, session.issued_at or session.refreshed_at or 0,
+                session.expires_at, self.keys, self.backend, session_id=session.session_id,
+                refreshed_at=session.refreshed_at, remember=session.remember, fresh=session.fresh, extra=extra
+            )
+
+        return tokens.dumps_json(session, self.keys, self.backend, extra=extra)
+
+    def encode_attributes(self, attributes):
+        """Encodes session attributes for ``extra`` slot of token,
+        compressed over :attr:`ATTRIBUTES_COMPRESSION_THRESHOLD`
+
+        :param attributes: Dict of attributes
+        :return: Tuple of bytes and True if they are compressed
+        """
+        encoded, compressed = tokens.dumps_attributes(attributes, self.ATTRIBUTES_COMPRESSION_THRESHOLD)
+
+        if len(encoded) > self.ATTRIBUTES_BUDGET:
+            raise Exception(f"Session attributes take {len(encoded)} bytes, "
+                            f"more than budget of {self.ATTRIBUTES_BUDGET} bytes")
+
+        return encoded, compressed
+
+    def logout_token(self):
+        """Returns token of logged out session, it replaces
+        ``_login-session`` cookie on logout
+        """
+        if self.SESSION_FORMAT == tokens.COMPACT_FORMAT:
+            return tokens.dumps_compact(None, False, time.time(), 0, self.keys, self.backend)
+
+        return tokens.dumps_json(self.cookies["_logout-session"], self.keys, self.backend)
+
+    def decode_session(self, login_session):
+        """Decrypts and parses ``_login-session`` cookie
+
+        With :attr:`session_cache` enabled, cookie is decoded once and
+        following requests with the same cookie are served from cache
+
+        :param login_session: Raw cookie as string
+        :return: Tuple of :class:`Session` and its expiration as epoch seconds
+         (``None`` for invalid session)
+        """
+        return self._decode_any_session(login_session, self._cache_key)
+
+    def _decode_any_session(self, login_session, cache_key):
+        """:meth:`decode_session` with cache key from ``cache_key`` function"""
+        #: Garbage is rejected before cache, store and cryptography
+        if not tokens.is_well_formed(login_session):
+            return tokens.UNREADABLE_SESSION, None
+
+        #: Server-side sessions are never cached, revoking them takes effect immediately
+        if tokens.is_session_id(login_session):
+            return self._load_stored_session(login_session)
+
+        if self.session_cache is None:
+            return self._decode_session(login_session)
+
+        return self._decode_cached_session(login_session, cache_key(login_session))
+
+    def _decode_cached_session(self, login_session, key):
+        #: Sessions are immutable, cached one is shared by requests
+        cached = self.session_cache.get(key)
+        if cached is not None:
+            return cached
+
+        obj_session, _expiration = self._decode_session(login_session)
+
+        ttl = self.SESSION_CACHE_TTL
+        if _expiration is not None:
+            ttl = min(ttl, _expiration - time.time())
+
+        if ttl > 0:
+            self.session_cache.set(key, (obj_session, _expiration), ttl=ttl)
+
+        return obj_session, _expiration
+
+    def _cache_key(self, login_session):
+        return self._session_key(login_session)
+
+    @staticmethod
+    def _session_key(login_session):
+        return hashlib.sha256(login_session.encode()).digest()
+
+    def _load_stored_session(self, session_id):
+        if self.session_store_is_async:
+            stored = self._run_sync(self.session_store.get)(session_id)
+        else:
+            stored = self.session_store.get(session_id) if self.session_store is not None else None
+
+        return self._stored_session(stored)
+
+    async def _load_stored_session_async(self, session_id):
+        if not tokens.is_well_formed(session_id):
+            return tokens.UNREADABLE_SESSION, None
+
+        return self._stored_session(await self.session_store.get(session_id))
+
+    @staticmethod
+    def _stored_session(stored):
+        if stored is None:
+            return tokens.INVALID_SESSION, None
+
+        return Session.from_dict(stored[0]), stored[1]
+
+    def _set_accepted_backends(self, accepted_backends):
+        accepted = self._accepted_backends(accepted_backends)
+
+        #: Sessions decoded from tokens of backends no longer accepted should not be served anymore
+        if accepted != self.accepted_backends and self.session_cache is not None:
+            self.session_cache.clear()
+
+        self.ACCEPTED_BACKENDS = accepted_backends
+        self.accepted_backends = accepted
+
+    def _accepted_backends(self, accepted_backends):
+        accepted = {self.backend}
+
+        for backend in accepted_backends:
+            if isinstance(backend, backends.CryptoBackend):
+                backends.register_backend(backend)
+                backend = backend.name
+
+            accepted.add(backends.get_backend(backend))
+
+        return frozenset(accepted)
+
+    def _decode_session(self, login_session):
+        if self.instrumentation is None:
+            return tokens.loads(login_session, self.keyring, self.time_format, self.accepted_backends)
+
+        started = time.perf_counter()
+        decoded = tokens.loads(login_session, self.keyring, self.time_format, self.accepted_backends)
+        self.instrumentation.emit("session_decoded", seconds=time.perf_counter() - started)
+
+        if decoded[0].unreadable:
+            self.instrumentation.emit("decrypt_failed")
+
+        return decoded
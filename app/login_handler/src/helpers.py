@@ -1,4 +1,6 @@
 import datetime
+import math
+import time
 
 
 def verify_user(user):
@@ -41,10 +43,13 @@ def get_time_from_seconds(seconds):
     return then.strftime("%d %b %Y")
 
 
+def get_epoch_from_seconds(seconds):
+    """Returns epoch seconds (as integer) after given seconds from now"""
+    return int(time.time()) + seconds
 
 
-
-
-
-
-
+def get_issued_at():
+    """Returns epoch seconds of now with millisecond precision, rounded up,
+    so session issued right after a revocation is never older than it
+    """
+    return math.ceil(time.time() * 1000) / 1000
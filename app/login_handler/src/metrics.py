@@ -0,0 +1,222 @@
+"""Instrumentation of auth phases.
+
+:class:`Instrumentation` dispatches events to callbacks, :class:`Metrics`
+is a built-in set of callbacks keeping counters and histograms which are
+rendered in Prometheus text format. With no instrumentation set, hooks
+cost a single ``is None`` check.
+
+Events and their keyword arguments
+
+- ``session_decoded``: ``seconds`` spent unsealing and parsing a cookie
+- ``decrypt_failed``: cookie couldn't be unsealed or parsed
+- ``session_expired``: session expired or wasn't used within its lifetime
+- ``user_loaded``: ``seconds`` spent in user loader and its ``outcome``,
+  ``"found"``, ``"missing"`` or ``"error"``
+- ``cookie_issued``: ``reason`` is ``"login"``, ``"refresh"``, ``"rekey"`` or ``"attributes"``
+- ``logout``: logout cookie was sent
+"""
+import bisect
+import threading
+
+
+EVENTS = ("session_decoded", "decrypt_failed", "session_expired", "user_loaded", "cookie_issued", "logout")
+
+#: Upper bounds (seconds) of histogram buckets
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0)
+
+#: Content type of :meth:`Metrics.render`
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Instrumentation:
+    """Dispatches events of auth phases to callbacks
+
+    Callbacks are called synchronously in the request, keep them cheap
+    """
+
+    def __init__(self):
+        self.callbacks = {event: [] for event in EVENTS}
+
+    def connect(self, event, callback=None):
+        """Registers callback of event, it can be used as decorator
+
+        :param event: One of :data:`EVENTS`
+        :param callback: Function called with keyword arguments of event
+        """
+        if event not in self.callbacks:
+            raise Exception(f"Invalid event {event}, choose from {EVENTS}")
+
+        if callback is None:
+            return lambda func: self.connect(event, func)
+
+        self.callbacks[event].append(callback)
+
+        return callback
+
+    def emit(self, event, **data):
+        for callback in self.callbacks[event]:
+            callback(**data)
+
+
+class Histogram:
+    """Histogram with fixed buckets, not thread safe on its own
+
+    @param buckets: Sorted upper bounds of buckets
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+
+        #: Last count is of "+Inf" bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Counters and histograms of auth phases
+
+    Attach it to :class:`Instrumentation` with :meth:`attach`
+    and render it with :meth:`render`
+
+    @param buckets: Upper bounds (seconds) of latency histograms
+    @param prefix: Prefix of metric names
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="login_handler"):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Resets every metric to zero"""
+        with self._lock:
+            self.decode_seconds = Histogram(self.buckets)
+            self.user_load_seconds = Histogram(self.buckets)
+            self.decrypt_failures = 0
+            self.expired_sessions = 0
+            self.logouts = 0
+            self.user_loads = {"found": 0, "missing": 0, "error": 0}
+            self.cookies_issued = {"login": 0, "refresh": 0, "rekey": 0, "attributes": 0}
+
+    def snapshot(self):
+        """Returns consistent copy of every metric as plain values,
+        histograms as dicts of ``sum``, ``count`` and bucket ``counts``
+        """
+        with self._lock:
+            return {
+                "decode_seconds": self._histogram_snapshot(self.decode_seconds),
+                "user_load_seconds": self._histogram_snapshot(self.user_load_seconds),
+                "decrypt_failures": self.decrypt_failures,
+                "expired_sessions": self.expired_sessions,
+                "logouts": self.logouts,
+                "user_loads": dict(self.user_loads),
+                "cookies_issued": dict(self.cookies_issued),
+            }
+
+    @staticmethod
+    def _histogram_snapshot(histogram):
+        return {"sum": histogram.sum, "count": histogram.count, "counts": list(histogram.counts)}
+
+    def attach(self, instrumentation):
+        """Connects callbacks of metrics to instrumentation
+
+        :return: instrumentation
+        """
+        instrumentation.connect("session_decoded", self.on_session_decoded)
+        instrumentation.connect("decrypt_failed", self.on_decrypt_failed)
+        instrumentation.connect("session_expired", self.on_session_expired)
+        instrumentation.connect("user_loaded", self.on_user_loaded)
+        instrumentation.connect("cookie_issued", self.on_cookie_issued)
+        instrumentation.connect("logout", self.on_logout)
+
+        return instrumentation
+
+    def on_session_decoded(self, seconds):
+        with self._lock:
+            self.decode_seconds.observe(seconds)
+
+    def on_decrypt_failed(self):
+        with self._lock:
+            self.decrypt_failures += 1
+
+    def on_session_expired(self):
+        with self._lock:
+            self.expired_sessions += 1
+
+    def on_user_loaded(self, seconds, outcome):
+        with self._lock:
+            self.user_load_seconds.observe(seconds)
+            self.user_loads[outcome] += 1
+
+    def on_cookie_issued(self, reason):
+        with self._lock:
+            self.cookies_issued[reason] += 1
+
+    def on_logout(self):
+        with self._lock:
+            self.logouts += 1
+
+    def render(self):
+        """Returns metrics in Prometheus text exposition format"""
+        lines = []
+
+        with self._lock:
+            self._render_histogram(lines, "session_decode_seconds", "Time spent unsealing and parsing session cookies",
+                                   self.decode_seconds)
+            self._render_counter(lines, "decrypt_failures_total", "Session cookies which couldn't be decoded",
+                                 self.decrypt_failures)
+            self._render_counter(lines, "sessions_expired_total", "Expired sessions received", self.expired_sessions)
+            self._render_histogram(lines, "user_load_seconds", "Time spent in user loader", self.user_load_seconds)
+            self._render_counter(lines, "user_loads_total", "Calls of user loader by outcome", self.user_loads,
+                                 "outcome")
+            self._render_counter(lines, "cookies_issued_total", "Session cookies issued by reason",
+                                 self.cookies_issued, "reason")
+            self._render_counter(lines, "logouts_total", "Logout cookies issued", self.logouts)
+
+        return "\n".join(lines) + "\n"
+
+    def wsgi_app(self, environ, start_response):
+        """WSGI app serving :meth:`render` on any path
+
+        Run it on a listener of its own (e.g. an internal port) which
+        only the scraper can reach, so metrics aren't served to clients
+        of the app whatever proxies are in front of it
+        """
+        body = self.render().encode()
+        start_response("200 OK", [("Content-Type", CONTENT_TYPE), ("Content-Length", str(len(body)))])
+
+        return [body]
+
+    def _render_counter(self, lines, name, help_text, value, label=None):
+        name = f"{self.prefix}_{name}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+
+        if label is None:
+            lines.append(f"{name} {value}")
+            return
+
+        for label_value, count in value.items():
+            lines.append(f'{name}{{{label}="{label_value}"}} {count}')
+
+    def _render_histogram(self, lines, name, help_text, histogram):
+        name = f"{self.prefix}_{name}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+
+        lines.append(f'{name}_bucket{{le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum {histogram.sum!r}")
+        lines.append(f"{name}_count {histogram.count}")
@@ -0,0 +1,73 @@
+"""WSGI and ASGI middleware sharing sessions with :class:`LoginHandler`.
+
+Middleware reads only the ``_login-session`` cookie from raw ``Cookie``
+header, no request object is built. Identity is put into WSGI environ
+or ASGI scope under :data:`USER_ID_KEY` and :data:`SESSION_KEY`, both are
+``None`` for guests. Cookie is only read, it is never re-issued or cleared.
+Malformed cookies are counted per client in ``core.bad_tokens``.
+
+    core = SessionCore(secret_key)
+    app = WSGILoginMiddleware(app, core)
+
+    def view(environ, start_response):
+        user_id = environ[USER_ID_KEY]
+"""
+from .core import cookie_value
+
+from . import tokens
+
+
+#: Key of user id in environ or scope
+USER_ID_KEY = "login_handler.user_id"
+
+#: Key of :class:`session.Session` in environ or scope
+SESSION_KEY = "login_handler.session"
+
+
+class WSGILoginMiddleware:
+    """WSGI middleware identifying user of request
+
+    @param app: WSGI application
+    @param core: :class:`core.SessionCore` (or :class:`LoginHandler`) holding keys and settings
+    """
+
+    def __init__(self, app, core):
+        self.app = app
+        self.core = core
+
+    def __call__(self, environ, start_response):
+        header = environ.get("HTTP_COOKIE")
+        login_session = cookie_value(header.encode("latin-1")) if header else None
+
+        environ[USER_ID_KEY], environ[SESSION_KEY] = self.core.identify(login_session, client=environ.get("REMOTE_ADDR"))
+
+        return self.app(environ, start_response)
+
+
+class ASGILoginMiddleware:
+    """ASGI middleware identifying user of http and websocket connections
+
+    Session of :class:`stores.AsyncSessionStore` is awaited on the event loop
+
+    @param app: ASGI application
+    @param core: :class:`core.SessionCore` (or :class:`LoginHandler`) holding keys and settings
+    """
+
+    def __init__(self, app, core):
+        self.app = app
+        self.core = core
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" or scope["type"] == "websocket":
+            login_session = cookie_value(b"; ".join(value for name, value in scope["headers"] if name == b"cookie"))
+            decoded = None
+
+            if login_session and self.core.session_store_is_async and tokens.is_session_id(login_session):
+                decoded = await self.core._load_stored_session_async(login_session)
+
+            client = scope.get("client")
+
+            scope = dict(scope)
+            scope[USER_ID_KEY], scope[SESSION_KEY] = self.core.identify(login_session, decoded, client and client[0])
+
+        await self.app(scope, receive, send)
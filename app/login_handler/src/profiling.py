@@ -0,0 +1,190 @@
+"""Sampling profiler of auth phases.
+
+A configurable fraction of requests is profiled, only while
+``pre_request``, user loading and ``post_request`` run. Every call made
+in these phases is traced with :func:`sys.setprofile` and its self time
+is added to its call stack. Stacks of all sampled requests are kept in
+memory and dumped in collapsed-stack format, one ``frame;frame;frame
+microseconds`` line per stack, ready for ``flamegraph.pl`` or speedscope.
+
+Unsampled requests only pay for one :func:`random.random` call.
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+from collections import Counter
+
+
+#: Phases profiled by :class:`LoginHandler`, they are root frames of stacks
+PHASES = ("pre_request", "load_user", "post_request")
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _builtin_name(function):
+    module = getattr(function, "__module__", None)
+    owner = getattr(function, "__self__", None)
+
+    #: Methods of builtin types, e.g. ``dict.get``
+    if module is None and owner is not None and not isinstance(owner, type(sys)):
+        module = type(owner).__module__
+        return f"{module}.{type(owner).__qualname__}.{function.__name__}"
+
+    return f"{module or 'builtins'}.{getattr(function, '__qualname__', function.__name__)}"
+
+
+class _Collector:
+    """Profile function of :func:`sys.setprofile` summing self time per stack"""
+
+    __slots__ = ("stack", "stacks")
+
+    def __init__(self, phase):
+        #: ``[stack, started, time of children]`` of each frame being run
+        self.stack = [[phase, time.perf_counter(), 0.0]]
+        self.stacks = Counter()
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+
+        if event == "call":
+            self.stack.append([f"{self.stack[-1][0]};{_frame_name(frame)}", now, 0.0])
+        elif event == "c_call":
+            self.stack.append([f"{self.stack[-1][0]};{_builtin_name(arg)}", now, 0.0])
+        elif len(self.stack) > 1:
+            self._pop(now)
+
+    def _pop(self, now):
+        stack, started, children = self.stack.pop()
+        elapsed = now - started
+
+        self.stacks[stack] += elapsed - children
+        self.stack[-1][2] += elapsed
+
+    def finish(self):
+        now = time.perf_counter()
+
+        while len(self.stack) > 1:
+            self._pop(now)
+
+        stack, started, children = self.stack[0]
+        self.stacks[stack] += now - started - children
+
+        return self.stacks
+
+
+class SamplingProfiler:
+    """Profiles auth phases of a fraction of requests
+
+    Enable it with :meth:`LoginHandler.init_profiler`, read results
+    with :meth:`dump` or let it write them every ``interval`` seconds
+
+    @param rate: Fraction of requests profiled, between 0 and 1
+    @param interval: Seconds between dumps to ``path``, ``None`` dumps only on demand
+    @param path: File written every ``interval``, ``{time}`` is replaced with epoch seconds
+    """
+
+    def __init__(self, rate=0.01, interval=None, path=None):
+        if not 0 <= rate <= 1:
+            raise Exception(f"Invalid sampling rate {rate}, choose between 0 and 1")
+
+        if interval is not None and path is None:
+            raise Exception("Path is needed to dump profiles at an interval")
+
+        self.rate = rate
+        self.interval = interval
+        self.path = path
+
+        #: Microseconds of self time per collapsed stack
+        self.stacks = Counter()
+
+        #: Profiled requests since last reset
+        self.samples = 0
+
+        self._lock = threading.Lock()
+        self._timer = None
+
+        if interval is not None:
+            self._schedule()
+
+    def sample(self):
+        """Returns True if current request should be profiled"""
+        return random.random() < self.rate
+
+    def profile(self, phase, func, *args):
+        """Calls ``func`` with ``args`` and profiles it as ``phase``
+
+        Only calls of the current thread are traced,
+        profile function set by someone else is restored afterwards
+        """
+        previous = sys.getprofile()
+        collector = _Collector(phase)
+
+        sys.setprofile(collector)
+        try:
+            return func(*args)
+        finally:
+            sys.setprofile(previous)
+            self._merge(collector.finish(), phase == PHASES[0])
+
+    def _merge(self, stacks, new_sample):
+        with self._lock:
+            for stack, seconds in stacks.items():
+                self.stacks[stack] += seconds * 1e6
+
+            if new_sample:
+                self.samples += 1
+
+    def dump(self, path=None, reset=False):
+        """Returns profiles in collapsed-stack format
+
+        :param path: If given, profiles are written to this file too
+        :param reset: If sets to True, profiles are cleared after dump
+        :return: One ``stack microseconds`` line per stack
+        """
+        with self._lock:
+            stacks = self.stacks
+
+            if reset:
+                self.stacks = Counter()
+                self.samples = 0
+
+        text = "".join(f"{stack} {round(value)}\n" for stack, value in sorted(stacks.items()) if value >= 0.5)
+
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text)
+
+        return text
+
+    def reset(self):
+        """Clears collected profiles"""
+        with self._lock:
+            self.stacks = Counter()
+            self.samples = 0
+
+    def stop(self):
+        """Stops dumping at :attr:`interval`"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule(self):
+        self._timer = threading.Timer(self.interval, self._dump_at_interval)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _dump_at_interval(self):
+        path = self.path.format(time=int(time.time()))
+
+        #: Files are written completely before they appear
+        self.dump(path + ".tmp", reset=True)
+        os.replace(path + ".tmp", path)
+
+        if self._timer is not None:
+            self._schedule()
@@ -0,0 +1,79 @@
+"""Quart integration.
+
+Quart has the same hook API as Flask, so :class:`QuartLoginHandler` only
+swaps framework globals and makes hooks coroutines. Async user loader and
+async session store are awaited on the event loop, without thread hops.
+
+    app = Quart(__name__)
+    login_handler = QuartLoginHandler(app)
+
+    @app.get("/dashboard")
+    async def dashboard():
+        user = await login_handler.get_user()
+"""
+from quart import g
+from quart import has_app_context
+from quart import request
+
+from . import LoginHandler
+from . import tokens
+
+
+class QuartLoginHandler(LoginHandler):
+    """:class:`LoginHandler` for Quart applications
+
+    @param app: Quart application
+    """
+
+    _request = request
+    _g = g
+    _has_app_context = staticmethod(has_app_context)
+
+    def _run_sync(self, func):
+        raise Exception("Async user loader or session store can't be called synchronously under Quart, "
+                        "use `await login_handler.get_user()`")
+
+    async def pre_request(self):
+        """Async version of :meth:`LoginHandler.pre_request`"""
+        state = self._new_state()
+
+        if self._is_exempt():
+            state.exempt = True
+            return
+
+        login_session = self._login_cookie()
+
+        #: Session of async store is awaited even in lazy mode,
+        #: it can't be loaded synchronously on first use
+        if login_session and self.session_store_is_async and tokens.is_session_id(login_session):
+            self.load_session(login_session, await self._load_stored_session_async(login_session))
+            return
+
+        if login_session and self.LAZY_SESSION:
+            state.pending_session = login_session
+            return
+
+        #: Only synchronous part is profiled, awaits would trace other tasks
+        if self.profiler is not None and self.profiler.sample():
+            state.profiled = True
+            self.profiler.profile("pre_request", self.load_session, login_session)
+            return
+
+        self.load_session(login_session)
+
+    async def post_request(self, response):
+        """Async version of :meth:`LoginHandler.post_request`"""
+        state = self._get_state()
+
+        if state.exempt:
+            return response
+
+        if state.profiled:
+            self.profiler.profile("post_request", self.process_response, response, state)
+        else:
+            self.process_response(response, state)
+
+        if state.store_writes:
+            await self._flush_store_writes(state)
+
+        return response
@@ -0,0 +1,210 @@
+"""Revocation of sessions kept in cookies.
+
+A cookie stays valid until it expires, even after its browser logs out.
+:class:`RevocationList` revokes sessions by session id, or every session
+of a user issued before a watermark, and is checked on each request.
+
+Several processes can share one file: saves are serialized with a lock
+file and merged with revocations already on disk, and each process picks
+up revocations of the others once the file changes.
+"""
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    #: Without ``flock`` (Windows) saves of processes aren't serialized
+    fcntl = None
+
+
+class RevocationList:
+    """Revoked sessions and per-user "issued before" watermarks
+
+    A check is two dict lookups, see ``benchmarks/bench_revocation.py``.
+    Revocations are persisted to a json file and loaded on start.
+
+    @param path: Path of json file, ``None`` keeps revocations only in memory
+    @param refresh_interval: Seconds between checks if file was changed
+     by another process, see :meth:`refresh`
+    """
+
+    def __init__(self, path=None, refresh_interval=1.0):
+        self.path = path
+        self.refresh_interval = refresh_interval
+
+        #: session id -> epoch seconds when revocation can be forgotten
+        self.sessions = dict()
+
+        #: user id -> sessions issued before this epoch time (with fraction) are revoked
+        self.users = dict()
+
+        self._lock = threading.Lock()
+
+        #: Identity of file last read or written, see :meth:`_file_stamp`
+        self._stamp = None
+        self._next_refresh = 0.0
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def revoke_session(self, session_id, expires_at):
+        """Revokes one session
+
+        :param session_id: ``_session-id`` of session
+        :param expires_at: Epoch seconds when session expires anyway,
+         after it revocation is forgotten
+        """
+        with self._lock:
+            self.sessions[session_id] = int(expires_at)
+
+        self.save()
+
+    def revoke_user(self, user_id, issued_before=None):
+        """Revokes every session of user issued before watermark
+
+        Sessions keep their issue time with milliseconds, rounded up,
+        so a session issued right after revocation (e.g. login after
+        password change) stays valid
+
+        :param user_id: Id of user as string
+        :param issued_before: Epoch seconds, defaults to now
+        """
+        issued_before = time.time() if issued_before is None else issued_before
+
+        with self._lock:
+            self.users[user_id] = max(issued_before, self.users.get(user_id, 0))
+
+        self.save()
+
+    def is_revoked(self, session_id, user_id, issued_at):
+        """Checks if session is revoked
+
+        :param session_id: ``_session-id`` of session or ``None``
+        :param user_id: Id of user of session
+        :param issued_at: Epoch seconds when session was created,
+         ``None`` for sessions which don't know it
+        """
+        if self.path and time.monotonic() >= self._next_refresh:
+            self._next_refresh = time.monotonic() + self.refresh_interval
+            self.refresh()
+
+        if session_id is not None and session_id in self.sessions:
+            return True
+
+        watermark = self.users.get(user_id)
+
+        return watermark is not None and (issued_at or 0) < watermark
+
+    def purge_expired(self):
+        """Forgets revocations of sessions which expired anyway
+
+        :return: Number of forgotten revocations
+        """
+        now = time.time()
+
+        with self._lock:
+            expired = [session_id for session_id, expires_at in self.sessions.items() if expires_at <= now]
+
+            for session_id in expired:
+                del self.sessions[session_id]
+
+        self.save()
+        return len(expired)
+
+    def save(self):
+        """Writes revocations to :attr:`path`
+
+        Revocations saved by other processes meanwhile are merged in
+        first, under a lock file. File is replaced atomically, so
+        readers never see half written file
+        """
+        if not self.path:
+            return
+
+        with self._lock, self._file_lock():
+            self._merge(self._read())
+            data = {"sessions": self.sessions, "users": self.users}
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".revocations-")
+
+            try:
+                with os.fdopen(descriptor, "w") as file:
+                    json.dump(data, file)
+
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+            self._stamp = self._file_stamp()
+
+    def load(self):
+        """Reads revocations from :attr:`path`"""
+        with self._lock, self._file_lock():
+            data = self._read() or dict()
+            self._stamp = self._file_stamp()
+
+            self.sessions = {key: int(value) for key, value in data.get("sessions", dict()).items()}
+            self.users = dict(data.get("users", dict()))
+
+    def refresh(self):
+        """Merges revocations saved by other processes, if file changed
+        since it was last read or written
+        """
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return
+
+        with self._lock:
+            self._merge(self._read())
+            self._stamp = stamp
+
+    def _merge(self, data):
+        """Adds revocations of ``data`` read from file, expired ones are skipped"""
+        if not data:
+            return
+
+        now = time.time()
+
+        for session_id, expires_at in data.get("sessions", dict()).items():
+            if expires_at > now:
+                self.sessions[session_id] = max(int(expires_at), self.sessions.get(session_id, 0))
+
+        for user_id, issued_before in data.get("users", dict()).items():
+            self.users[user_id] = max(issued_before, self.users.get(user_id, 0))
+
+    def _read(self):
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _file_stamp(self):
+        #: File is replaced on save, so a new inode means new contents
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Serializes saves of processes sharing :attr:`path`"""
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.path + ".lock", "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
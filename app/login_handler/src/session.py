@@ -0,0 +1,223 @@
+"""Immutable session of ``_login-session`` token.
+
+:class:`Session` keeps fields of a session in slots, token decoders
+build it directly and it is never copied, as it can't be changed.
+It is also a read-only mapping with keys of json tokens
+(``"_user-id"``, ``"_accessed-timeout"`` ...), so code written for
+session dicts keeps working.
+
+Small per-session values (locale, tenant, feature flags) are kept in
+``extra`` slot of the token, read them from :attr:`Session.attributes`
+and change them with :class:`SessionAttributes` (``data.attributes``).
+"""
+from collections.abc import Mapping
+from collections.abc import MutableMapping
+from operator import attrgetter
+from types import MappingProxyType
+
+
+#: Key of json token -> attribute, in order of :meth:`Session.__iter__`
+KEYS = {
+    "_user-id": "user_id",
+    "_accessed-timeout": "expires_at",
+    "_valid-session": "valid",
+    "_issued-at": "issued_at",
+    "_session-id": "session_id",
+    "_refreshed-at": "refreshed_at",
+    "_remember": "remember",
+    "_fresh-login": "fresh",
+    "_extra": "extra",
+    "_unreadable": "unreadable",
+}
+
+#: Keys present even when their value is ``None``
+REQUIRED_KEYS = ("_user-id", "_valid-session")
+
+#: Keys only present when True, so json tokens don't grow with false flags
+FLAG_KEYS = ("_remember", "_fresh-login", "_unreadable")
+
+#: Fields of :class:`Session`, in order of its arguments
+FIELDS = ("user_id", "expires_at", "issued_at", "refreshed_at", "session_id", "remember", "fresh", "valid", "unreadable",
+          "extra")
+
+
+def _field(name):
+    """Read-only attribute backed by slot ``_<name>``"""
+    return property(attrgetter("_" + name))
+
+
+class Session(Mapping):
+    """Fields of a session, immutable
+
+    Use :meth:`replace` to get a changed copy
+
+    @param user_id: Id of user or ``None``
+    @param expires_at: Epoch seconds when session expires
+    @param issued_at: Epoch seconds (with milliseconds) when user logged in
+    @param refreshed_at: Epoch seconds when cookie was last re-issued
+    @param session_id: Id of session, see :func:`tokens.new_token_session_id`
+    @param remember: Session was created with remember me
+    @param fresh: Session comes from login with credentials, it turns
+     False once cookie is re-issued by a sliding refresh
+    @param valid: False for logged out and invalid sessions
+    @param unreadable: True for tokens which couldn't be unsealed or parsed
+    @param extra: Dict of session attributes or ``None``, it must not be
+     changed afterwards, read it through :attr:`attributes`
+    """
+
+    #: Fields are kept in private slots and exposed by read-only
+    #: properties, so building a session is plain slot stores
+    #: (``benchmarks/bench_session_object.py``) and the public
+    #: attributes can't be set or deleted
+    __slots__ = tuple("_" + name for name in FIELDS)
+
+    def __init__(self, user_id=None, expires_at=None, issued_at=None, refreshed_at=None, session_id=None,
+                 remember=None, fresh=None, valid=True, unreadable=None, extra=None):
+        self._user_id = user_id
+        self._expires_at = expires_at
+        self._issued_at = issued_at
+        self._refreshed_at = refreshed_at
+        self._session_id = session_id
+        self._remember = remember
+        self._fresh = fresh
+        self._valid = valid
+        self._unreadable = unreadable
+        self._extra = extra or None
+
+    user_id = _field("user_id")
+    expires_at = _field("expires_at")
+    issued_at = _field("issued_at")
+    refreshed_at = _field("refreshed_at")
+    session_id = _field("session_id")
+    remember = _field("remember")
+    fresh = _field("fresh")
+    valid = _field("valid")
+    unreadable = _field("unreadable")
+    extra = _field("extra")
+
+    @classmethod
+    def from_dict(cls, session):
+        """Builds session from dict with keys of json tokens,
+        unknown keys are ignored
+
+        :param session: Dict, e.g. parsed json token or stored session
+        """
+        if isinstance(session, cls):
+            return session
+
+        get = session.get
+        return cls(get("_user-id"), get("_accessed-timeout"), get("_issued-at"), get("_refreshed-at"),
+                   get("_session-id"), get("_remember"), get("_fresh-login"), bool(get("_valid-session")),
+                   get("_unreadable"), get("_extra"))
+
+    @property
+    def attributes(self):
+        """Read-only mapping of session attributes"""
+        return MappingProxyType(self.extra or _NO_ATTRIBUTES)
+
+    def replace(self, **changes):
+        """Returns copy of session with ``changes`` of attributes"""
+        fields = {name: getattr(self, name) for name in FIELDS}
+        fields.update(changes)
+
+        return Session(**fields)
+
+    def __reduce__(self):
+        return Session, tuple(getattr(self, name) for name in FIELDS)
+
+    def __getitem__(self, key):
+        try:
+            value = getattr(self, KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+        if (value is None and key not in REQUIRED_KEYS) or (key in FLAG_KEYS and not value):
+            raise KeyError(key)
+
+        #: Attributes of shared session can't be changed through the view
+        if key == "_extra":
+            return dict(value)
+
+        return value
+
+    def __iter__(self):
+        for key, name in KEYS.items():
+            value = getattr(self, name)
+
+            if key in REQUIRED_KEYS or (value if key in FLAG_KEYS else value is not None):
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in FIELDS
+                           if getattr(self, name) is not None)
+        return f"Session({fields})"
+
+
+#: Attributes of sessions without ``extra``
+_NO_ATTRIBUTES = {}
+
+#: Types of attribute values, they are kept as they are by json
+#: Lists of them are accepted too
+ATTRIBUTE_TYPES = (str, int, float, bool, type(None))
+
+
+def check_attribute(name, value):
+    """Raises exception if attribute can't be kept in token unchanged,
+    e.g. tuple would come back as list
+    """
+    if type(name) is not str:
+        raise Exception(f"Invalid name of session attribute {name!r}, it must be a string")
+
+    for item in (value if type(value) is list else (value,)):
+        if type(item) not in ATTRIBUTE_TYPES:
+            raise Exception(f"Invalid type {type(item).__name__} of session attribute {name!r}, "
+                            f"choose from str, int, float, bool, None or list of them")
+
+
+class SessionAttributes(MutableMapping):
+    """Attributes of session of the current request
+
+    Changes are kept in session of the request and saved once on
+    response, requests which don't change any attribute don't
+    re-issue the cookie. Guests have no attributes.
+
+    @param handler: :class:`LoginHandler`
+    """
+
+    __slots__ = ("handler",)
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def _attributes(self):
+        session = self.handler.session_data
+        return session.attributes if session is not None else _NO_ATTRIBUTES
+
+    def __getitem__(self, name):
+        return self._attributes()[name]
+
+    def __setitem__(self, name, value):
+        self.handler.set_session_attribute(name, value)
+
+    def __delitem__(self, name):
+        self.handler.delete_session_attribute(name)
+
+    def __iter__(self):
+        return iter(self._attributes())
+
+    def __len__(self):
+        return len(self._attributes())
+
+    def __repr__(self):
+        return f"SessionAttributes({dict(self._attributes())!r})"
+
+
+#: Logged out or invalid session
+INVALID_SESSION = Session(valid=False)
+
+#: Invalid session of token which couldn't be unsealed or parsed,
+#: unlike logged out session which is invalid on purpose
+UNREADABLE_SESSION = Session(valid=False, unreadable=True)
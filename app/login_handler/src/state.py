@@ -0,0 +1,88 @@
+from flask import g
+from flask import has_app_context
+
+
+class RequestState:
+    """Authentication state of a single request.
+
+    It is stored on :data:`flask.g` (see :func:`get_state`) instead of
+    :class:`LoginHandler` instance, so concurrent requests served by
+    threads or greenlets never share it.
+
+    """
+
+    __slots__ = ("user_id", "session_data", "logout_user", "info", "login_cookie", "user", "session_key", "stale_session",
+                 "pending_session", "exempt", "refresh_session", "store_writes",
+                 "clear_cookie", "profiled", "attributes_changed")
+
+    def __init__(self):
+        self.user_id = None
+        self.session_data = None
+
+        #: It indicated server have requested for logout when True
+        self.logout_user = False
+
+        #: This variable holds latest information/details
+        self.info = None
+
+        #: Encrypted ``_login-session`` cookie to be sent with response
+        self.login_cookie = None
+
+        #: Memoized user of this request as ``(user_id, user)``
+        self.user = None
+
+        #: Key of received ``_login-session`` cookie in session cache
+        self.session_key = None
+
+        #: Received ``_login-session`` cookie protected with a previous
+        #: secret key, it is re-issued with current key on response
+        self.stale_session = None
+
+        #: Received ``_login-session`` cookie not decoded yet (lazy mode)
+        self.pending_session = None
+
+        #: Request is exempted from login handler
+        self.exempt = False
+
+        #: Raw cookie to re-issue with a new lifetime in ``post_request``
+        self.refresh_session = None
+
+        #: Writes to async session store as ``(coroutine function, args)``
+        #: awaited at the end of request
+        self.store_writes = []
+
+        #: Invalid ``_login-session`` cookie is deleted on response
+        self.clear_cookie = False
+
+        #: Request was sampled by profiler, see :meth:`LoginHandler.init_profiler`
+        self.profiled = False
+
+        #: Session attributes were changed, session is saved on response
+        self.attributes_changed = False
+
+
+def get_state(namespace=g, has_context=has_app_context):
+    """Returns :class:`RequestState` of the current request
+
+    Outside of app context a throwaway state is returned
+    so reads give default values
+
+    :param namespace: ``g`` of the framework, :data:`flask.g` by default
+    :param has_context: ``has_app_context`` of the framework
+    """
+    if not has_context():
+        return RequestState()
+
+    state = namespace.get("_login_handler_state")
+    if state is None:
+        state = new_state(namespace)
+
+    return state
+
+
+def new_state(namespace=g):
+    """Creates and stores fresh :class:`RequestState` on ``g`` of the framework"""
+    state = RequestState()
+    namespace._login_handler_state = state
+
+    return state
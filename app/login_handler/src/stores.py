@@ -0,0 +1,359 @@
+"""Server-side session stores.
+
+In server-side mode the ``_login-session`` cookie only carries an opaque
+session id, session itself is kept in a :class:`SessionStore`. This allows
+listing active sessions of a user, capping them and revoking one device.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class SessionStore:
+    """Interface of session stores
+
+    Every method should be safe to call from multiple threads
+    """
+
+    def get(self, session_id):
+        """Returns tuple of session dict and its expiry (epoch seconds)
+        or ``None`` for missing or expired session
+        """
+        raise NotImplementedError
+
+    def add(self, session_id, user_id, session, issued_at, expires_at):
+        """Stores new session
+
+        :param session_id: Opaque id of session
+        :param user_id: Id of user as string
+        :param session: Session dict
+        :param issued_at: Epoch seconds when session was created, with milliseconds
+        :param expires_at: Epoch seconds when session expires
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """Removes session, if present"""
+        raise NotImplementedError
+
+    def delete_user(self, user_id):
+        """Removes every session of user
+
+        :return: Number of removed sessions
+        """
+        raise NotImplementedError
+
+    def sessions_of(self, user_id):
+        """Returns ids of active sessions of user, oldest first"""
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Removes expired sessions
+
+        :return: Number of removed sessions
+        """
+        raise NotImplementedError
+
+
+class AsyncSessionStore:
+    """Interface of session stores backed by an async driver
+
+    Methods are the same as of :class:`SessionStore` but are
+    coroutines. Under Flask they are run with ``app.ensure_sync``,
+    under Quart they are awaited without leaving the event loop.
+    Writes are done at the end of request
+    """
+
+    async def get(self, session_id):
+        raise NotImplementedError
+
+    async def add(self, session_id, user_id, session, issued_at, expires_at):
+        raise NotImplementedError
+
+    async def delete(self, session_id):
+        raise NotImplementedError
+
+    async def delete_user(self, user_id):
+        raise NotImplementedError
+
+    async def sessions_of(self, user_id):
+        raise NotImplementedError
+
+    async def purge_expired(self):
+        raise NotImplementedError
+
+
+class _Shard:
+    __slots__ = ("lock", "sessions", "users")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        #: session id -> (user id, session, issued at, expires at)
+        self.sessions = dict()
+
+        #: user id -> {session id: issued at}
+        self.users = dict()
+
+
+class MemoryStore(SessionStore):
+    """In-process store split into shards, each with its own lock
+
+    Requests touching different shards never wait on each other.
+    Sessions are sharded by session id and users index by user id.
+
+    @param shards: Number of shards, rounded up to power of 2
+    """
+
+    def __init__(self, shards=64):
+        size = 1
+        while size < shards:
+            size *= 2
+
+        self._mask = size - 1
+        self._session_shards = [_Shard() for _ in range(size)]
+        self._user_shards = [_Shard() for _ in range(size)]
+
+    def _session_shard(self, session_id):
+        return self._session_shards[hash(session_id) & self._mask]
+
+    def _user_shard(self, user_id):
+        return self._user_shards[hash(user_id) & self._mask]
+
+    def get(self, session_id):
+        entry = self._session_shard(session_id).sessions.get(session_id)
+
+        if entry is None:
+            return None
+
+        if entry[3] <= time.time():
+            self.delete(session_id)
+            return None
+
+        return entry[1], entry[3]
+
+    def add(self, session_id, user_id, session, issued_at, expires_at):
+        shard = self._session_shard(session_id)
+        with shard.lock:
+            shard.sessions[session_id] = (user_id, session, issued_at, expires_at)
+
+        shard = self._user_shard(user_id)
+        with shard.lock:
+            shard.users.setdefault(user_id, dict())[session_id] = issued_at
+
+    def delete(self, session_id):
+        shard = self._session_shard(session_id)
+        with shard.lock:
+            entry = shard.sessions.pop(session_id, None)
+
+        if entry is None:
+            return
+
+        shard = self._user_shard(entry[0])
+        with shard.lock:
+            user_sessions = shard.users.get(entry[0])
+
+            if user_sessions is not None:
+                user_sessions.pop(session_id, None)
+
+                if not user_sessions:
+                    del shard.users[entry[0]]
+
+    def delete_user(self, user_id):
+        shard = self._user_shard(user_id)
+        with shard.lock:
+            session_ids = list(shard.users.pop(user_id, dict()))
+
+        for session_id in session_ids:
+            session_shard = self._session_shard(session_id)
+            with session_shard.lock:
+                session_shard.sessions.pop(session_id, None)
+
+        return len(session_ids)
+
+    def sessions_of(self, user_id):
+        shard = self._user_shard(user_id)
+        with shard.lock:
+            user_sessions = dict(shard.users.get(user_id, dict()))
+
+        now = time.time()
+        active = []
+        for session_id, issued_at in sorted(user_sessions.items(), key=lambda item: item[1]):
+            entry = self._session_shard(session_id).sessions.get(session_id)
+
+            if entry is not None and entry[3] > now:
+                active.append(session_id)
+
+        return active
+
+    def purge_expired(self):
+        now = time.time()
+        expired = []
+
+        for shard in self._session_shards:
+            with shard.lock:
+                expired.extend(session_id for session_id, entry in shard.sessions.items() if entry[3] <= now)
+
+        for session_id in expired:
+            self.delete(session_id)
+
+        return len(expired)
+
+    def __len__(self):
+        return sum(len(shard.sessions) for shard in self._session_shards)
+
+
+class SQLiteStore(SessionStore):
+    """Store backed by SQLite database
+
+    Sessions are looked up by primary key on session id and
+    by index on user id. Each thread gets its own connection,
+    connections of finished threads are closed when new ones are
+    opened and :meth:`close` closes all of them.
+
+    @param path: Path of database file, ``":memory:"`` keeps
+     database in memory of this process
+    """
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS login_sessions ("
+        " session_id TEXT PRIMARY KEY,"
+        " user_id TEXT NOT NULL,"
+        " issued_at REAL NOT NULL,"
+        " expires_at INTEGER NOT NULL,"
+        " data TEXT NOT NULL,"
+        " added_at REAL NOT NULL DEFAULT 0"
+        ") WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS login_sessions_user_id ON login_sessions (user_id, issued_at)",
+        "CREATE INDEX IF NOT EXISTS login_sessions_expires_at ON login_sessions (expires_at)",
+    )
+
+    #: Sessions issued within one millisecond (or within one second, by
+    #: older versions) are ordered by ``added_at``, which isn't changed on updates
+    upsert = (
+        "INSERT INTO login_sessions VALUES (?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (session_id) DO UPDATE SET user_id = excluded.user_id,"
+        " issued_at = excluded.issued_at, expires_at = excluded.expires_at, data = excluded.data"
+    )
+
+    def __init__(self, path=":memory:"):
+        if path == ":memory:":
+            #: Shared cache lets every thread's connection see the same
+            #: in-memory database, it lives while one connection is open
+            self._database = f"file:login_handler-{uuid.uuid4().hex}?mode=memory&cache=shared"
+        else:
+            self._database = path
+
+        self._local = threading.local()
+
+        #: Open connection of each thread, see :meth:`close`
+        self._connections = {}
+        self._lock = threading.Lock()
+
+        self._keep_alive = self._connection()
+
+        with self._keep_alive as connection:
+            for statement in self.schema:
+                connection.execute(statement)
+
+            #: Tables created before ``added_at``
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(login_sessions)")]
+            if "added_at" not in columns:
+                connection.execute("ALTER TABLE login_sessions ADD COLUMN added_at REAL NOT NULL DEFAULT 0")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            #: Connection is only used by its thread, but :meth:`close` may close it from another one
+            connection = sqlite3.connect(self._database, uri=self._database.startswith("file:"), timeout=30,
+                                         check_same_thread=False)
+
+            if not self._database.startswith("file:"):
+                connection.execute("PRAGMA journal_mode=WAL")
+
+            self._local.connection = connection
+            self._register(connection)
+
+        return connection
+
+    def _register(self, connection):
+        with self._lock:
+            for thread in [thread for thread in self._connections if not thread.is_alive()]:
+                self._connections.pop(thread).close()
+
+            self._connections[threading.current_thread()] = connection
+
+    def close(self):
+        """Closes connections of every thread, in-memory database is dropped with them"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+            self._local = threading.local()
+            self._keep_alive = None
+
+        for connection in connections:
+            connection.close()
+
+    def get(self, session_id):
+        row = self._connection().execute(
+            "SELECT data, expires_at FROM login_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        if row[1] <= time.time():
+            self.delete(session_id)
+            return None
+
+        return json.loads(row[0]), row[1]
+
+    def add(self, session_id, user_id, session, issued_at, expires_at):
+        with self._connection() as connection:
+            connection.execute(
+                self.upsert,
+                (session_id, user_id, issued_at, int(expires_at), json.dumps(session), time.time())
+            )
+
+    def add_many(self, rows):
+        """Stores many sessions in one transaction
+
+        :param rows: Iterable of ``(session_id, user_id, session, issued_at, expires_at)``
+        """
+        added_at = time.time()
+
+        with self._connection() as connection:
+            connection.executemany(
+                self.upsert,
+                ((session_id, user_id, issued_at, int(expires_at), json.dumps(session), added_at)
+                 for session_id, user_id, session, issued_at, expires_at in rows)
+            )
+
+    def delete(self, session_id):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM login_sessions WHERE session_id = ?", (session_id,))
+
+    def delete_user(self, user_id):
+        with self._connection() as connection:
+            return connection.execute("DELETE FROM login_sessions WHERE user_id = ?", (user_id,)).rowcount
+
+    def sessions_of(self, user_id):
+        rows = self._connection().execute(
+            "SELECT session_id FROM login_sessions WHERE user_id = ? AND expires_at > ?"
+            " ORDER BY issued_at, added_at",
+            (user_id, int(time.time()))
+        ).fetchall()
+
+        return [row[0] for row in rows]
+
+    def purge_expired(self):
+        with self._connection() as connection:
+            return connection.execute(
+                "DELETE FROM login_sessions WHERE expires_at <= ?", (int(time.time()),)
+            ).rowcount
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM login_sessions").fetchone()[0]
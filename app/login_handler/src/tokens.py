@@ -0,0 +1,487 @@
+"""Encoding and decoding of ``_login-session`` tokens.
+
+Two formats are supported
+
+- ``json``: legacy format, session dict dumped to json
+- ``compact``: versioned binary format, see :data:`COMPACT_HEADER`,
+  it ends with a MAC when backend doesn't detect tampering
+
+Session attributes are kept in ``extra`` slot of both formats, encoded
+by :func:`dumps_attributes`.
+
+Serialized session is protected by a backend from :mod:`backends` and
+prefixed with id of the key that protected it, ``<key id>.<token>``.
+Tokens of every format are always readable, so sessions survive a
+change of ``session_format``. Tokens are only accepted from backends
+passed to :func:`loads`, see ``accepted_backends`` setting.
+"""
+import base64
+import binascii
+import datetime
+import hmac
+import json
+import secrets
+import struct
+import zlib
+
+from . import backends
+
+from .session import Session
+from .session import INVALID_SESSION
+from .session import UNREADABLE_SESSION
+
+
+JSON_FORMAT = "json"
+COMPACT_FORMAT = "compact"
+
+SESSION_FORMATS = (JSON_FORMAT, COMPACT_FORMAT)
+
+#: Version of compact format
+#: It is the first byte of compact payload, json payload starts with "{"
+COMPACT_VERSION = 4
+
+#: Compact header: version, flags, issued at (epoch seconds and
+#: milliseconds), expires at and refreshed at (integer epoch seconds),
+#: session id, length of user id
+COMPACT_HEADER = struct.Struct(">BBIHII8sH")
+
+#: Header of version 3, issue time has no milliseconds
+COMPACT_HEADER_V3 = struct.Struct(">BBIII8sH")
+
+#: Header of version 2, it has no refresh time
+COMPACT_HEADER_V2 = struct.Struct(">BBII8sH")
+
+#: Header of version 1, it has no session id
+COMPACT_HEADER_V1 = struct.Struct(">BBIIH")
+
+#: Bytes of random session id of tokens
+SESSION_ID_SIZE = 8
+
+FLAG_VALID = 0b00000001
+FLAG_REMEMBER = 0b00000010
+FLAG_FRESH = 0b00000100
+
+#: Encoded attributes follow user id, see :func:`dumps_attributes`
+FLAG_ATTRIBUTES = 0b00001000
+FLAG_COMPRESSED = 0b00010000
+
+#: Max bytes of decompressed attributes, larger ones are unreadable
+MAX_ATTRIBUTES_SIZE = 16 * 1024
+
+#: Raw deflate stream, it saves 6 bytes of zlib header and checksum
+#: per token, integrity is guaranteed by the backend anyway
+_DEFLATE_WBITS = -15
+
+#: Compact payloads sealed by backends which don't detect tampering
+#: (e.g. cipher) end with truncated HMAC-SHA256 of the rest of payload
+COMPACT_MAC_CONTEXT = b"login_handler.compact-mac"
+
+#: First version of compact format with the MAC, older payloads of
+#: such backends are invalid so the MAC can't be stripped by downgrade
+COMPACT_MAC_VERSION = 4
+
+#: Separates key id from sealed token
+KEY_ID_SEPARATOR = "."
+
+#: Prefix of tokens carrying only id of server-side session
+SESSION_ID_PREFIX = "sid:"
+
+#: Longest accepted token, browsers don't keep bigger cookies anyway
+MAX_TOKEN_SIZE = 4096
+
+#: Short keys of flags in json tokens, written only when flag is True.
+#: Every byte of json costs many bytes of cipher token
+JSON_FLAG_KEYS = {"_remember": "_r", "_fresh-login": "_f"}
+
+
+def new_token_session_id():
+    """Returns random id of session kept in cookie
+
+    It is used to revoke a single session, see :mod:`revocation`
+    """
+    return base64.urlsafe_b64encode(secrets.token_bytes(SESSION_ID_SIZE)).rstrip(b"=").decode()
+
+
+def new_session_id():
+    """Returns token carrying new random id of server-side session"""
+    return SESSION_ID_PREFIX + secrets.token_urlsafe(32)
+
+
+def is_session_id(token):
+    """Checks if token carries id of server-side session"""
+    return token.startswith(SESSION_ID_PREFIX)
+
+
+def is_well_formed(token):
+    """Cheap structural check of token: length, charset and
+    envelope (session id prefix or key id)
+
+    It runs before any cryptography, tokens failing it are
+    never unsealed, see :meth:`backends.CryptoBackend.is_well_formed`
+    """
+    if not token or len(token) > MAX_TOKEN_SIZE:
+        return False
+
+    if token.startswith(SESSION_ID_PREFIX):
+        return backends.BASE64URL_RE.fullmatch(token, len(SESSION_ID_PREFIX)) is not None
+
+    size = backends.DerivedKeys.key_id_size
+
+    #: Legacy tokens have no key id
+    if token[size:size + 1] == KEY_ID_SEPARATOR and backends.BASE64URL_RE.fullmatch(token, 0, size):
+        token = token[size + 1:]
+
+    backend = backends.backend_for_token(token)
+
+    return backend is not None and backend.is_well_formed(token)
+
+
+def seal(payload, keys, backend):
+    """Protects payload with backend and prefixes it with key id"""
+    return keys.key_id + KEY_ID_SEPARATOR + backend.seal(payload, keys.get(backend))
+
+
+def find_keys(token, keyring):
+    """Finds keys which protected token from its key id
+
+    Tokens without key id (created before key ids) or with
+    unknown key id are checked with current keys
+
+    :param keyring: :class:`backends.Keyring`
+    :return: Tuple of :class:`backends.DerivedKeys` and token without key id
+    """
+    size = backends.DerivedKeys.key_id_size
+
+    if token[size:size + 1] == KEY_ID_SEPARATOR:
+        keys = keyring.find(token[:size])
+
+        if keys is not None:
+            return keys, token[size + 1:]
+
+    return keyring.current, token
+
+
+def unseal(token, keyring):
+    """Reverses :func:`seal`
+
+    :return: Tuple of payload (``None`` for invalid token),
+     :class:`backends.DerivedKeys` and backend of token
+    """
+    keys, token = find_keys(token, keyring)
+    backend = backends.backend_for_token(token)
+
+    if backend is None:
+        return None, keys, None
+
+    return backend.unseal(token, keys.get(backend)), keys, backend
+
+
+def is_stale(token, keyring):
+    """Checks if token should be resealed with current key: it was
+    protected by a previous key or it has no key id (created before
+    key ids), so it would be lost on next rotation
+
+    Session id tokens are never stale
+    """
+    if token.startswith(SESSION_ID_PREFIX):
+        return False
+
+    keys, sealed = find_keys(token, keyring)
+
+    #: Token without known key id is returned as it is
+    return keys is not keyring.current or len(sealed) == len(token)
+
+
+def reseal(token, keyring):
+    """Protects payload of token with current key
+
+    :return: New token or ``None`` for invalid token
+    """
+    payload, keys, backend = unseal(token, keyring)
+
+    if not payload:
+        return None
+
+    if payload[:1] != b"{" and not backend.authenticates:
+        payload = verify_compact_mac(payload, keys)
+
+        if payload is None:
+            return None
+
+        payload += compact_mac(payload, keyring.current)
+
+    return seal(payload, keyring.current, backend)
+
+
+def compact_mac(payload, keys):
+    """Returns MAC of compact payload for backends which don't detect tampering
+
+    :param keys: :class:`backends.DerivedKeys`
+    """
+    return backends.HMAC.mac(COMPACT_MAC_CONTEXT + payload, keys.get(backends.HMAC))
+
+
+def verify_compact_mac(payload, keys):
+    """Reverses :func:`compact_mac`
+
+    :return: Payload without MAC or ``None`` if MAC is wrong or missing
+    """
+    size = backends.HMAC.mac_size
+
+    if payload[0] < COMPACT_MAC_VERSION or len(payload) <= size:
+        return None
+
+    if not hmac.compare_digest(compact_mac(payload[:-size], keys), payload[-size:]):
+        return None
+
+    return payload[:-size]
+
+
+def dumps_attributes(attributes, compression_threshold=None):
+    """Encodes session attributes to json, compressed once
+    they are longer than ``compression_threshold`` bytes
+
+    :param attributes: Dict of attributes
+    :param compression_threshold: Bytes, ``None`` never compresses
+    :return: Tuple of bytes and True if they are compressed
+    """
+    encoded = json.dumps(attributes, separators=(",", ":")).encode()
+
+    if compression_threshold is not None and len(encoded) > compression_threshold:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, _DEFLATE_WBITS)
+        compressed = compressor.compress(encoded) + compressor.flush()
+
+        #: Short or random values can grow
+        if len(compressed) < len(encoded):
+            return compressed, True
+
+    return encoded, False
+
+
+def loads_attributes(encoded, compressed):
+    """Decodes attributes encoded by :func:`dumps_attributes`
+
+    :raise ValueError: On corrupted or too large attributes
+    """
+    if compressed:
+        decompressor = zlib.decompressobj(_DEFLATE_WBITS)
+
+        try:
+            encoded = decompressor.decompress(encoded, MAX_ATTRIBUTES_SIZE)
+        except zlib.error:
+            raise ValueError("Invalid compressed attributes") from None
+
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise ValueError("Invalid compressed attributes")
+
+    attributes = json.loads(encoded)
+
+    if not isinstance(attributes, dict):
+        raise ValueError("Invalid attributes")
+
+    return attributes
+
+
+def dumps_json(session, keys, backend=backends.CIPHER, extra=None):
+    """Dumps session to json and protects it with backend
+
+    Flags are written with short keys of :data:`JSON_FLAG_KEYS`
+
+    :param session: :class:`Session` or dict with keys of json tokens
+    :param keys: :class:`backends.DerivedKeys`
+    :param extra: Attributes of session encoded by :func:`dumps_attributes`,
+     compressed ones are stored as base64 string
+    :return: Token as string
+    """
+    session = dict(session)
+
+    for key, short_key in JSON_FLAG_KEYS.items():
+        if session.pop(key, False):
+            session[short_key] = 1
+
+    if extra is not None and extra[1]:
+        session["_extra"] = base64.b64encode(extra[0]).decode()
+
+    return seal(json.dumps(session).encode(), keys, backend)
+
+
+def load_json(payload, time_format):
+    session = json.loads(payload)
+
+    if not isinstance(session, dict):
+        raise ValueError("Invalid session")
+
+    if not session.get("_valid-session"):
+        return INVALID_SESSION, None
+
+    expiration = session.get("_accessed-timeout")
+
+    #: Sessions created before epoch expiry store date string
+    if isinstance(expiration, str):
+        expiration = int(datetime.datetime.strptime(expiration, time_format).timestamp())
+        session["_accessed-timeout"] = expiration
+    elif not isinstance(expiration, int):
+        raise ValueError("Invalid expiry of session")
+
+    for key, short_key in JSON_FLAG_KEYS.items():
+        session[key] = bool(session.pop(short_key, False) or session.get(key))
+
+    extra = session.get("_extra")
+
+    if isinstance(extra, str):
+        session["_extra"] = loads_attributes(base64.b64decode(extra), True)
+    elif extra is not None and not isinstance(extra, dict):
+        raise ValueError("Invalid attributes")
+
+    return Session.from_dict(session), expiration
+
+
+def dumps_compact(user_id, valid, issued_at, expires_at, keys, backend=backends.CIPHER, session_id=None,
+                  refreshed_at=None, remember=False, fresh=False, extra=None):
+    """Packs session into compact binary payload and protects it with backend
+
+    :param user_id: Id of user as string or ``None``
+    :param valid: True for valid session
+    :param issued_at: Epoch seconds when session was created, milliseconds are kept
+    :param expires_at: Epoch seconds when session expires
+    :param keys: :class:`backends.DerivedKeys`
+    :param session_id: Id from :func:`new_token_session_id` or ``None``
+    :param refreshed_at: Epoch seconds when cookie was last issued,
+     defaults to ``issued_at``
+    :param remember: Session was created with remember me
+    :param fresh: Session comes from login with credentials
+    :param extra: Attributes of session encoded by :func:`dumps_attributes`
+    :return: Token as string
+    """
+    _user_id = (user_id or "").encode()
+    _session_id = _decode_session_id(session_id) if session_id else bytes(SESSION_ID_SIZE)
+    flags = (FLAG_VALID if valid else 0) | (FLAG_REMEMBER if remember else 0) | (FLAG_FRESH if fresh else 0)
+
+    if refreshed_at is None:
+        refreshed_at = issued_at
+
+    if extra is not None:
+        flags |= FLAG_ATTRIBUTES | (FLAG_COMPRESSED if extra[1] else 0)
+
+    issued_seconds, issued_milliseconds = divmod(round(issued_at * 1000), 1000)
+
+    payload = COMPACT_HEADER.pack(
+        COMPACT_VERSION, flags, issued_seconds, issued_milliseconds, int(expires_at), int(refreshed_at), _session_id,
+        len(_user_id)
+    ) + _user_id
+
+    if extra is not None:
+        payload += extra[0]
+
+    if not backend.authenticates:
+        payload += compact_mac(payload, keys)
+
+    return seal(payload, keys, backend)
+
+
+def load_compact(payload):
+    """Unpacks payload created by :func:`dumps_compact`
+
+    Payloads with unknown version or wrong length are returned
+    as invalid session.
+    """
+    version = payload[0]
+    _session_id = None
+    refreshed_at = None
+
+    if version == COMPACT_VERSION and len(payload) >= COMPACT_HEADER.size:
+        (version, flags, issued_at, issued_milliseconds, expires_at, refreshed_at, _session_id,
+         length) = COMPACT_HEADER.unpack_from(payload)
+        header_size = COMPACT_HEADER.size
+
+        if issued_milliseconds:
+            issued_at = (issued_at * 1000 + issued_milliseconds) / 1000
+    elif version == 3 and len(payload) >= COMPACT_HEADER_V3.size:
+        version, flags, issued_at, expires_at, refreshed_at, _session_id, length = COMPACT_HEADER_V3.unpack_from(payload)
+        header_size = COMPACT_HEADER_V3.size
+    elif version == 2 and len(payload) >= COMPACT_HEADER_V2.size:
+        version, flags, issued_at, expires_at, _session_id, length = COMPACT_HEADER_V2.unpack_from(payload)
+        header_size = COMPACT_HEADER_V2.size
+    elif version == 1 and len(payload) >= COMPACT_HEADER_V1.size:
+        version, flags, issued_at, expires_at, length = COMPACT_HEADER_V1.unpack_from(payload)
+        header_size = COMPACT_HEADER_V1.size
+    else:
+        return UNREADABLE_SESSION, None
+
+    end = header_size + length
+
+    #: Only versions since 3 carry attributes after user id
+    if len(payload) != end and not (version >= 3 and flags & FLAG_ATTRIBUTES and len(payload) > end):
+        return UNREADABLE_SESSION, None
+
+    if not flags & FLAG_VALID:
+        return INVALID_SESSION, None
+
+    if _session_id is not None and any(_session_id):
+        _session_id = base64.urlsafe_b64encode(_session_id).rstrip(b"=").decode()
+    else:
+        _session_id = None
+
+    extra = None
+    if len(payload) > end:
+        extra = loads_attributes(payload[end:], flags & FLAG_COMPRESSED)
+
+    session = Session(payload[header_size:end].decode(), expires_at, issued_at, refreshed_at, _session_id,
+                      bool(flags & FLAG_REMEMBER), bool(flags & FLAG_FRESH), extra=extra)
+
+    return session, expires_at
+
+
+def _decode_session_id(session_id):
+    try:
+        _session_id = base64.urlsafe_b64decode(session_id + "=" * (-len(session_id) % 4))
+    except (binascii.Error, ValueError):
+        _session_id = b""
+
+    if len(_session_id) != SESSION_ID_SIZE:
+        raise ValueError("Invalid session id, use new_token_session_id()")
+
+    return _session_id
+
+
+def loads(token, keyring, time_format, accepted_backends=None):
+    """Decodes token of any supported format, backend and key
+
+    Tokens which can't be decoded (e.g. protected with a key
+    no longer in keyring) are returned as :data:`UNREADABLE_SESSION`
+
+    :param keyring: :class:`backends.Keyring`
+    :param accepted_backends: Backends of accepted tokens, tokens of other
+     backends are returned as :data:`INVALID_SESSION` without unsealing them.
+     ``None`` accepts every backend
+    :return: Tuple of :class:`Session` and its expiration as epoch seconds
+     (``None`` for invalid session)
+    """
+    if accepted_backends is not None:
+        backend = backends.backend_for_token(find_keys(token, keyring)[1])
+
+        if backend is not None and backend not in accepted_backends:
+            return INVALID_SESSION, None
+
+    payload, keys, backend = unseal(token, keyring)
+
+    if not payload:
+        return UNREADABLE_SESSION, None
+
+    try:
+        if payload[:1] == b"{":
+            return load_json(payload, time_format)
+
+        if not backend.authenticates:
+            #: Compact payloads of older versions carry no MAC
+            if payload[0] < COMPACT_MAC_VERSION:
+                return INVALID_SESSION, None
+
+            payload = verify_compact_mac(payload, keys)
+
+            if payload is None:
+                return UNREADABLE_SESSION, None
+
+        return load_compact(payload)
+    except (ValueError, TypeError):
+        return UNREADABLE_SESSION, None
@@ -1,4 +1,23 @@
 from flask import current_app
+from flask import has_app_context
+
+
+def get_login_handler():
+    """Returns login handler of the current app
+
+    Outside of Flask app context, app of Quart is looked up,
+    see :mod:`quart_handler`. Without Quart installed, Flask's
+    "working outside of application context" error is raised
+    """
+    if has_app_context():
+        return current_app.login_handler
+
+    try:
+        from quart import current_app as quart_app
+    except ImportError:
+        return current_app.login_handler
+
+    return quart_app.login_handler
 
 
 def login(user):
@@ -9,22 +28,50 @@ def login(user):
                 - is_authenticated : returns boolean value
 
     """
-    current_app.login_handler.init_login(user)
+    get_login_handler().init_login(user)
 
 
 def logout():
     """Helps to Log out
 
     """
-    current_app.login_handler.logout = True
+    get_login_handler().logout = True
 
 
 def config_settings(**kwargs):
-    current_app.login_handler.config_settings(**kwargs)
+    get_login_handler().config_settings(**kwargs)
 
 
 def reset_settings():
-    current_app.login_handler.reset_settings()
+    get_login_handler().reset_settings()
+
+
+def invalidate_user(user_id):
+    """Removes user from user cache
+    Call it whenever user's data changes
+
+    """
+    get_login_handler().invalidate_user(user_id)
+
+
+def invalidate_all():
+    get_login_handler().invalidate_all()
+
+
+def resolve_sessions(login_sessions):
+    """Resolves users of many session cookies at once
+    See :meth:`LoginHandler.resolve_sessions`
+
+    """
+    return get_login_handler().resolve_sessions(login_sessions)
+
+
+async def resolve_sessions_async(login_sessions):
+    """Awaitable version of :func:`resolve_sessions`
+    See :meth:`LoginHandler.resolve_sessions_async`
+
+    """
+    return await get_login_handler().resolve_sessions_async(login_sessions)
 
 
 class Data:
@@ -32,15 +79,22 @@ class Data:
 
     Properties:
         - user: Retrieves the current user from the login handler.
+        - session: Immutable session of the current request.
+        - attributes: Attributes of session of the current request.
     """
 
     @property
     def user(self):
-        return current_app.login_handler.user
+        return get_login_handler().user
 
     @property
     def session(self):
-        return current_app.login_handler.session_data
+        return get_login_handler().session_data
+
+    @property
+    def attributes(self):
+        """Attributes of session, changes are saved in session cookie"""
+        return get_login_handler().session_attributes
 
 
 data = Data()
@@ -20,10 +20,11 @@ from .utils import LOGOUT_PAGE_PATH
 database = dict()
 
 
-@pytest.fixture(scope="session")
-def db():
+def create_database():
+    """Adds some users to database
 
-    #: Adding some users to database
+    :return: :data:`database`
+    """
     database["ritik"] = {"username": "ritik", "email": "ritik-jangli@gmail.com", "age": 32, "password": "rit"}
     database["sehwag"] = {"username": "sehwag", "email": "sehwag.kuli@gmail.com", "age": 32, "password": "seh"}
     database["sakshi"] = {"username": "sakshi", "email": "sakshiladyboy@gmail.com", "age": 32, "password": "sak"}
@@ -31,17 +32,29 @@ def db():
     return database
 
 
-@pytest.fixture(scope="session")
-def app(db):
+def create_app(db, handler_class=LoginHandler, **settings):
+    """Creates Flask app used by tests and benchmarks
+
+    Besides the pages, ``/login/<username>`` logs in any username without
+    password, ``/logout`` logs out and ``/whoami`` returns id of user
+
+    :param db: Database from :func:`create_database`
+    :param handler_class: :class:`LoginHandler` or its subclass
+    :param settings: Passed to :meth:`LoginHandler.config_settings`
+    :return: Flask app
+    """
     application = Flask(__name__)
 
     application.config["TESTING"] = True
     application.secret_key = "kfjwelkfjwoepfjwoeifjlwekj"
 
-    login_handler = LoginHandler(application)
+    login_handler = handler_class(application)
 
     login_handler.init_user_callback(user_callback_function)
 
+    if settings:
+        login_handler.config_settings(**settings)
+
     @application.route("/")
     def index():
         text = """
@@ -103,6 +116,38 @@ def app(db):
     def dashboard_check():
         return render_template_string("I'm {{ user.username }} <br> <b>INFO</b>: {{ user.email }}, {{ user.age }}")
 
+    @application.get("/public")
+    def public():
+        return "Public Page"
+
+    @application.get("/login/<username>")
+    def login_username(username):
+        login(User(username, "", 0, ""))
+
+        return "Logged in"
+
+    @application.get("/logout")
+    def logout_route():
+        logout()
+
+        return "Logged out"
+
+    @application.get("/whoami")
+    def whoami():
+        return str(login_handler.user.get_id())
+
+    return application
+
+
+@pytest.fixture(scope="session")
+def db():
+    return create_database()
+
+
+@pytest.fixture(scope="session")
+def app(db):
+    application = create_app(db)
+
     with application.app_context() as context_app:
         yield application
 
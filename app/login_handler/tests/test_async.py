@@ -0,0 +1,209 @@
+import asyncio
+import sys
+
+import pytest
+
+from login_handler import login
+from login_handler import logout
+from login_handler.src.stores import AsyncSessionStore
+from login_handler.src.stores import MemoryStore
+from login_handler.src.utils import get_login_handler
+
+from .conftest import User
+from .conftest import create_app
+from .conftest import database
+from .utils import SESSION_COOKIE_NAME
+
+SECRET_KEY = "kfjwelkfjwoepfjwoeifjlwekj"
+
+
+async def async_user_callback(user_id):
+    await asyncio.sleep(0)
+    user = database[user_id]
+
+    return User(user["username"], user["email"], user["age"], user["password"])
+
+
+class AsyncMemoryStore(AsyncSessionStore):
+    """Async store used by tests, it counts awaited calls"""
+
+    def __init__(self):
+        self.store = MemoryStore()
+        self.calls = []
+
+    async def get(self, session_id):
+        self.calls.append("get")
+        return self.store.get(session_id)
+
+    async def add(self, session_id, user_id, session, issued_at, expires_at):
+        self.calls.append("add")
+        self.store.add(session_id, user_id, session, issued_at, expires_at)
+
+    async def delete(self, session_id):
+        self.calls.append("delete")
+        self.store.delete(session_id)
+
+    async def delete_user(self, user_id):
+        return self.store.delete_user(user_id)
+
+    async def sessions_of(self, user_id):
+        self.calls.append("sessions_of")
+        return self.store.sessions_of(user_id)
+
+
+def add_user_routes(application):
+    @application.get("/sync-user")
+    def sync_user():
+        return application.login_handler.user.username
+
+    @application.get("/async-user")
+    async def async_user():
+        user = await application.login_handler.get_user()
+        return f"{user.username} {application.login_handler.user.username}"
+
+
+def create_flask_app(db, store=None):
+    """Adds async user loader and routes reading it to app of :func:`conftest.create_app`"""
+    application = create_app(db)
+    application.login_handler.init_user_callback(async_user_callback)
+    application.login_handler.init_session_store(store)
+    add_user_routes(application)
+
+    return application
+
+
+class TestFlaskAsync(object):
+
+    def test_async_user_callback(self, db):
+        application = create_flask_app(db)
+
+        with application.test_client() as client:
+            client.get("/login/ritik")
+
+            assert client.get("/sync-user").data.decode() == "ritik"
+            assert client.get("/async-user").data.decode() == "ritik ritik"
+
+            #: Awaited user is memoized for sync access
+            assert application.login_handler.user_stats["misses"] == 2
+            assert application.login_handler.user_stats["hits"] == 1
+
+    def test_async_session_store(self, db):
+        store = AsyncMemoryStore()
+        application = create_flask_app(db, store)
+        application.login_handler.MAX_SESSIONS_PER_USER = 1
+
+        with application.test_client() as client:
+            client.get("/login/ritik")
+            assert store.calls == ["add", "sessions_of"]
+
+            assert client.get_cookie(SESSION_COOKIE_NAME).decoded_value.startswith("sid:")
+            assert client.get("/async-user").data.decode() == "ritik ritik"
+
+            client.get("/logout")
+            assert store.calls[-1] == "delete"
+            assert len(store.store.sessions_of("ritik")) == 0
+
+    def test_list_sessions_is_awaitable(self, db):
+        store = AsyncMemoryStore()
+        application = create_flask_app(db, store)
+
+        with application.test_client() as client:
+            client.get("/login/ritik")
+
+        assert asyncio.run(application.login_handler.list_sessions("ritik"))
+        assert asyncio.run(application.login_handler.revoke_user_sessions("ritik")) == 1
+
+
+class TestQuart(object):
+
+    def create_quart_app(self, store=None):
+        quart = pytest.importorskip("quart")
+        from login_handler.src.quart_handler import QuartLoginHandler
+
+        application = quart.Quart(__name__)
+        application.secret_key = SECRET_KEY
+
+        login_handler = QuartLoginHandler(application)
+        login_handler.init_user_callback(async_user_callback)
+        login_handler.init_session_store(store)
+        add_user_routes(application)
+
+        @application.get("/login/<username>")
+        def login_route(username):
+            login(User(username, "", 0, ""))
+            return "Logged in"
+
+        @application.get("/logout")
+        def logout_route():
+            logout()
+            return "Logged out"
+
+        @application.get("/is-guest")
+        async def is_guest():
+            user = await login_handler.get_user()
+            return str(not user.is_authenticated())
+
+        @application.get("/online")
+        async def online():
+            cookies = [quart.request.cookies.get(SESSION_COOKIE_NAME), "garbage", None]
+            users = await login_handler.resolve_sessions_async(cookies)
+            return " ".join(str(user and user.username) for user in users)
+
+        return application
+
+    def test_quart(self, db):
+        store = AsyncMemoryStore()
+        application = self.create_quart_app(store)
+
+        async def run():
+            client = application.test_client()
+
+            await client.get("/login/sakshi")
+            assert store.calls == ["add"]
+
+            response = await client.get("/async-user")
+            assert (await response.get_data(as_text=True)) == "sakshi sakshi"
+
+            #: Sync access to async loader can't block the event loop
+            response = await client.get("/sync-user")
+            assert response.status_code == 500
+
+            await client.get("/logout")
+            assert store.calls[-1] == "delete"
+
+            response = await client.get("/is-guest")
+            assert (await response.get_data(as_text=True)) == "True"
+
+        asyncio.run(run())
+
+    def test_resolve_sessions_async(self, db):
+        store = AsyncMemoryStore()
+        application = self.create_quart_app(store)
+        calls = []
+
+        async def async_batch_loader(user_ids):
+            calls.append(list(user_ids))
+            return {user_id: await async_user_callback(user_id) for user_id in user_ids}
+
+        async def run():
+            client = application.test_client()
+            await client.get("/login/sakshi")
+
+            #: Async user loader is awaited for each user
+            response = await client.get("/online")
+            assert (await response.get_data(as_text=True)) == "sakshi None None"
+
+            #: Async batch loader is awaited within running event loop
+            application.login_handler.init_user_batch_callback(async_batch_loader)
+            response = await client.get("/online")
+            assert (await response.get_data(as_text=True)) == "sakshi None None"
+            assert calls == [["sakshi"]]
+
+        asyncio.run(run())
+
+    def test_outside_of_context_without_quart(self, monkeypatch):
+        #: Import of missing module raises ImportError
+        monkeypatch.setitem(sys.modules, "quart", None)
+
+        with pytest.raises(RuntimeError, match="outside of application context"):
+            get_login_handler()
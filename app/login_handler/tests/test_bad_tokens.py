@@ -0,0 +1,116 @@
+import time
+
+from login_handler.src import backends
+from login_handler.src import tokens
+from login_handler.src.bad_tokens import BadTokenCounter
+from login_handler.src.core import MALFORMED
+from login_handler.src.core import SessionCore
+from login_handler.src.middleware import USER_ID_KEY
+from login_handler.src.middleware import WSGILoginMiddleware
+
+from .conftest import create_app
+from .utils import SESSION_COOKIE_NAME
+
+
+class TestBadTokenCounter(object):
+
+    def test_counts_per_client(self):
+        counter = BadTokenCounter()
+
+        assert counter.add("10.0.0.1") == 1
+        assert counter.add("10.0.0.1") == 2
+        assert counter.add("10.0.0.2") == 1
+
+        assert counter.count("10.0.0.1") == 2
+        assert counter.count("10.0.0.3") == 0
+        assert counter.top(1) == [("10.0.0.1", 2)]
+        assert counter.total == 3
+
+    def test_window_restarts_count(self):
+        counter = BadTokenCounter(window=0.05)
+        counter.add("10.0.0.1")
+
+        time.sleep(0.06)
+
+        assert counter.count("10.0.0.1") == 0
+        assert counter.top() == []
+        assert counter.add("10.0.0.1") == 1
+
+    def test_least_recent_client_is_dropped(self):
+        counter = BadTokenCounter(max_clients=2)
+        counter.add("a")
+        counter.add("b")
+        counter.add("a")
+        counter.add("c")
+
+        assert counter.count("b") == 0
+        assert counter.count("a") == 2
+        assert counter.count("c") == 1
+
+
+class TestWellFormed(object):
+
+    def test_issued_tokens_are_well_formed(self):
+        core = SessionCore("kfjwelkfjwoepfjwoeifjlwekj")
+
+        for backend in ("cipher", "hmac"):
+            core.config_settings(crypto_backend=backend)
+            token = core.dumps_session({"_user-id": "1", "_accessed-timeout": 60})
+
+            assert tokens.is_well_formed(token)
+
+    def test_malformed_tokens(self):
+        size = backends.DerivedKeys.key_id_size
+
+        for token in ("", "garbage", "x" * (tokens.MAX_TOKEN_SIZE + 1), tokens.SESSION_ID_PREFIX + "a b",
+                      "A" * size + tokens.KEY_ID_SEPARATOR + "not base64!"):
+            assert not tokens.is_well_formed(token)
+
+    def test_malformed_token_is_never_unsealed(self, monkeypatch):
+        core = SessionCore("kfjwelkfjwoepfjwoeifjlwekj")
+        calls = []
+
+        monkeypatch.setattr(tokens, "unseal", lambda *args: calls.append(args))
+
+        assert core.authenticate("garbage")[0] == MALFORMED
+        assert calls == []
+
+
+class TestMalformedCookie(object):
+
+    def test_malformed_cookie_is_cleared_and_counted(self, db):
+        application = create_app(db)
+        client = application.test_client()
+        client.set_cookie(SESSION_COOKIE_NAME, "garbage")
+
+        response = client.get("/whoami")
+
+        assert response.text == "None"
+        assert client.get_cookie(SESSION_COOKIE_NAME) is None
+        assert application.login_handler.bad_tokens.count("127.0.0.1") == 1
+
+    def test_valid_cookie_is_kept(self, db):
+        application = create_app(db)
+        client = application.test_client()
+        client.get("/login/ritik")
+
+        response = client.get("/whoami")
+
+        assert response.text == "ritik"
+        assert "Set-Cookie" not in response.headers
+        assert application.login_handler.bad_tokens.total == 0
+
+    def test_middleware_counts_malformed_cookie(self):
+        core = SessionCore("kfjwelkfjwoepfjwoeifjlwekj")
+        seen = {}
+
+        def app(environ, start_response):
+            seen["user_id"] = environ[USER_ID_KEY]
+            start_response("200 OK", [])
+            return [b""]
+
+        WSGILoginMiddleware(app, core)({"HTTP_COOKIE": f"{SESSION_COOKIE_NAME}=garbage", "REMOTE_ADDR": "10.0.0.1"},
+                                       lambda status, headers: None)
+
+        assert seen["user_id"] is None
+        assert core.bad_tokens.count("10.0.0.1") == 1
@@ -0,0 +1,131 @@
+import asyncio
+
+from login_handler import resolve_sessions
+from login_handler import resolve_sessions_async
+from login_handler.src.core import cookie_value
+
+from .conftest import create_app
+from .conftest import database
+from .conftest import user_callback_function
+from .utils import SESSION_COOKIE_NAME
+
+
+def login_cookie(application, username):
+    """Returns unquoted session cookie, as read from ``request.cookies``"""
+    client = application.test_client()
+    client.get(f"/login/{username}")
+
+    return cookie_value(f"{SESSION_COOKIE_NAME}={client.get_cookie(SESSION_COOKIE_NAME).value}".encode("latin-1"))
+
+
+class BatchLoader:
+    """Batch user loader recording its calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, user_ids):
+        self.calls.append(list(user_ids))
+
+        return {user_id: user_callback_function(user_id) for user_id in user_ids if user_id in database}
+
+
+class TestResolveSessions(object):
+
+    def test_users_in_order_of_cookies(self, db):
+        application = create_app(db)
+        loader = BatchLoader()
+        application.login_handler.init_user_batch_callback(loader)
+
+        ritik = login_cookie(application, "ritik")
+        sakshi = login_cookie(application, "sakshi")
+        nobody = login_cookie(application, "nobody")
+
+        users = application.login_handler.resolve_sessions([ritik, "garbage", sakshi, ritik, None, nobody])
+
+        assert [user and user.get_id() for user in users] == ["ritik", None, "sakshi", "ritik", None, None]
+
+        #: Duplicate user ids are loaded once, in a single call
+        assert len(loader.calls) == 1
+        assert sorted(loader.calls[0]) == ["nobody", "ritik", "sakshi"]
+
+    def test_loader_is_called_in_chunks(self, db):
+        application = create_app(db)
+        loader = BatchLoader()
+        application.login_handler.init_user_batch_callback(loader)
+        application.login_handler.config_settings(user_batch_size=2)
+
+        cookies = [login_cookie(application, username) for username in ("ritik", "sehwag", "sakshi")]
+
+        users = application.login_handler.resolve_sessions(cookies)
+
+        assert [user.get_id() for user in users] == ["ritik", "sehwag", "sakshi"]
+        assert [len(call) for call in loader.calls] == [2, 1]
+
+    def test_user_cache_is_used_and_filled(self, db):
+        application = create_app(db)
+        loader = BatchLoader()
+        application.login_handler.init_user_batch_callback(loader)
+        application.login_handler.config_settings(user_cache_size=10)
+
+        cookie = login_cookie(application, "ritik")
+
+        application.login_handler.resolve_sessions([cookie])
+        users = application.login_handler.resolve_sessions([cookie])
+
+        assert users[0].get_id() == "ritik"
+        assert len(loader.calls) == 1
+
+    def test_falls_back_to_user_callback(self, db):
+        application = create_app(db)
+        cookie = login_cookie(application, "sehwag")
+
+        users = application.login_handler.resolve_sessions([cookie, cookie])
+
+        assert [user.get_id() for user in users] == ["sehwag", "sehwag"]
+
+    def test_async_batch_loader(self, db):
+        application = create_app(db)
+        loader = BatchLoader()
+
+        async def async_loader(user_ids):
+            return loader(user_ids)
+
+        application.login_handler.init_user_batch_callback(async_loader)
+        cookie = login_cookie(application, "sakshi")
+
+        assert application.login_handler.resolve_sessions([cookie])[0].get_id() == "sakshi"
+
+    def test_request_state_is_untouched(self, db):
+        application = create_app(db)
+        application.login_handler.init_user_batch_callback(BatchLoader())
+        cookie = login_cookie(application, "ritik")
+
+        with application.test_request_context("/"):
+            application.login_handler.resolve_sessions([cookie])
+
+            assert application.login_handler.user_id is None
+
+    def test_module_function(self, db):
+        application = create_app(db)
+        cookie = login_cookie(application, "ritik")
+
+        with application.app_context():
+            assert resolve_sessions([cookie])[0].get_id() == "ritik"
+
+    def test_module_function_async(self, db):
+        application = create_app(db)
+        loader = BatchLoader()
+
+        async def async_loader(user_ids):
+            return loader(user_ids)
+
+        application.login_handler.init_user_batch_callback(async_loader)
+        cookie = login_cookie(application, "ritik")
+
+        async def run():
+            with application.app_context():
+                return await resolve_sessions_async([cookie, "garbage"])
+
+        users = asyncio.run(run())
+        assert [user and user.get_id() for user in users] == ["ritik", None]
@@ -0,0 +1,69 @@
+import sys
+import threading
+
+from .utils import LOGIN_PAGE_PATH
+from .utils import LOGOUT_PAGE_PATH
+
+
+class TestConcurrency(object):
+    """Stress tests that concurrent requests never see each
+    other's user or login cookie
+
+    """
+    users = {
+        "ritik": "rit",
+        "sehwag": "seh",
+        "sakshi": "sak"
+    }
+
+    threads_per_user = 4
+    iterations = 25
+
+    def worker(self, app, barrier, username, password, errors):
+        client = app.test_client(use_cookies=True)
+        barrier.wait()
+
+        try:
+            for _ in range(self.iterations):
+                client.post(LOGIN_PAGE_PATH, data={
+                    "username": username,
+                    "password": password
+                })
+
+                response = client.get("/dashboard/check")
+                if f"I'm {username} " not in response.data.decode():
+                    errors.append((username, response.data.decode()))
+
+                client.get(LOGOUT_PAGE_PATH)
+
+                response = client.get("/")
+                if b"Guest" not in response.data:
+                    errors.append((username, response.data.decode()))
+        except Exception as e:
+            errors.append((username, repr(e)))
+
+    def test_no_cross_request_leakage(self, app, reset):
+        errors = []
+        threads = []
+        barrier = threading.Barrier(len(self.users) * self.threads_per_user)
+
+        #: Forces frequent thread switches so requests interleave
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+        try:
+            for username, password in self.users.items():
+                for _ in range(self.threads_per_user):
+                    thread = threading.Thread(
+                        target=self.worker,
+                        args=(app, barrier, username, password, errors)
+                    )
+                    threads.append(thread)
+                    thread.start()
+
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        assert errors == []
@@ -0,0 +1,132 @@
+import time
+
+from werkzeug.http import dump_cookie
+
+from login_handler.src.cookie_header import CookieHeader
+from login_handler.src.cookie_header import quote_cookie_value
+from login_handler.src.core import cookie_value
+
+from .conftest import create_app
+from .utils import SESSION_COOKIE_NAME
+
+SETTINGS = (
+    {},
+    {"remember": True},
+    {"remember": True, "unaccessed_timeout": 60, "secure": True, "samesite": "Strict"},
+    {"samesite": None, "secure": True, "domain": ".example.com", "path": "/app;x y"},
+    {"httponly": False, "samesite": "none", "secure": True},
+)
+
+VALUES = ("", "plain.value-_~", "with space", 'quote" and \\ slash', "semi;comma,", "ünïcödé \x00\x7f", "\U0001f600",
+          "".join(map(chr, range(0x100))))
+
+
+def within_one_second(func):
+    """Calls ``func`` until it runs within one second of the clock"""
+    while True:
+        before = int(time.time())
+        result = func()
+
+        if int(time.time()) == before:
+            return result
+
+
+class TestCookieHeader(object):
+
+    def test_quoting_matches_werkzeug(self):
+        for value in VALUES:
+            assert f"name={quote_cookie_value(value)}" == dump_cookie("name", value, path=None)
+
+    def test_headers_match_werkzeug(self):
+        for attributes in ({}, {"max_age": 3600}, {"max_age": 0}, {"expires": 0, "max_age": 0},
+                           {"domain": "example.com", "path": "/a b", "secure": True, "httponly": True,
+                            "samesite": "lax", "max_age": 60}):
+            header = CookieHeader(SESSION_COOKIE_NAME, **attributes)
+
+            for value in VALUES:
+                ours, theirs = within_one_second(
+                    lambda: (header.render(value), dump_cookie(SESSION_COOKIE_NAME, value, **attributes))
+                )
+
+                assert ours == theirs
+
+    def test_invalid_samesite_fails_on_settings(self, db):
+        application = create_app(db)
+
+        try:
+            application.login_handler.config_settings(samesite="sometimes")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("invalid samesite was accepted")
+
+
+class TestIssuedCookies(object):
+    """Headers of responses are byte-identical to ``response.set_cookie``"""
+
+    def expected(self, handler, token, logout=False, clear=False):
+        response = handler.app.response_class()
+
+        if logout:
+            response.set_cookie(key=SESSION_COOKIE_NAME, value=token, max_age=0, httponly=handler.HTTPONLY,
+                                samesite=handler.SAMESITE, domain=handler.DOMAIN, path=handler.PATH)
+        elif clear:
+            response.delete_cookie(SESSION_COOKIE_NAME, path=handler.PATH, domain=handler.DOMAIN,
+                                   secure=handler.SECURE, httponly=handler.HTTPONLY, samesite=handler.SAMESITE)
+        else:
+            response.set_cookie(key=SESSION_COOKIE_NAME, value=token, httponly=handler.HTTPONLY,
+                                samesite=handler.SAMESITE, domain=handler.DOMAIN, path=handler.PATH,
+                                max_age=handler.UNACCESSED_TIMEOUT if handler.REMEMBER else None,
+                                secure=handler.SECURE)
+
+        return response.headers["Set-Cookie"]
+
+    def test_login_logout_and_clear(self, db):
+        for settings in SETTINGS:
+            application = create_app(db, **settings)
+            handler = application.login_handler
+            client = application.test_client()
+
+            def login_header():
+                header = client.get("/login/ritik").headers["Set-Cookie"]
+
+                #: Issued token is read back from header
+                token = cookie_value(header.split(";", 1)[0].encode("latin-1"))
+
+                return header, self.expected(handler, token)
+
+            ours, theirs = within_one_second(login_header)
+            assert ours == theirs, settings
+
+            for kind in ("login", "logout", "clear"):
+                for value in VALUES:
+                    ours, theirs = within_one_second(lambda: (
+                        getattr(handler, f"{kind}_cookie_header").render("" if kind == "clear" else value),
+                        self.expected(handler, value, logout=kind == "logout", clear=kind == "clear"),
+                    ))
+
+                    assert ours == theirs, (settings, kind, value)
+
+    def test_settings_change_recompiles_headers(self, db):
+        application = create_app(db)
+        handler = application.login_handler
+
+        before = handler.login_cookie_header.render("x")
+        handler.config_settings(remember=True, unaccessed_timeout=120)
+        after = within_one_second(lambda: (handler.login_cookie_header.render("x"), self.expected(handler, "x")))
+
+        assert "Max-Age=120" in after[0]
+        assert after[0] == after[1]
+
+        handler.reset_settings()
+        assert handler.login_cookie_header.render("x") == before
+
+    def test_oversized_cookie_warns(self, db, recwarn):
+        application = create_app(db)
+        handler = application.login_handler
+        response = application.response_class()
+
+        handler._set_cookie(response, handler.login_cookie_header, "x" * 5000)
+
+        assert response.headers["Set-Cookie"] == self.expected(handler, "x" * 5000)
+        assert any("too large" in str(warning.message) for warning in recwarn)
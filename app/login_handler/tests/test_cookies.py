@@ -1,3 +1,5 @@
+import datetime
+
 from login_handler import config_settings
 from login_handler import helpers
 from login_handler import data
@@ -248,7 +250,9 @@ class TestCookies(object):
             "password": self.password
         })
 
-        assert data.session.get("_accessed-timeout") == default_timeout_in_format
+        #: Expiry is stored as epoch seconds
+        accessed_timeout = datetime.datetime.fromtimestamp(data.session.get("_accessed-timeout"))
+        assert accessed_timeout.strftime(app.login_handler.time_format) == default_timeout_in_format
 
     def test_accessed_timeout_custom(self, app, client, reset):
         ninety_three_days_in_seconds = (60*60*24) * 93
@@ -261,6 +265,7 @@ class TestCookies(object):
             "password": self.password
         })
 
-        assert data.session.get("_accessed-timeout") == ninety_three_days_in_seconds_in_format
+        accessed_timeout = datetime.datetime.fromtimestamp(data.session.get("_accessed-timeout"))
+        assert accessed_timeout.strftime(app.login_handler.time_format) == ninety_three_days_in_seconds_in_format
 
 
@@ -0,0 +1,102 @@
+from flask import Blueprint
+from flask import Flask
+from flask import render_template_string
+
+from login_handler import LoginHandler
+
+from .conftest import create_app
+from .utils import LOGIN_PAGE_PATH
+
+USER_TEMPLATE = "{% if user.is_authenticated() %}{{ user.username }}{% else %}guest{% endif %}"
+
+
+def create_exempt_app(db):
+    application = create_app(db)
+    login_handler = application.login_handler
+
+    @application.get("/decorated")
+    @login_handler.exempt
+    def decorated():
+        return render_template_string(USER_TEMPLATE)
+
+    @application.get("/by-name")
+    def by_name():
+        return render_template_string(USER_TEMPLATE)
+
+    @application.get("/health/live")
+    def health():
+        return render_template_string(USER_TEMPLATE)
+
+    @application.get("/healthy")
+    def healthy():
+        return render_template_string(USER_TEMPLATE)
+
+    api = Blueprint("api", __name__)
+
+    @api.get("/api/ping")
+    def ping():
+        return render_template_string(USER_TEMPLATE)
+
+    application.register_blueprint(api)
+    login_handler.exempt("by_name")
+    login_handler.exempt_blueprint(api)
+    login_handler.exempt_path("/health")
+
+    return application
+
+
+class TestExempt(object):
+    username = "sakshi"
+    password = "sak"
+
+    def test_exempt_views_see_guest(self, db):
+        application = create_exempt_app(db)
+
+        with application.test_client() as client:
+            client.post(LOGIN_PAGE_PATH, data={
+                "username": self.username,
+                "password": self.password
+            })
+
+            for path in ("/decorated", "/by-name", "/health/live", "/api/ping"):
+                response = client.get(path)
+                assert response.data.decode() == "guest"
+                assert "Set-Cookie" not in response.headers
+
+            assert client.get("/healthy").data.decode() == self.username
+
+    def test_exempt_skips_decoding(self, db):
+        application = create_exempt_app(db)
+        login_handler = application.login_handler
+        calls = []
+
+        def decode_session(login_session):
+            calls.append(login_session)
+            return {"_valid-session": False}, None
+
+        with application.test_client() as client:
+            client.set_cookie("_login-session", "garbage")
+            login_handler.decode_session = decode_session
+
+            client.get("/decorated")
+            client.get("/api/ping")
+            assert calls == []
+
+            client.get("/healthy")
+            assert calls == ["garbage"]
+
+    def test_static_is_exempt(self, app):
+        assert "static" in app.login_handler._exempt_endpoints
+
+    def test_compiled_from_config(self):
+        application = Flask(__name__)
+        application.secret_key = "kfjwelkfjwoepfjwoeifjlwekj"
+        application.config["LOGIN_EXEMPT_ENDPOINTS"] = ["metrics"]
+        application.config["LOGIN_EXEMPT_BLUEPRINTS"] = ["api"]
+        application.config["LOGIN_EXEMPT_PATHS"] = ["/health/"]
+
+        login_handler = LoginHandler(application)
+
+        assert login_handler._exempt_endpoints == {"static", "metrics"}
+        assert login_handler._exempt_blueprints == {"api"}
+        assert login_handler._exempt_paths == ("/health/",)
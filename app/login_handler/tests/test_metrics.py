@@ -0,0 +1,160 @@
+import time
+
+from werkzeug.test import Client
+
+from login_handler.src import tokens
+from login_handler.src.metrics import Histogram
+from login_handler.src.metrics import Instrumentation
+from login_handler.src.metrics import Metrics
+
+from .conftest import create_app
+from .utils import SESSION_COOKIE_NAME
+
+
+class TestInstrumentation(object):
+
+    def test_disabled_by_default(self, app):
+        assert app.login_handler.instrumentation is None
+
+    def test_connect(self):
+        instrumentation = Instrumentation()
+        events = []
+
+        @instrumentation.connect("logout")
+        def on_logout():
+            events.append("logout")
+
+        instrumentation.emit("logout")
+        assert events == ["logout"]
+
+        try:
+            instrumentation.connect("unknown", on_logout)
+            assert False
+        except Exception as error:
+            assert "Invalid event" in str(error)
+
+    def test_histogram(self):
+        histogram = Histogram((0.1, 1))
+
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+
+
+class TestMetrics(object):
+
+    def test_auth_phases(self, db):
+        application = create_app(db)
+        application.login_handler.init_metrics()
+        application.login_handler.config_settings(crypto_backend="hmac")
+        metrics = application.login_handler.metrics
+
+        with application.test_client() as client:
+            client.get("/login/ritik")
+            assert client.get("/whoami").data.decode() == "ritik"
+
+            #: Well formed, so it is unsealed, but its MAC is wrong
+            client.set_cookie(SESSION_COOKIE_NAME, "qtNT." + "A" * 40)
+            assert client.get("/whoami").data.decode() == "None"
+
+            #: Malformed cookie never reaches cryptography
+            client.set_cookie(SESSION_COOKIE_NAME, "garbage")
+            assert client.get("/whoami").data.decode() == "None"
+
+            now = int(time.time())
+            expired = tokens.dumps_compact("ritik", True, now - 100, now - 1, application.login_handler.keys,
+                                           application.login_handler.backend)
+            client.set_cookie(SESSION_COOKIE_NAME, expired)
+            client.get("/whoami")
+
+            client.get("/login/sakshi")
+            client.get("/logout")
+
+        assert metrics.cookies_issued == {"login": 2, "refresh": 0, "rekey": 0, "attributes": 0}
+        assert metrics.decrypt_failures == 1
+        assert metrics.expired_sessions == 1
+        assert metrics.logouts == 2
+        assert metrics.user_loads == {"found": 2, "missing": 0, "error": 0}
+        assert metrics.user_load_seconds.count == 2
+        assert metrics.decode_seconds.count == 4
+
+    def test_snapshot(self):
+        metrics = Metrics()
+        metrics.on_session_decoded(seconds=0.001)
+        metrics.on_cookie_issued(reason="login")
+
+        snapshot = metrics.snapshot()
+        assert snapshot["decode_seconds"]["count"] == 1
+        assert snapshot["decode_seconds"]["sum"] == 0.001
+        assert snapshot["cookies_issued"]["login"] == 1
+
+        #: Snapshot is a copy, later events don't change it
+        metrics.on_cookie_issued(reason="login")
+        assert snapshot["cookies_issued"]["login"] == 1
+
+    def test_user_loader_error(self, db):
+        application = create_app(db)
+        application.login_handler.init_metrics()
+
+        #: Error of user loader is served as 500 instead of raised
+        application.testing = False
+
+        with application.test_client() as client:
+            client.get("/login/nobody")
+            assert client.get("/whoami").status_code == 500
+
+        assert application.login_handler.metrics.user_loads["error"] == 1
+
+    def test_no_endpoint_by_default(self, db):
+        application = create_app(db)
+        application.login_handler.init_metrics()
+
+        with application.test_client() as client:
+            assert client.get("/metrics").status_code == 404
+
+    def test_wsgi_app(self, db):
+        application = create_app(db)
+        metrics = application.login_handler.init_metrics()
+
+        with application.test_client() as client:
+            client.get("/login/ritik")
+
+        response = Client(metrics.wsgi_app).get("/")
+
+        assert response.content_type.startswith("text/plain; version=0.0.4")
+        assert 'login_handler_cookies_issued_total{reason="login"} 1' in response.text
+
+    def test_endpoint(self, db):
+        application = create_app(db)
+        application.login_handler.init_metrics(rule="/metrics")
+
+        with application.test_client() as client:
+            client.get("/login/ritik")
+
+            response = client.get("/metrics")
+            text = response.data.decode()
+
+            assert response.content_type.startswith("text/plain; version=0.0.4")
+            assert 'login_handler_cookies_issued_total{reason="login"} 1' in text
+            assert "# TYPE login_handler_session_decode_seconds histogram" in text
+            assert 'login_handler_session_decode_seconds_bucket{le="+Inf"} 0' in text
+
+            #: Metrics endpoint is exempted from login handler
+            assert "Set-Cookie" not in response.headers
+
+            response = client.get("/metrics", environ_base={"REMOTE_ADDR": "10.0.0.1"})
+            assert response.status_code == 404
+
+    def test_render(self):
+        metrics = Metrics(buckets=(0.5,))
+        metrics.on_session_decoded(0.25)
+        metrics.on_session_decoded(1.0)
+
+        text = metrics.render()
+        assert 'login_handler_session_decode_seconds_bucket{le="0.5"} 1' in text
+        assert 'login_handler_session_decode_seconds_bucket{le="+Inf"} 2' in text
+        assert "login_handler_session_decode_seconds_sum 1.25" in text
+        assert "login_handler_session_decode_seconds_count 2" in text
+        assert text.endswith("\n")
@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+from werkzeug.http import dump_cookie
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from login_handler.src import core
+from login_handler.src.core import SessionCore
+from login_handler.src.core import cookie_value
+from login_handler.src.middleware import ASGILoginMiddleware
+from login_handler.src.middleware import SESSION_KEY
+from login_handler.src.middleware import USER_ID_KEY
+from login_handler.src.middleware import WSGILoginMiddleware
+from login_handler.src.stores import MemoryStore
+
+from .test_async import AsyncMemoryStore
+from .utils import SESSION_COOKIE_NAME
+
+SECRET_KEY = "kfjwelkfjwoepfjwoeifjlwekj"
+
+
+def new_session(user_id, timeout=60):
+    now = int(time.time())
+
+    return {
+        "_user-id": user_id,
+        "_accessed-timeout": now + timeout,
+        "_valid-session": True,
+        "_issued-at": now
+    }
+
+
+def wsgi_app(environ, start_response):
+    return Response(str(environ[USER_ID_KEY]))(environ, start_response)
+
+
+class TestCookieValue(object):
+
+    def test_plain(self):
+        header = b"a=1; _login-session=abc.def; b=2"
+        assert cookie_value(header) == "abc.def"
+        assert cookie_value(b"_login-session=abc") == "abc"
+        assert cookie_value(b"_login-session=") == ""
+
+    def test_missing(self):
+        assert cookie_value(b"") is None
+        assert cookie_value(b"a=1; b=2") is None
+        assert cookie_value(b"x_login-session=abc") is None
+        assert cookie_value(b"x_login-session=abc; _login-session=def") == "def"
+
+    def test_same_as_werkzeug(self):
+        session_core = SessionCore(SECRET_KEY)
+
+        #: Cipher tokens are not ASCII, werkzeug quotes them
+        token = session_core.dumps_session(new_session("ritik"))
+        header = dump_cookie(SESSION_COOKIE_NAME, token).split(";")[0]
+
+        assert header.startswith(SESSION_COOKIE_NAME + '="')
+        assert cookie_value(("a=1; " + header).encode("latin-1")) == token
+
+
+class TestSessionCore(object):
+
+    def test_authenticate(self):
+        session_core = SessionCore(SECRET_KEY)
+
+        token = session_core.dumps_session(new_session("ritik"))
+        assert session_core.authenticate(token)[0] == core.VALID
+        assert session_core.identify(token)[0] == "ritik"
+
+        token = session_core.dumps_session(new_session("ritik", -1))
+        assert session_core.authenticate(token)[0] == core.EXPIRED
+        assert session_core.identify(token) == (None, None)
+
+        assert session_core.authenticate(session_core.logout_token())[0] == core.INVALID
+        assert session_core.authenticate("garbage")[0] == core.MALFORMED
+
+    def test_requires_secret_key(self):
+        try:
+            SessionCore().keyring
+            assert False
+        except Exception as error:
+            assert "Secret Key" in str(error)
+
+    def test_shares_sessions_with_login_handler(self, app):
+        session_core = SessionCore(app.secret_key)
+        token = app.login_handler.dumps_session(new_session("sakshi"))
+
+        assert session_core.identify(token)[0] == "sakshi"
+
+
+class TestWSGIMiddleware(object):
+
+    def test_identity(self):
+        session_core = SessionCore(SECRET_KEY)
+        client = Client(WSGILoginMiddleware(wsgi_app, session_core))
+
+        assert client.get("/").get_data(as_text=True) == "None"
+
+        client.set_cookie(SESSION_COOKIE_NAME, session_core.dumps_session(new_session("ritik")))
+        assert client.get("/").get_data(as_text=True) == "ritik"
+
+        client.set_cookie(SESSION_COOKIE_NAME, session_core.dumps_session(new_session("ritik", -1)))
+        assert client.get("/").get_data(as_text=True) == "None"
+
+    def test_server_side_session(self):
+        session_core = SessionCore(SECRET_KEY)
+        session_core.init_session_store(MemoryStore())
+        session = new_session("sehwag")
+        session_core.session_store.add("sid:abc", "sehwag", session, session["_issued-at"],
+                                       session["_accessed-timeout"])
+
+        client = Client(WSGILoginMiddleware(wsgi_app, session_core))
+        client.set_cookie(SESSION_COOKIE_NAME, "sid:abc")
+        assert client.get("/").get_data(as_text=True) == "sehwag"
+
+
+class TestASGIMiddleware(object):
+
+    def call(self, session_core, scope):
+        scopes = []
+
+        async def asgi_app(scope, receive, send):
+            scopes.append(scope)
+
+        asyncio.run(ASGILoginMiddleware(asgi_app, session_core)(scope, None, None))
+
+        return scopes[0]
+
+    def test_identity(self):
+        session_core = SessionCore(SECRET_KEY)
+        token = session_core.dumps_session(new_session("ritik"))
+        cookie = dump_cookie(SESSION_COOKIE_NAME, token).split(";")[0].encode("latin-1")
+
+        scope = self.call(session_core, {"type": "http", "headers": [(b"host", b"localhost"), (b"cookie", cookie)]})
+        assert scope[USER_ID_KEY] == "ritik"
+        assert scope[SESSION_KEY]["_user-id"] == "ritik"
+
+        scope = self.call(session_core, {"type": "http", "headers": []})
+        assert scope[USER_ID_KEY] is None
+
+        scope = self.call(session_core, {"type": "lifespan"})
+        assert USER_ID_KEY not in scope
+
+    def test_async_session_store(self):
+        store = AsyncMemoryStore()
+        session_core = SessionCore(SECRET_KEY)
+        session_core.init_session_store(store)
+        session = new_session("sakshi")
+        store.store.add("sid:abc", "sakshi", session, session["_issued-at"], session["_accessed-timeout"])
+
+        scope = self.call(session_core, {"type": "http", "headers": [(b"cookie", b"_login-session=sid:abc")]})
+        assert scope[USER_ID_KEY] == "sakshi"
+        assert store.calls == ["get"]
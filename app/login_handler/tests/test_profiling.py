@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+
+from login_handler.src.profiling import SamplingProfiler
+
+from .conftest import create_app
+
+
+def parse(collapsed):
+    """Returns dict of stack and microseconds"""
+    stacks = {}
+
+    for line in collapsed.splitlines():
+        stack, value = line.rsplit(" ", 1)
+        stacks[stack] = int(value)
+
+    return stacks
+
+
+class TestSamplingProfiler(object):
+
+    def test_stacks_of_calls(self):
+        profiler = SamplingProfiler(rate=1)
+
+        def inner():
+            time.sleep(0.002)
+
+        def outer():
+            inner()
+            return "done"
+
+        assert profiler.profile("pre_request", outer) == "done"
+
+        stacks = parse(profiler.dump())
+        name = f"{__name__}.TestSamplingProfiler.test_stacks_of_calls.<locals>"
+
+        assert profiler.samples == 1
+        assert stacks[f"pre_request;{name}.outer;{name}.inner;time.sleep"] >= 1500
+        assert all(stack.startswith("pre_request") for stack in stacks)
+
+    def test_previous_profile_function_is_restored(self):
+        profiler = SamplingProfiler(rate=1)
+
+        def previous(frame, event, arg):
+            pass
+
+        sys.setprofile(previous)
+        try:
+            profiler.profile("post_request", len, "abc")
+            assert sys.getprofile() is previous
+        finally:
+            sys.setprofile(None)
+
+    def test_exception_is_raised_and_profiled(self):
+        profiler = SamplingProfiler(rate=1)
+
+        def fail():
+            raise ValueError("failed")
+
+        try:
+            profiler.profile("load_user", fail)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("exception was swallowed")
+
+        assert any(stack.endswith(".fail") for stack in parse(profiler.dump()))
+
+    def test_dump_reset(self, tmp_path):
+        profiler = SamplingProfiler(rate=1)
+        profiler.profile("pre_request", sorted, [3, 2, 1])
+
+        path = str(tmp_path / "profile.txt")
+        text = profiler.dump(path, reset=True)
+
+        with open(path) as file:
+            assert file.read() == text
+
+        assert profiler.dump() == ""
+        assert profiler.samples == 0
+
+    def test_dump_at_interval(self, tmp_path):
+        profiler = SamplingProfiler(rate=1, interval=0.05, path=str(tmp_path / "profile-{time}.txt"))
+        profiler.profile("pre_request", sorted, [3, 2, 1])
+
+        try:
+            time.sleep(0.2)
+        finally:
+            profiler.stop()
+
+        files = os.listdir(tmp_path)
+        assert files
+        assert all(name.startswith("profile-") and name.endswith(".txt") for name in files)
+
+    def test_invalid_settings(self):
+        for kwargs in ({"rate": 2}, {"interval": 10}):
+            try:
+                SamplingProfiler(**kwargs)
+            except Exception:
+                continue
+
+            raise AssertionError(f"{kwargs} was accepted")
+
+
+class TestProfiledRequests(object):
+
+    def test_sampled_requests_are_profiled(self, db):
+        application = create_app(db)
+        application.login_handler.init_profiler(SamplingProfiler(rate=1))
+        client = application.test_client()
+        client.get("/login/ritik")
+
+        assert client.get("/whoami").text == "ritik"
+
+        profiler = application.login_handler.profiler
+        stacks = parse(profiler.dump())
+        phases = {stack.split(";", 1)[0] for stack in stacks}
+
+        assert phases == {"pre_request", "load_user", "post_request"}
+        assert profiler.samples == 2
+        assert any("user_callback_function" in stack for stack in stacks)
+
+    def test_unsampled_requests_are_not_profiled(self, db):
+        application = create_app(db)
+        application.login_handler.init_profiler(SamplingProfiler(rate=0))
+        client = application.test_client()
+        client.get("/login/ritik")
+
+        assert client.get("/whoami").text == "ritik"
+        assert application.login_handler.profiler.dump() == ""
+        assert application.login_handler.profiler.samples == 0
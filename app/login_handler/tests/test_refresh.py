@@ -0,0 +1,81 @@
+import time
+
+from login_handler import config_settings
+from login_handler import data
+from login_handler.src import tokens
+
+from .utils import SESSION_COOKIE_NAME
+
+
+class TestRefresh(object):
+    timeout = 100
+
+    def set_session(self, app, client, age, **kwargs):
+        now = int(time.time())
+        token = tokens.dumps_compact("ritik", True, now - age, now + 1000, app.login_handler.keys,
+                                     app.login_handler.backend, **kwargs)
+        client.set_cookie(SESSION_COOKIE_NAME, token)
+
+        return token
+
+    def test_fresh_cookie_not_reissued(self, app, client, reset):
+        config_settings(remember=True, unaccessed_timeout=self.timeout, session_format="compact")
+        app.login_handler.reset_refresh_stats()
+        self.set_session(app, client, 10)
+
+        for _ in range(3):
+            response = client.get("/")
+            assert "Set-Cookie" not in response.headers
+
+        assert app.login_handler.refresh_stats == {"refreshed": 0, "skipped": 3}
+
+    def test_reissued_below_threshold(self, app, client, reset):
+        config_settings(remember=True, unaccessed_timeout=self.timeout, session_format="compact")
+        app.login_handler.reset_refresh_stats()
+        token = self.set_session(app, client, 60)
+
+        response = client.get("/")
+        assert f"Max-Age={self.timeout}" in response.headers["Set-Cookie"]
+
+        new_token = client.get_cookie(SESSION_COOKIE_NAME).decoded_value
+        assert new_token != token
+
+        #: Session keeps its issue time and only gets a new refresh time
+        client.get("/")
+        assert data.session["_user-id"] == "ritik"
+        assert data.session["_issued-at"] == int(time.time()) - 60
+        assert data.session["_refreshed-at"] >= int(time.time()) - 1
+        assert app.login_handler.refresh_stats == {"refreshed": 1, "skipped": 1}
+
+    def test_threshold(self, app, client, reset):
+        for threshold, refreshed in ((0, 0), (0.3, 0), (0.5, 1), (1, 1)):
+            config_settings(remember=True, unaccessed_timeout=self.timeout, refresh_threshold=threshold)
+            app.login_handler.reset_refresh_stats()
+            self.set_session(app, client, 60)
+
+            client.get("/")
+            assert app.login_handler.refresh_stats["refreshed"] == refreshed
+
+    def test_idle_session_expires(self, app, client, reset):
+        config_settings(remember=True, unaccessed_timeout=self.timeout)
+        self.set_session(app, client, 1000, refreshed_at=int(time.time()) - 200)
+
+        response = client.get("/")
+        assert "Max-Age=0" in response.headers["Set-Cookie"]
+
+    def test_without_remember(self, app, client, reset):
+        config_settings(unaccessed_timeout=self.timeout)
+        app.login_handler.reset_refresh_stats()
+        self.set_session(app, client, 90)
+
+        response = client.get("/")
+        assert "Set-Cookie" not in response.headers
+        assert app.login_handler.refresh_stats == {"refreshed": 0, "skipped": 0}
+
+    def test_invalid_threshold(self, app, reset):
+        for threshold in (-0.1, 1.5):
+            try:
+                config_settings(refresh_threshold=threshold)
+                assert False
+            except Exception as error:
+                assert "refresh threshold" in str(error)
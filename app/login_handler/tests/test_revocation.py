@@ -0,0 +1,181 @@
+import threading
+import time
+
+from login_handler import data
+from login_handler import login
+from login_handler.src import tokens
+from login_handler.src.backends import Keyring
+from login_handler.src.revocation import RevocationList
+
+from .conftest import create_app
+from .conftest import user_callback_function
+from .utils import SESSION_COOKIE_NAME
+from .utils import LOGIN_PAGE_PATH
+
+
+class TestRevocationList(object):
+
+    def test_revoke_session(self):
+        revocation_list = RevocationList()
+        assert revocation_list.is_revoked("abc", "ritik", time.time()) is False
+
+        revocation_list.revoke_session("abc", time.time() + 60)
+        assert revocation_list.is_revoked("abc", "ritik", time.time()) is True
+        assert revocation_list.is_revoked("abd", "ritik", time.time()) is False
+
+    def test_revoke_user(self):
+        revocation_list = RevocationList()
+        now = int(time.time())
+
+        revocation_list.revoke_user("ritik", issued_before=now)
+
+        assert revocation_list.is_revoked("abc", "ritik", now - 1) is True
+        assert revocation_list.is_revoked("abc", "ritik", now) is False
+        assert revocation_list.is_revoked("abc", "sakshi", now - 1) is False
+
+        #: Sessions which don't know when they were issued
+        assert revocation_list.is_revoked(None, "ritik", None) is True
+
+    def test_many_revocations(self):
+        revocation_list = RevocationList()
+
+        for index in range(100):
+            revocation_list.revoke_session(str(index), time.time() + 60)
+
+        assert all(revocation_list.is_revoked(str(index), None, None) for index in range(100))
+        assert revocation_list.is_revoked("100", None, None) is False
+
+    def test_purge_expired(self):
+        revocation_list = RevocationList()
+        revocation_list.revoke_session("old", time.time() - 1)
+        revocation_list.revoke_session("new", time.time() + 60)
+
+        assert revocation_list.purge_expired() == 1
+        assert revocation_list.is_revoked("old", None, None) is False
+        assert revocation_list.is_revoked("new", None, None) is True
+
+    def test_persistence(self, tmp_path):
+        path = str(tmp_path / "revocations.json")
+
+        revocation_list = RevocationList(path)
+        revocation_list.revoke_session("abc", time.time() + 60)
+        revocation_list.revoke_user("ritik")
+
+        #: Survives restart
+        loaded = RevocationList(path)
+        assert loaded.is_revoked("abc", None, None) is True
+        assert loaded.is_revoked(None, "ritik", 0) is True
+
+    def test_shared_file(self, tmp_path):
+        path = str(tmp_path / "revocations.json")
+
+        #: Two workers of one app
+        first = RevocationList(path, refresh_interval=0)
+        second = RevocationList(path, refresh_interval=0)
+
+        first.revoke_session("abc", time.time() + 60)
+        second.revoke_user("ritik")
+        second.revoke_session("abd", time.time() + 60)
+        first.revoke_session("abe", time.time() + 60)
+
+        #: Saves of one worker don't drop revocations of the other
+        loaded = RevocationList(path)
+        assert all(loaded.is_revoked(session_id, None, None) for session_id in ("abc", "abd", "abe"))
+        assert loaded.is_revoked(None, "ritik", 0) is True
+
+        #: Revocations of other worker are seen without restart
+        assert first.is_revoked(None, "ritik", 0) is True
+        assert second.is_revoked("abe", None, None) is True
+
+    def test_concurrent_saves(self, tmp_path):
+        path = str(tmp_path / "revocations.json")
+        revocation_list = RevocationList(path)
+
+        threads = [threading.Thread(target=revocation_list.revoke_session, args=(str(index), time.time() + 60))
+                   for index in range(20)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        loaded = RevocationList(path)
+        assert all(loaded.is_revoked(str(index), None, None) for index in range(20))
+
+    def test_compact_session_id(self):
+        keyring = Keyring("kfjwelkfjwoepfjwoeifjlwekj")
+        session_id = tokens.new_token_session_id()
+        token = tokens.dumps_compact("ritik", True, time.time(), time.time() + 60, keyring.current,
+                                     session_id=session_id)
+
+        session, expiration = tokens.loads(token, keyring, "%d %b %Y")
+        assert session["_session-id"] == session_id
+
+
+class TestRevocation(object):
+    username = "sakshi"
+    password = "sak"
+
+    def login(self, client):
+        client.post(LOGIN_PAGE_PATH, data={
+            "username": self.username,
+            "password": self.password
+        })
+
+    def copy_cookie(self, app, client):
+        stolen = app.test_client()
+        stolen.set_cookie(SESSION_COOKIE_NAME, client.get_cookie(SESSION_COOKIE_NAME).decoded_value)
+        return stolen
+
+    def test_revoke_copied_cookie(self, app, client, reset):
+        app.login_handler.init_revocation_list(RevocationList())
+
+        try:
+            self.login(client)
+            stolen = self.copy_cookie(app, client)
+            assert self.username in stolen.get("/").data.decode()
+
+            client.get("/")
+            app.login_handler.revoke_session(data.session["_session-id"])
+
+            assert b"Guest" in stolen.get("/").data
+            assert b"Guest" in client.get("/").data
+        finally:
+            app.login_handler.init_revocation_list(None)
+
+    def test_revoke_user_watermark(self, app, client, reset):
+        app.login_handler.init_revocation_list(RevocationList())
+
+        try:
+            self.login(client)
+            stolen = self.copy_cookie(app, client)
+
+            app.login_handler.revoke_user_sessions(self.username)
+            assert b"Guest" in stolen.get("/").data
+
+            #: Revoked cookie is cleared
+            assert stolen.get_cookie(SESSION_COOKIE_NAME) is None
+        finally:
+            app.login_handler.init_revocation_list(None)
+
+    def test_login_after_revoking_user(self, db):
+        application = create_app(db)
+        application.login_handler.init_revocation_list(RevocationList())
+
+        #: Password change keeps only the current device signed in
+        @application.get("/change-password")
+        def change_password():
+            user = application.login_handler.user
+            application.login_handler.revoke_user_sessions(user.get_id())
+            login(user_callback_function(user.get_id()))
+            return "Changed"
+
+        client = application.test_client()
+        self.login(client)
+        stolen = self.copy_cookie(application, client)
+
+        client.get("/change-password")
+
+        assert self.username in client.get("/").data.decode()
+        assert b"Guest" in stolen.get("/").data
@@ -0,0 +1,149 @@
+import pickle
+import time
+
+import pytest
+
+from login_handler import config_settings
+from login_handler import data
+from login_handler.src import backends
+from login_handler.src import tokens
+from login_handler.src.session import INVALID_SESSION
+from login_handler.src.session import Session
+
+from .utils import LOGIN_PAGE_PATH
+from .utils import SESSION_COOKIE_NAME
+
+SECRET_KEY = "kfjwelkfjwoepfjwoeifjlwekj"
+TIME_FORMAT = "%d %b %Y"
+KEYRING = backends.Keyring(SECRET_KEY)
+
+
+class TestSession(object):
+
+    def test_mapping_view(self):
+        session = Session("ritik", expires_at=200, issued_at=100)
+
+        assert session == {"_user-id": "ritik", "_accessed-timeout": 200, "_valid-session": True, "_issued-at": 100}
+        assert session.get("_session-id") is None
+        assert "_session-id" not in session
+        assert "_issued-at" in session
+        assert len(session) == 4
+
+        with pytest.raises(KeyError):
+            session["_refreshed-at"]
+
+        with pytest.raises(KeyError):
+            session["unknown"]
+
+    def test_invalid_session(self):
+        assert INVALID_SESSION == {"_user-id": None, "_valid-session": False}
+        assert INVALID_SESSION.valid is False
+
+    def test_immutable(self):
+        session = Session("ritik")
+
+        with pytest.raises(TypeError):
+            session["_user-id"] = "sehwag"
+
+        with pytest.raises(AttributeError):
+            session.user_id = "sehwag"
+
+        with pytest.raises(AttributeError):
+            session.extra = 1
+
+        with pytest.raises(AttributeError):
+            del session.user_id
+
+    def test_replace(self):
+        session = Session("ritik", expires_at=200, fresh=True)
+        refreshed = session.replace(refreshed_at=150, fresh=False)
+
+        assert session.fresh is True
+        assert session.refreshed_at is None
+        assert refreshed.fresh is False
+        assert refreshed.refreshed_at == 150
+        assert refreshed.user_id == "ritik"
+
+    def test_from_dict(self):
+        stored = {"_user-id": "ritik", "_accessed-timeout": 200, "_valid-session": True, "_remember": True}
+        session = Session.from_dict(stored)
+
+        assert session == stored
+        assert session.remember is True
+        assert Session.from_dict(session) is session
+
+    def test_pickle(self):
+        session = Session("ritik", expires_at=200, session_id="abc", fresh=True)
+
+        assert pickle.loads(pickle.dumps(session)) == session
+        assert pickle.loads(pickle.dumps(session)).fresh is True
+
+
+class TestSessionTokens(object):
+
+    def test_compact_flags(self):
+        now = int(time.time())
+
+        for remember, fresh in ((False, False), (True, False), (False, True), (True, True)):
+            token = tokens.dumps_compact("ritik", True, now, now + 60, KEYRING.current, remember=remember,
+                                         fresh=fresh)
+
+            session, _ = tokens.loads(token, KEYRING, TIME_FORMAT)
+            assert type(session) is Session
+            assert (session.remember, session.fresh) == (remember, fresh)
+
+    def test_json_round_trip(self):
+        now = int(time.time())
+        session = Session("ritik", expires_at=now + 60, issued_at=now, remember=True, fresh=True)
+
+        for remember, fresh in ((False, False), (True, False), (False, True), (True, True)):
+            session = session.replace(remember=remember, fresh=fresh)
+
+            loaded, _ = tokens.loads(tokens.dumps_json(session, KEYRING.current), KEYRING, TIME_FORMAT)
+            assert type(loaded) is Session
+            assert loaded == session
+            assert (loaded.remember, loaded.fresh) == (remember, fresh)
+
+    def test_json_flags_are_short(self):
+        now = int(time.time())
+        session = Session("ritik", expires_at=now + 60, issued_at=now, remember=True, fresh=False)
+
+        payload = tokens.unseal(tokens.dumps_json(session, KEYRING.current), KEYRING)[0]
+        assert b'"_r": 1' in payload
+        assert b"_f" not in payload and b"_remember" not in payload
+
+    def test_false_flags_are_not_keys(self):
+        session = Session("ritik", remember=False, fresh=True)
+
+        assert "_remember" not in session
+        assert session["_fresh-login"] is True
+        assert session.get("_remember") is None
+
+    def test_login_is_fresh(self, app, client, reset, db):
+        config_settings(session_format="compact")
+        client.post(LOGIN_PAGE_PATH, data={"username": "ritik", "password": "rit"})
+        client.get("/")
+
+        assert data.session.user_id == "ritik"
+        assert data.session.fresh is True
+        assert data.session.remember is False
+
+    def test_login_is_fresh_with_default_format(self, app, client, reset, db):
+        config_settings(remember=True)
+        client.post(LOGIN_PAGE_PATH, data={"username": "ritik", "password": "rit"})
+        client.get("/")
+
+        assert data.session.fresh is True
+        assert data.session.remember is True
+
+    def test_refresh_is_not_fresh(self, app, client, reset):
+        config_settings(remember=True, unaccessed_timeout=100, session_format="compact")
+        now = int(time.time())
+        token = tokens.dumps_compact("ritik", True, now - 60, now + 1000, app.login_handler.keys,
+                                     app.login_handler.backend, remember=True, fresh=True)
+        client.set_cookie(SESSION_COOKIE_NAME, token)
+
+        client.get("/")
+        client.get("/")
+        assert data.session.fresh is False
+        assert data.session.remember is True
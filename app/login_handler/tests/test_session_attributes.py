@@ -0,0 +1,243 @@
+import time
+
+import pytest
+
+from flask import request
+
+from login_handler import login
+from login_handler import data
+from login_handler.src import backends
+from login_handler.src import tokens
+from login_handler.src.core import cookie_value
+from login_handler.src.session import Session
+from login_handler.src.stores import MemoryStore
+
+from .conftest import User
+from .conftest import create_app
+from .utils import SESSION_COOKIE_NAME
+
+SECRET_KEY = "kfjwelkfjwoepfjwoeifjlwekj"
+TIME_FORMAT = "%d %b %Y"
+KEYRING = backends.Keyring(SECRET_KEY)
+
+
+def create_attributes_app(db, **settings):
+    """Adds routes changing session attributes to app of :func:`conftest.create_app`"""
+    application = create_app(db, **{"crypto_backend": "hmac", **settings})
+
+    @application.get("/login/<username>/<locale>")
+    def login_with_locale(username, locale):
+        login(User(username, "", 0, ""))
+        data.attributes["locale"] = locale
+
+        return "Logged in"
+
+    @application.get("/set/<name>")
+    def set_route(name):
+        try:
+            data.attributes[name] = request.args.get("value")
+        except Exception as error:
+            return str(error), 400
+
+        return "Set"
+
+    @application.get("/delete/<name>")
+    def delete_route(name):
+        del data.attributes[name]
+        return "Deleted"
+
+    @application.get("/attributes")
+    def attributes_route():
+        return dict(data.session.attributes)
+
+    return application
+
+
+def login_cookie(client):
+    cookie = client.get_cookie(SESSION_COOKIE_NAME)
+    return cookie_value(f"{SESSION_COOKIE_NAME}={cookie.value}".encode()) if cookie else None
+
+
+class TestEncoding(object):
+
+    def test_round_trip(self):
+        attributes = {"locale": "en", "tenant": 7, "ratio": 0.5, "beta": True, "none": None, "flags": ["a", 1]}
+
+        for threshold in (None, 0):
+            encoded, compressed = tokens.dumps_attributes(attributes, threshold)
+            assert tokens.loads_attributes(encoded, compressed) == attributes
+
+    def test_compression(self):
+        attributes = {"flags": ["feature-flag-number"] * 10}
+
+        plain, compressed = tokens.dumps_attributes(attributes)
+        assert compressed is False
+
+        packed, compressed = tokens.dumps_attributes(attributes, compression_threshold=len(plain) - 1)
+        assert compressed is True
+        assert len(packed) < len(plain)
+
+        #: Under threshold attributes are kept as they are
+        assert tokens.dumps_attributes(attributes, compression_threshold=len(plain)) == (plain, False)
+
+    def test_incompressible_stay_plain(self):
+        attributes = {"k": "x1"}
+        assert tokens.dumps_attributes(attributes, compression_threshold=0)[1] is False
+
+    def test_corrupted(self):
+        for encoded, compressed in ((b"not json", False), (b"[1]", False), (b"garbage", True)):
+            with pytest.raises(ValueError):
+                tokens.loads_attributes(encoded, compressed)
+
+    def test_decompressed_size_is_limited(self):
+        packed, compressed = tokens.dumps_attributes({"k": "a" * (tokens.MAX_ATTRIBUTES_SIZE * 2)}, 0)
+        assert compressed is True
+
+        with pytest.raises(ValueError):
+            tokens.loads_attributes(packed, compressed)
+
+    def test_compact_token(self):
+        now = int(time.time())
+        extra = tokens.dumps_attributes({"locale": "en"})
+
+        token = tokens.dumps_compact("ritik", True, now, now + 60, KEYRING.current, extra=extra)
+        session, expiration = tokens.loads(token, KEYRING, TIME_FORMAT)
+
+        assert session.user_id == "ritik"
+        assert session.attributes == {"locale": "en"}
+        assert session["_extra"] == {"locale": "en"}
+        assert expiration == now + 60
+
+        #: Tokens without attributes are left as they were
+        token = tokens.dumps_compact("ritik", True, now, now + 60, KEYRING.current)
+        assert tokens.loads(token, KEYRING, TIME_FORMAT)[0].attributes == {}
+
+    def test_json_token(self):
+        now = int(time.time())
+        session = {"_user-id": "ritik", "_accessed-timeout": now + 60, "_valid-session": True,
+                   "_extra": {"flags": ["feature-flag-number"] * 10}}
+
+        for threshold in (None, 0):
+            extra = tokens.dumps_attributes(session["_extra"], threshold)
+            token = tokens.dumps_json(session, KEYRING.current, extra=extra)
+
+            assert tokens.loads(token, KEYRING, TIME_FORMAT)[0].attributes == session["_extra"]
+
+
+class TestSessionAttributes(object):
+
+    @pytest.mark.parametrize("session_format", ["json", "compact"])
+    def test_set_and_read(self, db, session_format):
+        client = create_attributes_app(db, session_format=session_format).test_client()
+        client.get("/login/ritik")
+
+        response = client.get("/set/locale?value=en")
+        assert "Set-Cookie" in response.headers
+
+        assert client.get("/attributes").json == {"locale": "en"}
+
+    def test_unchanged_session_is_not_reissued(self, db):
+        client = create_attributes_app(db, session_format="compact").test_client()
+        client.get("/login/ritik")
+        client.get("/set/locale?value=en")
+        cookie = login_cookie(client)
+
+        #: Same value and reads don't re-encrypt the session
+        assert "Set-Cookie" not in client.get("/set/locale?value=en").headers
+        assert "Set-Cookie" not in client.get("/attributes").headers
+        assert login_cookie(client) == cookie
+
+        assert "Set-Cookie" in client.get("/set/locale?value=de").headers
+        assert client.get("/attributes").json == {"locale": "de"}
+
+    def test_set_on_login(self, db):
+        client = create_attributes_app(db, session_format="compact").test_client()
+
+        response = client.get("/login/ritik/en")
+        assert len(response.headers.getlist("Set-Cookie")) == 1
+
+        assert client.get("/attributes").json == {"locale": "en"}
+
+    def test_delete(self, db):
+        client = create_attributes_app(db, session_format="compact").test_client()
+        client.get("/login/ritik")
+        client.get("/set/locale?value=en")
+
+        client.get("/delete/locale")
+        assert client.get("/attributes").json == {}
+
+    def test_budget(self, db):
+        client = create_attributes_app(db, session_format="compact", attributes_budget=16,
+                                       attributes_compression_threshold=None).test_client()
+        client.get("/login/ritik")
+        cookie = login_cookie(client)
+
+        response = client.get(f"/set/locale?value={'x' * 16}")
+        assert response.status_code == 400
+        assert "budget" in response.text
+        assert "Set-Cookie" not in response.headers
+        assert login_cookie(client) == cookie
+
+    def test_compressed_in_token(self, db):
+        value = "feature-flag," * 15
+        settings = {"session_format": "compact"}
+
+        sizes = []
+        for threshold in (None, 32):
+            client = create_attributes_app(db, attributes_compression_threshold=threshold, **settings).test_client()
+            client.get("/login/ritik")
+            client.get(f"/set/flags?value={value}")
+
+            assert client.get("/attributes").json == {"flags": value}
+            sizes.append(len(login_cookie(client)))
+
+        assert sizes[1] < sizes[0]
+
+    def test_invalid_values(self, db):
+        application = create_attributes_app(db)
+        handler = application.login_handler
+
+        with application.test_request_context():
+            handler.user_id = "ritik"
+            handler.session_data = Session("ritik", expires_at=int(time.time()) + 60)
+
+            for value in ((1, 2), {"a": 1}, [[1]], b"x"):
+                with pytest.raises(Exception, match="Invalid type"):
+                    handler.set_session_attribute("name", value)
+
+            with pytest.raises(Exception, match="Invalid name"):
+                handler.set_session_attribute(1, "value")
+
+    def test_guest(self, db):
+        application = create_attributes_app(db)
+
+        with application.test_request_context():
+            assert dict(application.login_handler.session_attributes) == {}
+
+            with pytest.raises(Exception, match="logged in user"):
+                application.login_handler.set_session_attribute("locale", "en")
+
+    def test_cipher_backend_warns(self, db):
+        client = create_attributes_app(db, crypto_backend="cipher").test_client()
+        client.get("/login/ritik")
+
+        with pytest.warns(UserWarning, match="hmac"):
+            client.get("/set/locale?value=en")
+
+        assert client.get("/attributes").json == {"locale": "en"}
+
+    def test_server_side_session(self, db):
+        application = create_attributes_app(db)
+        store = MemoryStore()
+        application.login_handler.init_session_store(store)
+
+        client = application.test_client()
+        client.get("/login/ritik")
+        session_id = login_cookie(client)
+
+        #: Only the store is updated, cookie keeps session id
+        response = client.get("/set/locale?value=en")
+        assert "Set-Cookie" not in response.headers
+
+        assert store.get(session_id)[0]["_extra"] == {"locale": "en"}
+        assert client.get("/attributes").json == {"locale": "en"}
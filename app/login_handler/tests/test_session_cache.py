@@ -0,0 +1,118 @@
+import pytest
+
+from login_handler import config_settings
+from login_handler import data
+
+from .utils import LOGIN_PAGE_PATH
+from .utils import LOGOUT_PAGE_PATH
+
+
+class TestSessionCache(object):
+    username = "sakshi"
+    password = "sak"
+
+    def login(self, client):
+        client.post(LOGIN_PAGE_PATH, data={
+            "username": self.username,
+            "password": self.password
+        })
+
+    def test_disabled_by_default(self, app, reset):
+        assert app.login_handler.session_cache is None
+        assert app.login_handler.session_cache_stats() is None
+
+    def test_decoded_once(self, app, client, reset):
+        config_settings(session_cache_size=10)
+        self.login(client)
+
+        for _ in range(5):
+            response = client.get("/dashboard/check")
+            assert self.username in response.data.decode()
+
+        stats = app.login_handler.session_cache_stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 4
+        assert stats["size"] == 1
+
+    def test_cached_session_is_immutable(self, app, client, reset):
+        config_settings(session_cache_size=10)
+        self.login(client)
+
+        client.get("/")
+        session = app.login_handler.session_data
+
+        with pytest.raises(TypeError):
+            session["_user-id"] = "someone-else"
+
+        with pytest.raises(AttributeError):
+            session.user_id = "someone-else"
+
+        response = client.get("/dashboard/check")
+        assert self.username in response.data.decode()
+
+    def test_invalidated_on_logout(self, app, client, reset):
+        config_settings(session_cache_size=10)
+        self.login(client)
+
+        client.get("/")
+        assert app.login_handler.session_cache_stats()["size"] == 1
+
+        client.get(LOGOUT_PAGE_PATH)
+        assert app.login_handler.session_cache_stats()["size"] == 0
+
+    def test_invalidated_on_backend_switch(self, app, client, reset):
+        config_settings(session_cache_size=100)
+        self.login(client)
+
+        client.get("/")
+        assert app.login_handler.session_cache_stats()["size"] == 1
+
+        #: Cached session of cipher token is not accepted in signed mode
+        config_settings(session_cache_size=100, crypto_backend="hmac")
+        assert b"Guest" in client.get("/").data
+
+
+class TestLazySession(object):
+    username = "sakshi"
+    password = "sak"
+
+    def login(self, client):
+        client.post(LOGIN_PAGE_PATH, data={
+            "username": self.username,
+            "password": self.password
+        })
+
+    def test_skipped_when_unused(self, app, client, reset):
+        config_settings(lazy_session=True)
+        self.login(client)
+        app.login_handler.reset_lazy_stats()
+
+        for _ in range(3):
+            response = client.get("/public")
+            assert b"Public Page" in response.data
+
+        assert app.login_handler.lazy_stats == {"decoded": 0, "skipped": 3}
+
+    def test_decoded_on_use(self, app, client, reset):
+        config_settings(lazy_session=True)
+        self.login(client)
+        app.login_handler.reset_lazy_stats()
+
+        response = client.get("/dashboard/check")
+        assert self.username in response.data.decode()
+
+        assert app.login_handler.lazy_stats == {"decoded": 1, "skipped": 0}
+
+    def test_session_decoded_on_use(self, app, client, reset):
+        config_settings(lazy_session=True)
+        self.login(client)
+
+        client.get("/public")
+        assert data.session["_user-id"] == self.username
+
+    def test_logout(self, app, client, reset):
+        config_settings(lazy_session=True)
+        self.login(client)
+
+        client.get(LOGOUT_PAGE_PATH)
+        assert b"Guest" in client.get("/").data
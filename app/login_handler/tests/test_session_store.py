@@ -0,0 +1,160 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from login_handler import config_settings
+from login_handler.src.stores import MemoryStore
+from login_handler.src.stores import SQLiteStore
+
+from .utils import SESSION_COOKIE_NAME
+from .utils import LOGIN_PAGE_PATH
+from .utils import LOGOUT_PAGE_PATH
+
+
+class TestStores(object):
+
+    def stores(self):
+        return MemoryStore(shards=4), SQLiteStore()
+
+    def test_add_get_delete(self):
+        now = int(time.time())
+
+        for store in self.stores():
+            store.add("sid:1", "ritik", {"_user-id": "ritik"}, now, now + 60)
+
+            assert store.get("sid:1") == ({"_user-id": "ritik"}, now + 60)
+            assert store.get("sid:2") is None
+
+            store.delete("sid:1")
+            assert store.get("sid:1") is None
+            assert store.sessions_of("ritik") == []
+
+    def test_sessions_of_user(self):
+        now = int(time.time())
+
+        for store in self.stores():
+            store.add("sid:2", "ritik", {}, now + 1, now + 60)
+            store.add("sid:1", "ritik", {}, now, now + 60)
+            store.add("sid:3", "sakshi", {}, now, now + 60)
+
+            #: Oldest first
+            assert store.sessions_of("ritik") == ["sid:1", "sid:2"]
+
+            assert store.delete_user("ritik") == 2
+            assert store.sessions_of("ritik") == []
+            assert store.get("sid:3") is not None
+
+    def test_sessions_issued_within_one_second(self):
+        now = int(time.time())
+
+        for store in self.stores():
+            store.add("sid:b", "ritik", {}, now, now + 60)
+            store.add("sid:a", "ritik", {}, now, now + 60)
+
+            #: Updated session keeps its place
+            store.add("sid:b", "ritik", {"_extra": {}}, now, now + 60)
+
+            assert store.sessions_of("ritik") == ["sid:b", "sid:a"]
+
+    def test_sqlite_close(self, tmp_path):
+        store = SQLiteStore(str(tmp_path / "sessions.db"))
+        now = int(time.time())
+
+        threads = [threading.Thread(target=store.add, args=(f"sid:{index}", "ritik", {}, now, now + 60))
+                   for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        #: Connections of finished threads are closed once a new one is opened
+        thread = threading.Thread(target=store.get, args=("sid:0",))
+        thread.start()
+        thread.join()
+        assert len(store._connections) == 2
+
+        connection = store._connection()
+
+        store.close()
+        assert store._connections == {}
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")
+
+        #: Sessions are kept in database file
+        assert len(SQLiteStore(str(tmp_path / "sessions.db")).sessions_of("ritik")) == 4
+
+    def test_expired(self):
+        now = int(time.time())
+
+        for store in self.stores():
+            store.add("sid:1", "ritik", {}, now - 60, now - 1)
+            store.add("sid:2", "ritik", {}, now, now + 60)
+
+            assert store.sessions_of("ritik") == ["sid:2"]
+            assert store.purge_expired() == 1
+            assert store.get("sid:1") is None
+            assert len(store) == 1
+
+
+class TestServerSideSessions(object):
+    username = "ritik"
+    password = "rit"
+
+    def login(self, client):
+        return client.post(LOGIN_PAGE_PATH, data={
+            "username": self.username,
+            "password": self.password
+        }, follow_redirects=True)
+
+    def test_login_logout(self, app, client, reset):
+        app.login_handler.init_session_store(MemoryStore())
+
+        try:
+            response = self.login(client)
+            assert self.username in response.data.decode()
+
+            session_id = client.get_cookie(SESSION_COOKIE_NAME).decoded_value
+            assert session_id.startswith("sid:")
+            assert app.login_handler.list_sessions(self.username) == [session_id]
+
+            client.get(LOGOUT_PAGE_PATH)
+            assert app.login_handler.list_sessions(self.username) == []
+        finally:
+            app.login_handler.init_session_store(None)
+
+    def test_revoke_one_device(self, app, reset):
+        app.login_handler.init_session_store(SQLiteStore())
+
+        try:
+            phone = app.test_client()
+            laptop = app.test_client()
+            self.login(phone)
+            self.login(laptop)
+
+            phone_session = phone.get_cookie(SESSION_COOKIE_NAME).decoded_value
+            app.login_handler.revoke_session(phone_session)
+
+            assert b"Guest" in phone.get("/").data
+            assert self.username in laptop.get("/").data.decode()
+        finally:
+            app.login_handler.init_session_store(None)
+
+    def test_max_sessions_per_user(self, app, reset):
+        app.login_handler.init_session_store(MemoryStore())
+        config_settings(max_sessions_per_user=2)
+
+        try:
+            clients = [app.test_client() for _ in range(3)]
+            for client in clients:
+                self.login(client)
+
+            assert len(app.login_handler.list_sessions(self.username)) == 2
+
+            #: Oldest session is revoked
+            assert b"Guest" in clients[0].get("/").data
+            assert self.username in clients[2].get("/").data.decode()
+        finally:
+            app.login_handler.init_session_store(None)
@@ -0,0 +1,339 @@
+import datetime
+import json
+import time
+
+from cipher_kit import Cipher
+from werkzeug.http import dump_cookie
+
+from login_handler import config_settings
+from login_handler.src import backends
+from login_handler.src import tokens
+
+from .utils import SESSION_COOKIE_NAME
+from .utils import LOGIN_PAGE_PATH
+from .utils import LOGOUT_PAGE_PATH
+
+SECRET_KEY = "kfjwelkfjwoepfjwoeifjlwekj"
+TIME_FORMAT = "%d %b %Y"
+KEYRING = backends.Keyring(SECRET_KEY)
+KEYS = KEYRING.current
+
+
+class TestTokens(object):
+
+    def test_round_trip(self):
+        now = int(time.time())
+
+        for backend in (backends.CIPHER, backends.HMAC):
+            token = tokens.dumps_compact("ritik", True, now, now + 60, KEYS, backend)
+            assert tokens.unseal(token, KEYRING)[2] is backend
+
+            session, expiration = tokens.loads(token, KEYRING, TIME_FORMAT)
+            assert session["_user-id"] == "ritik"
+            assert session["_valid-session"] is True
+            assert session["_issued-at"] == now
+            assert expiration == now + 60
+
+    def test_round_trip_json(self):
+        session = {"_user-id": "ritik", "_accessed-timeout": int(time.time()) + 60, "_valid-session": True}
+
+        for backend in (backends.CIPHER, backends.HMAC):
+            token = tokens.dumps_json(session, KEYS, backend)
+
+            loaded_session, expiration = tokens.loads(token, KEYRING, TIME_FORMAT)
+            assert loaded_session == session
+            assert expiration == session["_accessed-timeout"]
+
+    def test_legacy_token(self):
+        #: Tokens created before backends were introduced
+        session = {"_user-id": "ritik", "_accessed-timeout": "01 Jan 2030", "_valid-session": True}
+        token = Cipher.encrypt(json.dumps(session), SECRET_KEY)
+
+        session, expiration = tokens.loads(token, KEYRING, TIME_FORMAT)
+        assert session["_user-id"] == "ritik"
+
+        #: Date string expiry is read as epoch seconds
+        assert expiration == int(datetime.datetime(2030, 1, 1).timestamp())
+        assert session["_accessed-timeout"] == expiration
+
+    def test_compact_v2_token(self):
+        #: Tokens created before refresh times
+        now = int(time.time())
+        payload = tokens.COMPACT_HEADER_V2.pack(2, tokens.FLAG_VALID, now, now + 60, b"12345678", 5) + b"ritik"
+        token = tokens.seal(payload, KEYS, backends.HMAC)
+
+        session, expiration = tokens.loads(token, KEYRING, TIME_FORMAT)
+        assert session["_user-id"] == "ritik"
+        assert session["_issued-at"] == now
+        assert "_refreshed-at" not in session
+        assert expiration == now + 60
+
+    def test_compact_issued_milliseconds(self):
+        now = int(time.time())
+        issued_at = now + 0.123
+
+        token = tokens.dumps_compact("ritik", True, issued_at, now + 60, KEYS, backends.HMAC)
+        assert tokens.loads(token, KEYRING, TIME_FORMAT)[0].issued_at == issued_at
+
+    def test_compact_v3_token(self):
+        #: Tokens created before milliseconds of issue time
+        now = int(time.time())
+        payload = tokens.COMPACT_HEADER_V3.pack(3, tokens.FLAG_VALID, now, now + 60, now, b"12345678", 5) + b"ritik"
+        token = tokens.seal(payload, KEYS, backends.HMAC)
+
+        session, expiration = tokens.loads(token, KEYRING, TIME_FORMAT)
+        assert session.user_id == "ritik"
+        assert session.issued_at == now
+        assert expiration == now + 60
+
+    def test_tampered_token(self):
+        now = int(time.time())
+        token = tokens.dumps_compact("ritik", True, now, now + 60, KEYS, backends.HMAC)
+
+        #: Changing any character invalidates MAC
+        tampered = token[:-3] + ("A" if token[-3] != "A" else "B") + token[-2:]
+        session, expiration = tokens.loads(tampered, KEYRING, TIME_FORMAT)
+        assert session["_valid-session"] is False
+        assert expiration is None
+
+        #: Wrong secret key
+        session, expiration = tokens.loads(token, backends.Keyring("another-key"), TIME_FORMAT)
+        assert session["_valid-session"] is False
+
+    def test_compact_cipher_mac(self):
+        #: Cipher doesn't detect tampering, compact payload carries its own MAC
+        now = int(time.time())
+        token = tokens.dumps_compact("ritik", True, now, now + 60, KEYS, backends.CIPHER)
+        payload = tokens.unseal(token, KEYRING)[0]
+
+        tampered = bytearray(payload)
+        tampered[-backends.HMAC.mac_size - 1] ^= 1
+        stripped = payload[:-backends.HMAC.mac_size]
+
+        for forged in (bytes(tampered), stripped):
+            session, expiration = tokens.loads(tokens.seal(forged, KEYS, backends.CIPHER), KEYRING, TIME_FORMAT)
+            assert session["_valid-session"] is False
+            assert expiration is None
+
+    def test_compact_cipher_token_without_mac(self):
+        #: Compact cipher tokens of versions before the MAC are invalid, so it can't be dropped by downgrading
+        now = int(time.time())
+        payload = tokens.COMPACT_HEADER_V3.pack(3, tokens.FLAG_VALID, now, now + 60, now, b"12345678", 5) + b"ritik"
+
+        session, expiration = tokens.loads(tokens.seal(payload, KEYS, backends.CIPHER), KEYRING, TIME_FORMAT)
+        assert session is tokens.INVALID_SESSION
+        assert expiration is None
+
+    def test_compact_cipher_resealed(self):
+        now = int(time.time())
+        keyring = backends.Keyring("new-key", (SECRET_KEY,))
+        token = tokens.dumps_compact("ritik", True, now, now + 60, KEYS, backends.CIPHER)
+
+        resealed = tokens.reseal(token, keyring)
+        assert tokens.find_keys(resealed, keyring)[0] is keyring.current
+
+        session, expiration = tokens.loads(resealed, keyring, TIME_FORMAT)
+        assert session.user_id == "ritik"
+        assert expiration == now + 60
+
+    def test_garbage_token(self):
+        for token in ("", "A", "!!!!", "QUFBQUFB"):
+            session, expiration = tokens.loads(token, KEYRING, TIME_FORMAT)
+            assert session["_valid-session"] is False
+
+    def test_logout_token(self):
+        token = tokens.dumps_compact(None, False, time.time(), 0, KEYS, backends.HMAC)
+
+        session, expiration = tokens.loads(token, KEYRING, TIME_FORMAT)
+        assert session["_valid-session"] is False
+
+    def test_smaller_than_json(self):
+        session = {"_user-id": "ritik", "_accessed-timeout": "01 Jan 2030", "_valid-session": True}
+        json_token = tokens.dumps_json(session, KEYS)
+        compact_token = tokens.dumps_compact("ritik", True, time.time(), time.time() + 60, KEYS, backends.HMAC)
+
+        assert len(dump_cookie(SESSION_COOKIE_NAME, compact_token)) < len(dump_cookie(SESSION_COOKIE_NAME, json_token))
+
+
+class TestSessionFormat(object):
+    username = "ritik"
+    password = "rit"
+
+    def login(self, client):
+        return client.post(LOGIN_PAGE_PATH, data={
+            "username": self.username,
+            "password": self.password
+        }, follow_redirects=True)
+
+    def test_invalid_format(self, app, reset):
+        error = False
+        try:
+            config_settings(session_format="xml")
+        except Exception as e:
+            error = True
+        assert error is True
+
+    def test_invalid_backend(self, app, reset):
+        error = False
+        try:
+            config_settings(crypto_backend="rot13")
+        except Exception as e:
+            error = True
+        assert error is True
+
+    def test_login_logout(self, app, client, reset):
+        for session_format in tokens.SESSION_FORMATS:
+            for crypto_backend in ("cipher", "hmac"):
+                config_settings(session_format=session_format, crypto_backend=crypto_backend)
+
+                response = self.login(client)
+                assert self.username in response.data.decode()
+
+                token = client.get_cookie(SESSION_COOKIE_NAME).decoded_value
+                assert tokens.unseal(token, KEYRING)[2].name == crypto_backend
+
+                client.get(LOGOUT_PAGE_PATH)
+                response = client.get("/")
+                assert b"Guest" in response.data
+
+    def test_legacy_readable_after_switch(self, app, client, reset):
+        self.login(client)
+        assert tokens.unseal(client.get_cookie(SESSION_COOKIE_NAME).decoded_value, KEYRING)[2] is backends.CIPHER
+
+        config_settings(session_format="compact", crypto_backend="hmac", accepted_backends=("cipher",))
+
+        response = client.get("/")
+        assert self.username in response.data.decode()
+
+    def test_other_backend_rejected(self, app, client, reset):
+        self.login(client)
+
+        #: Signed mode doesn't accept tokens of other backends
+        config_settings(crypto_backend="hmac")
+
+        response = client.get("/")
+        assert b"Guest" in response.data
+        assert client.get_cookie(SESSION_COOKIE_NAME) is None
+
+    def test_other_backend_token_is_invalid(self):
+        now = int(time.time())
+        token = tokens.dumps_compact("ritik", True, now, now + 60, KEYRING.current, backends.CIPHER)
+
+        session, expiration = tokens.loads(token, KEYRING, TIME_FORMAT, frozenset({backends.HMAC}))
+        assert session is tokens.INVALID_SESSION
+        assert expiration is None
+
+        assert tokens.loads(token, KEYRING, TIME_FORMAT, frozenset({backends.CIPHER}))[0].user_id == "ritik"
+
+
+class TestDerivedKeys(object):
+
+    def test_derived_once(self, app, reset):
+        keys = app.login_handler.keys
+
+        assert app.login_handler.keys is keys
+        assert keys.get(backends.HMAC) is keys.get(backends.HMAC)
+
+    def test_derived_again_on_secret_change(self, app, client, reset):
+        keys = app.login_handler.keys
+        secret_key = app.secret_key
+
+        try:
+            app.secret_key = "another-secret-key"
+            assert app.login_handler.keys is not keys
+            assert app.login_handler.keys.secret_key == "another-secret-key"
+        finally:
+            app.secret_key = secret_key
+
+
+class TestKeyRotation(object):
+    username = "sehwag"
+    password = "seh"
+    new_secret_key = "new-kfjwelkfjwoepfjwoeifjlwekj"
+
+    def login(self, client):
+        return client.post(LOGIN_PAGE_PATH, data={
+            "username": self.username,
+            "password": self.password
+        }, follow_redirects=True)
+
+    def rotate(self, app, fallbacks):
+        app.secret_key = self.new_secret_key
+        app.config["SECRET_KEY_FALLBACKS"] = fallbacks
+
+    def restore(self, app):
+        app.secret_key = SECRET_KEY
+        app.config["SECRET_KEY_FALLBACKS"] = []
+
+    def test_token_carries_key_id(self, app, client, reset):
+        self.login(client)
+
+        token = client.get_cookie(SESSION_COOKIE_NAME).decoded_value
+        assert token.startswith(app.login_handler.keys.key_id + ".")
+
+    def test_rotated_session_reissued(self, app, client, reset):
+        self.login(client)
+        old_token = client.get_cookie(SESSION_COOKIE_NAME).decoded_value
+
+        try:
+            self.rotate(app, [SECRET_KEY])
+
+            response = client.get("/")
+            assert self.username in response.data.decode()
+
+            #: Session is re-issued with new key
+            new_token = client.get_cookie(SESSION_COOKIE_NAME).decoded_value
+            assert new_token != old_token
+            assert new_token.startswith(app.login_handler.keys.key_id + ".")
+
+            #: Old key can be dropped now
+            self.rotate(app, [])
+
+            response = client.get("/")
+            assert self.username in response.data.decode()
+        finally:
+            self.restore(app)
+
+    def test_legacy_session_rekeyed(self, app, client, reset):
+        #: Token created before key ids, without key id prefix
+        session = {"_user-id": self.username, "_accessed-timeout": int(time.time()) + 600, "_valid-session": True}
+        token = Cipher.encrypt(json.dumps(session), SECRET_KEY)
+        assert tokens.is_stale(token, KEYRING)
+
+        client.set_cookie(SESSION_COOKIE_NAME, token)
+
+        response = client.get("/")
+        assert self.username in response.data.decode()
+
+        #: Session is re-issued with key id, so it survives rotation
+        new_token = client.get_cookie(SESSION_COOKIE_NAME).decoded_value
+        assert new_token.startswith(app.login_handler.keys.key_id + ".")
+        assert not tokens.is_stale(new_token, KEYRING)
+
+        try:
+            self.rotate(app, [SECRET_KEY])
+
+            response = client.get("/")
+            assert self.username in response.data.decode()
+        finally:
+            self.restore(app)
+
+    def test_current_session_not_reissued(self, app, client, reset):
+        self.login(client)
+
+        response = client.get("/")
+        assert "Set-Cookie" not in response.headers
+
+    def test_removed_key_logs_out(self, app, client, reset):
+        self.login(client)
+
+        try:
+            #: Secret changed without fallbacks, session should
+            #: be treated as guest instead of raising error
+            self.rotate(app, [])
+
+            response = client.get("/")
+            assert response.status_code == 200
+            assert b"Guest" in response.data
+        finally:
+            self.restore(app)
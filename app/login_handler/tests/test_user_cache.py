@@ -0,0 +1,93 @@
+from login_handler import config_settings
+from login_handler import invalidate_user
+from login_handler import invalidate_all
+from login_handler.src.cache import LRUCache
+
+from .utils import LOGIN_PAGE_PATH
+
+
+class TestLRUCache(object):
+
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        #: "a" becomes most recently used, so "b" should be evicted
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+        assert len(cache) == 2
+
+    def test_ttl(self):
+        cache = LRUCache(2, ttl=0)
+        cache.set("a", 1)
+
+        assert cache.get("a") is None
+
+        #: Per entry ttl overrides default ttl
+        cache.set("b", 2, ttl=60)
+        assert cache.get("b") == 2
+
+    def test_stats(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("missing")
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["size"] == 1
+
+
+class TestUserCache(object):
+    username = "sehwag"
+    password = "seh"
+
+    def login(self, client):
+        client.post(LOGIN_PAGE_PATH, data={
+            "username": self.username,
+            "password": self.password
+        })
+
+    def test_disabled_by_default(self, app, reset):
+        assert app.login_handler.user_cache is None
+        assert app.login_handler.user_cache_stats() is None
+
+    def test_served_from_cache(self, app, client, reset):
+        config_settings(user_cache_size=10)
+        self.login(client)
+
+        for _ in range(5):
+            response = client.get("/dashboard/check")
+            assert self.username in response.data.decode()
+
+        stats = app.login_handler.user_cache_stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 4
+        assert stats["size"] == 1
+
+    def test_invalidate_user(self, app, client, reset):
+        config_settings(user_cache_size=10)
+        self.login(client)
+
+        client.get("/dashboard/check")
+        invalidate_user(self.username)
+        client.get("/dashboard/check")
+
+        assert app.login_handler.user_cache_stats()["misses"] == 2
+
+    def test_invalidate_all(self, app, client, reset):
+        config_settings(user_cache_size=10)
+        self.login(client)
+
+        client.get("/dashboard/check")
+        invalidate_all()
+
+        assert app.login_handler.user_cache_stats()["size"] == 0
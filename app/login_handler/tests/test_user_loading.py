@@ -0,0 +1,52 @@
+from .utils import LOGIN_PAGE_PATH
+
+
+class TestUserLoading(object):
+    """Tests that user is loaded lazily and only once per request
+
+    """
+    username = "ritik"
+    password = "rit"
+
+    def login(self, client):
+        client.post(LOGIN_PAGE_PATH, data={
+            "username": self.username,
+            "password": self.password
+        })
+
+    def test_loaded_once_per_request(self, app, client, reset):
+        self.login(client)
+        app.login_handler.reset_user_stats()
+
+        #: Template accesses user 3 times (username, email, age)
+        response = client.get("/dashboard/check")
+        assert self.username in response.data.decode()
+
+        assert app.login_handler.user_stats == {"hits": 2, "misses": 1}
+
+    def test_loaded_once_per_each_request(self, app, client, reset):
+        self.login(client)
+        app.login_handler.reset_user_stats()
+
+        for _ in range(10):
+            client.get("/dashboard/check")
+
+        assert app.login_handler.user_stats["misses"] == 10
+        assert app.login_handler.user_stats["hits"] == 20
+
+    def test_not_loaded_when_unused(self, app, client, reset):
+        self.login(client)
+        app.login_handler.reset_user_stats()
+
+        response = client.get("/public")
+        assert b"Public Page" in response.data
+
+        assert app.login_handler.user_stats == {"hits": 0, "misses": 0}
+
+    def test_guest_not_counted(self, app, client, reset):
+        app.login_handler.reset_user_stats()
+
+        response = client.get("/")
+        assert b"Guest" in response.data
+
+        assert app.login_handler.user_stats == {"hits": 0, "misses": 0}
@@ -23,10 +23,16 @@ setup(
     install_requires=[
         "cipher_kit==0.0.4"
     ],
-    extra_requires={
+    extras_require={
         "dev": [
             "pytest>=7.0.0",
             "flask>=2.3.0"
+        ],
+        "async": [
+            "flask[async]>=2.3.0"
+        ],
+        "quart": [
+            "quart>=0.19.0"
         ]
     }
 )